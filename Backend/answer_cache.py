@@ -0,0 +1,187 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+
+# --- Answer Cache Configuration ---
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+ANSWER_CACHE_SEMANTIC = os.getenv("ANSWER_CACHE_SEMANTIC", "true").lower() == "true"
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?.!]+$")
+
+
+def normalize_query(query):
+    return _TRAILING_PUNCTUATION.sub("", _WHITESPACE.sub(" ", query.strip().lower()))
+
+
+class AnswerCache:
+    """
+    Bounded LRU cache of /query/ responses.
+
+    Lookups match the normalized query string exactly, or (optionally) the nearest cached
+    query embedding above a cosine-similarity threshold. Each entry remembers the sources
+    it cited so that new or removed chunks in those sources evict it. Entries belong to an
+    owner namespace and are never served across namespaces.
+
+    The cache lives in one process, so invalidate_sources() only sees this process's
+    ingests. `changed_since(namespace, sources, since)` covers the others (the bulk CLI,
+    other workers): a hit whose cited sources changed after the answer was looked up is
+    dropped. put() takes the token generation() returned at lookup time and skips answers
+    whose namespace was invalidated while they were being generated.
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_MAX_ENTRIES, similarity=ANSWER_CACHE_SIMILARITY, changed_since=None):
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self.changed_since = changed_since
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._by_source = {}
+        self._matrices = {}
+        self._generations = {}
+        self._clears = 0
+        self._counters = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "invalidations": 0, "stale_puts": 0}
+
+    def generation(self, namespace=None):
+        """Token to hand to put() for an answer looked up now."""
+        with self._lock:
+            return self._clears, self._generations.get(namespace or "", 0), time.time()
+
+    def get(self, query, embed=None, namespace=None):
+        """
+        Look up a cached response. `embed` is an optional callable returning the query
+        embedding; it is only invoked when the exact lookup misses.
+        Returns (response, match, embedding) where match is "exact", "semantic" or None.
+        """
+        key = (namespace or "", normalize_query(query))
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and self._current(key, entry):
+            with self._lock:
+                self._counters["exact_hits"] += 1
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+            return entry["response"], "exact", None
+
+        embedding = embed() if embed is not None else None
+        entry = None
+        if embedding is not None:
+            with self._lock:
+                key = self._nearest(embedding, namespace or "")
+                entry = self._entries[key] if key is not None else None
+        if entry is not None and self._current(key, entry):
+            with self._lock:
+                self._counters["semantic_hits"] += 1
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+            return entry["response"], "semantic", embedding
+
+        with self._lock:
+            self._counters["misses"] += 1
+        return None, None, embedding
+
+    def put(self, query, response, sources, embedding=None, namespace=None, generation=None):
+        """Cache a response; `generation` is the token generation() returned before it was built."""
+        key = (namespace or "", normalize_query(query))
+        with self._lock:
+            if generation is not None and generation[:2] != (self._clears, self._generations.get(key[0], 0)):
+                # Its sources were invalidated while it was generated: it may cite removed chunks
+                self._counters["stale_puts"] += 1
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {
+                "response": response,
+                "sources": set(sources),
+                "embedding": _unit(embedding) if embedding is not None else None,
+                "since": generation[2] if generation is not None else time.time(),
+            }
+            for source in sources:
+                self._by_source.setdefault((key[0], source), set()).add(key)
+            self._matrices.pop(key[0], None)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_sources(self, sources, namespace=None):
+        """Drop every cached answer in the namespace that cited any of `sources`."""
+        with self._lock:
+            self._generations[namespace or ""] = self._generations.get(namespace or "", 0) + 1
+            keys = set()
+            for source in sources:
+                keys |= self._by_source.get((namespace or "", source), set())
+            for key in keys:
+                self._remove(key)
+            self._counters["invalidations"] += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._clears += 1
+            self._counters["invalidations"] += len(self._entries)
+            self._entries.clear()
+            self._by_source.clear()
+            self._matrices.clear()
+
+    def stats(self):
+        with self._lock:
+            return {**self._counters, "entries": len(self._entries), "max_entries": self.max_entries}
+
+    def _current(self, key, entry):
+        """False (and the entry dropped) when its sources changed since it was looked up."""
+        if self.changed_since is None or not entry["sources"]:
+            return True
+        if not self.changed_since(key[0] or None, entry["sources"], entry["since"]):
+            return True
+        with self._lock:
+            if self._entries.get(key) is entry:
+                self._remove(key)
+                self._counters["invalidations"] += 1
+        return False
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        for source in entry["sources"]:
+            keys = self._by_source.get((key[0], source))
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_source[(key[0], source)]
+        self._matrices.pop(key[0], None)
+
+    def _nearest(self, embedding, namespace):
+        import numpy as np
+
+        if namespace not in self._matrices:
+            keys = [key for key, entry in self._entries.items()
+                    if key[0] == namespace and entry["embedding"] is not None]
+            matrix = np.stack([self._entries[key]["embedding"] for key in keys]) if keys else None
+            self._matrices[namespace] = (keys, matrix)
+        keys, matrix = self._matrices[namespace]
+        if matrix is None:
+            return None
+        scores = matrix @ _unit(embedding)
+        best = int(np.argmax(scores))
+        return keys[best] if scores[best] >= self.similarity else None
+
+
+def _unit(vector):
+    import numpy as np
+
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _catalog_changed_since(namespace, sources, since):
+    from content_index import get_content_index
+    return get_content_index().changed_since(sources, namespace, since)
+
+
+_cache = AnswerCache(changed_since=_catalog_changed_since)
+
+
+def get_answer_cache():
+    return _cache
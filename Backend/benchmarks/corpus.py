@@ -0,0 +1,72 @@
+import random
+
+# --- Synthetic Corpora ---
+# Deterministic for a given seed, so runs on different machines or commits time the same work.
+
+_WORDS = (
+    "memory note idea project vector search embed chunk source query answer context model "
+    "paper meeting draft review budget roadmap design storage index latency cache stream "
+    "upload document video image transcript summary question insight research reference "
+    "python fastapi chroma whisper tesseract gemini the a of and to in is for on with as by"
+).split()
+
+
+def sentence(rng, min_words=6, max_words=18):
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(min_words, max_words))]
+    return " ".join(words).capitalize() + "."
+
+
+def paragraph(rng, sentences=5):
+    return " ".join(sentence(rng) for _ in range(rng.randint(max(1, sentences - 2), sentences + 2)))
+
+
+def documents(count, paragraphs=20, seed=0):
+    """`count` plain-text documents of roughly `paragraphs` paragraphs each."""
+    rng = random.Random(seed)
+    return ["\n\n".join(paragraph(rng) for _ in range(paragraphs)) for _ in range(count)]
+
+
+def html_pages(count, paragraphs=20, seed=0):
+    """Web pages with the navigation, scripts and footers that text extraction strips."""
+    rng = random.Random(seed)
+    pages = []
+    for _ in range(count):
+        body = "\n".join(
+            f"<h2>{sentence(rng, 2, 6)}</h2><p>{paragraph(rng)}</p>" if i % 4 == 0 else f"<p>{paragraph(rng)}</p>"
+            for i in range(paragraphs)
+        )
+        pages.append(
+            "<html><head><title>Benchmark</title>"
+            "<style>body { font-family: sans-serif; }</style>"
+            "<script>window.analytics = { track: function () {} };</script></head><body>"
+            f"<header><nav><a href='/'>Home</a> <a href='/about'>About</a></nav></header>"
+            f"<main><article>{body}</article></main>"
+            f"<aside>{sentence(rng)}</aside><footer>{sentence(rng)}</footer>"
+            "</body></html>"
+        )
+    return pages
+
+
+def text_images(count, lines=8, seed=0):
+    """PNG bytes of black-on-white text, the typical screenshot or slide an OCR pass sees."""
+    from io import BytesIO
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    images = []
+    for _ in range(count):
+        image = Image.new("RGB", (900, 40 + 30 * lines), "white")
+        draw = ImageDraw.Draw(image)
+        for line in range(lines):
+            draw.text((20, 20 + 30 * line), sentence(rng, 5, 10), fill="black")
+        buffer = BytesIO()
+        image.save(buffer, format="PNG")
+        images.append(buffer.getvalue())
+    return images
+
+
+def unit_vectors(count, dim, seed=0):
+    import numpy as np
+
+    vectors = np.random.default_rng(seed).standard_normal((count, dim)).astype("float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
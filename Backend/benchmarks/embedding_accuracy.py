@@ -0,0 +1,162 @@
+"""
+Accuracy and cost of each embedding backend against the reference model.
+
+Every backend is loaded in a fresh process, so startup time and memory are measured
+without another model already resident. Each one embeds the same synthetic chunks and
+queries; vectors are compared with the reference backend's (per-text cosine similarity,
+and agreement of the top-k neighbours each query retrieves). Exit status is 1 when a
+backend's mean cosine falls below --min-cosine.
+
+Usage (from Backend/):
+    python -m benchmarks.embedding_accuracy
+    python -m benchmarks.embedding_accuracy --backends sentence-transformers,onnx --texts 1000
+    ONNX_THREADS=4 python -m benchmarks.embedding_accuracy --output benchmarks/embeddings.json
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks import corpus
+
+
+def _measure(backend, model_name, texts, queries, batch):
+    # Runs in its own spawned process
+    import numpy as np
+    from registry import _current_rss_bytes
+    from embedding_backends import create_embeddings
+
+    rss_before = _current_rss_bytes()
+    started = time.perf_counter()
+    model = create_embeddings(model_name, backend)
+    model.embed_documents(texts[:1])
+    startup = time.perf_counter() - started
+    rss_loaded = _current_rss_bytes()
+
+    started = time.perf_counter()
+    vectors = []
+    for start in range(0, len(texts), batch):
+        vectors.extend(model.embed_documents(texts[start:start + batch]))
+    elapsed = time.perf_counter() - started
+    query_vectors = [model.embed_query(query) for query in queries]
+
+    return {
+        "startup_seconds": round(startup, 3),
+        "model_rss_mb": round((rss_loaded - rss_before) / (1024 * 1024), 1),
+        "peak_rss_mb": round(_peak_rss_bytes() / (1024 * 1024), 1),
+        "texts_per_second": round(len(texts) / elapsed, 1) if elapsed else None,
+    }, np.asarray(vectors, dtype="float32"), np.asarray(query_vectors, dtype="float32")
+
+
+def _peak_rss_bytes():
+    # Each backend has its own process, so the process high-water mark is the backend's peak
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _normalize(vectors):
+    import numpy as np
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+def compare(reference, candidate, k):
+    """Cosine agreement of the document vectors and top-k overlap of the query results."""
+    import numpy as np
+
+    ref_docs, ref_queries = (_normalize(v) for v in reference)
+    docs, queries = (_normalize(v) for v in candidate)
+    cosines = (ref_docs * docs).sum(axis=1)
+
+    k = min(k, len(ref_docs))
+    ref_top = np.argsort(-(ref_queries @ ref_docs.T), axis=1)[:, :k]
+    top = np.argsort(-(queries @ docs.T), axis=1)[:, :k]
+    overlap = [len(set(a) & set(b)) / k for a, b in zip(ref_top, top)]
+    return {
+        "mean_cosine": round(float(cosines.mean()), 5),
+        "min_cosine": round(float(cosines.min()), 5),
+        "k": k,
+        "topk_overlap": round(float(np.mean(overlap)), 4),
+        "top1_match": round(float(np.mean(ref_top[:, 0] == top[:, 0])), 4),
+    }
+
+
+def main(argv=None):
+    from registry import EMBEDDING_MODEL_NAME
+    from embedding_backends import BACKENDS
+
+    parser = argparse.ArgumentParser(description="Compare embedding backends with the reference model.")
+    parser.add_argument("--backends", default="sentence-transformers,onnx-fp32,onnx",
+                        help=f"Comma-separated subset of: {', '.join(BACKENDS)}")
+    parser.add_argument("--reference", default="sentence-transformers")
+    parser.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    parser.add_argument("--texts", type=int, default=512, help="Chunks embedded per backend")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--batch", type=int, default=64)
+    parser.add_argument("-k", type=int, default=5, help="Neighbours compared per query")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-cosine", type=float, default=0.99,
+                        help="Lowest acceptable mean cosine similarity to the reference")
+    parser.add_argument("--output", help="Write results JSON here")
+    args = parser.parse_args(argv)
+
+    backends = [name.strip() for name in args.backends.split(",")]
+    if args.reference not in backends:
+        backends.insert(0, args.reference)
+    unknown = [name for name in backends if name not in BACKENDS]
+    if unknown:
+        parser.error(f"Unknown backend(s): {', '.join(unknown)}")
+
+    texts = [part for text in corpus.documents(args.texts // 10 + 1, 10, args.seed) for part in text.split("\n\n")]
+    texts = texts[:args.texts]
+    rng = random.Random(args.seed + 1)
+    queries = [corpus.sentence(rng) for _ in range(args.queries)]
+
+    results, vectors = {}, {}
+    context = multiprocessing.get_context("spawn")
+    for backend in backends:
+        print(f"⏱️  {backend} ...", flush=True)
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            try:
+                stats, docs, query_vectors = pool.submit(
+                    _measure, backend, args.model, texts, queries, args.batch
+                ).result()
+            except Exception as e:
+                results[backend] = {"status": "skipped", "reason": f"{type(e).__name__}: {e}"}
+                print(f"   skipped ({results[backend]['reason']})")
+                continue
+        vectors[backend] = (docs, query_vectors)
+        results[backend] = {"status": "ok", **stats}
+        print(f"   startup {stats['startup_seconds']}s, +{stats['model_rss_mb']} MB, "
+              f"{stats['texts_per_second']} texts/s")
+
+    failures = []
+    if args.reference in vectors:
+        for backend in backends:
+            if backend == args.reference or backend not in vectors:
+                continue
+            accuracy = compare(vectors[args.reference], vectors[backend], args.k)
+            results[backend]["accuracy"] = accuracy
+            if accuracy["mean_cosine"] < args.min_cosine:
+                failures.append(backend)
+            print(f"   {backend}: mean cosine {accuracy['mean_cosine']}, min {accuracy['min_cosine']}, "
+                  f"top-{accuracy['k']} overlap {accuracy['topk_overlap']}")
+    else:
+        print(f"⚠️  Reference backend {args.reference} could not run; accuracy not compared")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"model": args.model, "texts": len(texts), "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if failures:
+        print(f"❌ Below --min-cosine {args.min_cosine}: {', '.join(failures)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
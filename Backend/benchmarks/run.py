@@ -0,0 +1,369 @@
+"""
+Stage-level microbenchmarks for the ingestion and retrieval path.
+
+Every stage is timed on its own against synthetic corpora (see corpus.py), fully offline:
+HTML text extraction, OCR, splitting, chunking of multi-megabyte documents (with peak
+memory, next to the LangChain splitter it replaced), embedding batches, Chroma inserts,
+dense top-k search and BM25 search. Results are written as JSON; with --baseline, medians are compared to a
+stored run and slowdowns beyond --threshold are flagged (exit status 1).
+
+Usage (from Backend/):
+    python -m benchmarks.run --output benchmarks/results.json
+    python -m benchmarks.run --docs 500 --only split,embed
+    python -m benchmarks.run --only embed --embedding-backend onnx
+    python -m benchmarks.run --only chunk_large,chunk_large_langchain --large-mb 16
+    python -m benchmarks.run --baseline benchmarks/baseline.json --threshold 0.15
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+
+from benchmarks import corpus
+
+BENCHMARKS = {}
+
+
+def benchmark(name, unit):
+    """
+    Register a benchmark. The decorated function receives the CLI args and returns a dict
+    with `run` (the timed callable), `units` (work per run) and optionally `prepare`
+    (untimed, called before every run) and `cleanup`. `run` may return a dict of extra
+    metrics, which are reported from the last repetition.
+    """
+    def register(fn):
+        BENCHMARKS[name] = (fn, unit)
+        return fn
+    return register
+
+
+def _chunk_texts(args):
+    # Paragraphs stand in for chunks, so later stages do not depend on the splitter
+    return [part for text in corpus.documents(args.docs, args.paragraphs, args.seed) for part in text.split("\n\n")]
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+@benchmark("html_extract", "pages")
+def bench_html_extract(args):
+    from url_handler import html_to_text
+
+    pages = corpus.html_pages(args.docs, args.paragraphs, args.seed)
+    return {"run": lambda: [html_to_text(page) for page in pages], "units": len(pages)}
+
+
+@benchmark("ocr", "images")
+def bench_ocr(args):
+    # The OCR call a pool worker makes, without the pool or the media cache in front of it
+    from ocr import _ocr_bytes
+
+    images = corpus.text_images(args.images, seed=args.seed)
+    _ocr_bytes(images[0])
+    return {"run": lambda: [_ocr_bytes(image) for image in images], "units": len(images)}
+
+
+@benchmark("split", "chunks")
+def bench_split(args):
+    from ingest import new_text_splitter
+    from langchain.docstore.document import Document
+
+    docs = [Document(page_content=text) for text in corpus.documents(args.docs, args.paragraphs, args.seed)]
+    splitter = new_text_splitter()
+    units = len(splitter.split_documents(docs))
+    return {"run": lambda: splitter.split_documents(docs), "units": units}
+
+
+def _large_text(args):
+    # One multi-megabyte document, like a long transcript or a scraped book
+    paragraphs = args.large_mb * 1024 * 1024 // 600 + 1
+    return corpus.documents(1, paragraphs, args.seed)[0][:args.large_mb * 1024 * 1024]
+
+
+def _peak_mb(fn):
+    import tracemalloc
+
+    tracemalloc.start()
+    try:
+        fn()
+        return round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+    finally:
+        tracemalloc.stop()
+
+
+@benchmark("chunk_large", "MB")
+def bench_chunk_large(args):
+    # Consumed one chunk at a time, as the ingest stream does
+    from chunking import TextChunker
+
+    text, chunker = _large_text(args), TextChunker()
+
+    def consume():
+        for _ in chunker.iter_chunks(text):
+            pass
+
+    peak = _peak_mb(consume)
+    return {"run": lambda: consume() or {"peak_mb": peak}, "units": args.large_mb}
+
+
+@benchmark("chunk_large_langchain", "MB")
+def bench_chunk_large_langchain(args):
+    # The splitter chunking.py replaced, kept as the reference point for chunk_large
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    text = _large_text(args)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, add_start_index=True)
+
+    def consume():
+        splitter.create_documents([text])
+
+    peak = _peak_mb(consume)
+    return {"run": lambda: consume() or {"peak_mb": peak}, "units": args.large_mb}
+
+
+@benchmark("embed", "chunks")
+def bench_embed(args):
+    # The raw backend, not the shared batcher: this times the forward passes themselves
+    from embedding_backends import create_embeddings
+    from registry import EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND
+
+    model = create_embeddings(EMBEDDING_MODEL_NAME, args.embedding_backend or EMBEDDING_BACKEND)
+    texts = _chunk_texts(args)[:args.embed_texts]
+    model.embed_documents(texts[:args.embed_batch])
+
+    def run():
+        for start in range(0, len(texts), args.embed_batch):
+            model.embed_documents(texts[start:start + args.embed_batch])
+
+    return {"run": run, "units": len(texts)}
+
+
+def _chroma(args):
+    import chromadb
+
+    path = tempfile.mkdtemp(prefix="bench-chroma-")
+    return chromadb.PersistentClient(path=path), path
+
+
+def _add_vectors(collection, vectors, page=1000):
+    for start in range(0, len(vectors), page):
+        block = vectors[start:start + page]
+        collection.add(
+            ids=[str(start + i) for i in range(len(block))],
+            embeddings=block.tolist(),
+            documents=[f"chunk {start + i}" for i in range(len(block))],
+        )
+
+
+@benchmark("chroma_insert", "vectors")
+def bench_chroma_insert(args):
+    client, path = _chroma(args)
+    vectors = corpus.unit_vectors(args.vectors, args.dim, args.seed)
+    state = {}
+
+    def prepare():
+        try:
+            client.delete_collection("bench")
+        except Exception:
+            pass
+        state["collection"] = client.create_collection("bench")
+
+    return {
+        "prepare": prepare,
+        "run": lambda: _add_vectors(state["collection"], vectors),
+        "units": len(vectors),
+        "cleanup": lambda: shutil.rmtree(path, ignore_errors=True),
+    }
+
+
+@benchmark("search", "queries")
+def bench_search(args):
+    client, path = _chroma(args)
+    collection = client.create_collection("bench")
+    _add_vectors(collection, corpus.unit_vectors(args.vectors, args.dim, args.seed))
+    queries = corpus.unit_vectors(args.queries, args.dim, args.seed + 1).tolist()
+
+    def run():
+        latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            collection.query(query_embeddings=[query], n_results=args.k)
+            latencies.append(time.perf_counter() - started)
+        return {"p50_ms": _percentile(latencies, 0.5) * 1000, "p95_ms": _percentile(latencies, 0.95) * 1000}
+
+    return {"run": run, "units": len(queries), "cleanup": lambda: shutil.rmtree(path, ignore_errors=True)}
+
+
+@benchmark("lexical_search", "queries")
+def bench_lexical_search(args):
+    from lexical_index import LexicalIndex
+
+    texts = _chunk_texts(args)
+    index = LexicalIndex()
+    index.add([str(i) for i in range(len(texts))], texts)
+    rng = random.Random(args.seed + 1)
+    queries = [corpus.sentence(rng) for _ in range(args.queries)]
+
+    def run():
+        latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            index.search(query, k=args.k)
+            latencies.append(time.perf_counter() - started)
+        return {"p50_ms": _percentile(latencies, 0.5) * 1000, "p95_ms": _percentile(latencies, 0.95) * 1000}
+
+    return {"run": run, "units": len(queries)}
+
+
+def run_benchmark(name, args):
+    fn, unit = BENCHMARKS[name]
+    try:
+        spec = fn(args)
+    except Exception as e:
+        # Missing optional dependency, model not cached locally, no tesseract binary, ...
+        return {"status": "skipped", "reason": f"{type(e).__name__}: {e}"}
+
+    prepare = spec.get("prepare") or (lambda: None)
+    timings, extra = [], None
+    try:
+        for repetition in range(args.warmup + args.repeat):
+            prepare()
+            started = time.perf_counter()
+            extra = spec["run"]()
+            elapsed = time.perf_counter() - started
+            if repetition >= args.warmup:
+                timings.append(elapsed)
+    except Exception as e:
+        # One broken benchmark must not cost the rest of the suite its results and comparison
+        return {"status": "error", "reason": f"{type(e).__name__}: {e}"}
+    finally:
+        if spec.get("cleanup"):
+            spec["cleanup"]()
+
+    median = statistics.median(timings)
+    return {
+        "status": "ok",
+        "unit": unit,
+        "units": spec["units"],
+        "seconds": {
+            "min": min(timings),
+            "median": median,
+            "mean": statistics.fmean(timings),
+            "max": max(timings),
+        },
+        "throughput": spec["units"] / median if median else None,
+        **({"metrics": extra} if isinstance(extra, dict) else {}),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Per-benchmark median ratio against the baseline; returns (rows, regressions)."""
+    rows, regressions = [], []
+    for name, result in results["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if result["status"] != "ok" or not base or base.get("status") != "ok":
+            rows.append((name, None, "not compared"))
+            continue
+        ratio = result["seconds"]["median"] / base["seconds"]["median"]
+        if ratio > 1 + threshold:
+            verdict = "REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            verdict = "faster"
+        else:
+            verdict = "ok"
+        rows.append((name, ratio, verdict))
+    return rows, regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time each ingestion and retrieval stage on synthetic data.")
+    parser.add_argument("--only", help=f"Comma-separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--docs", type=int, default=100, help="Synthetic documents / HTML pages")
+    parser.add_argument("--paragraphs", type=int, default=20, help="Paragraphs per document")
+    parser.add_argument("--images", type=int, default=10, help="Images for the OCR benchmark")
+    parser.add_argument("--large-mb", type=int, default=4, help="Document size for the chunk_large benchmarks")
+    parser.add_argument("--embed-texts", type=int, default=512, help="Chunks embedded per run")
+    parser.add_argument("--embed-batch", type=int, default=64)
+    parser.add_argument("--embedding-backend", help="Backend for the embed benchmark (default: EMBEDDING_BACKEND)")
+    parser.add_argument("--vectors", type=int, default=10000, help="Vectors inserted / searched")
+    parser.add_argument("--dim", type=int, default=384, help="Vector dimension (all-MiniLM-L6-v2 is 384)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=4, help="Top-k for searches")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--baseline", help="Results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative median slowdown that counts as a regression")
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.only.split(",")] if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"Unknown benchmark(s): {', '.join(unknown)}")
+
+    params = {key: value for key, value in vars(args).items() if key not in ("only", "output", "baseline", "threshold")}
+    results = {
+        "meta": {
+            "timestamp": time.time(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "params": params,
+        },
+        "results": {},
+    }
+
+    for name in names:
+        print(f"⏱️  {name} ...", flush=True)
+        result = results["results"][name] = run_benchmark(name, args)
+        if result["status"] == "ok":
+            print(f"   median {result['seconds']['median'] * 1000:.1f} ms, "
+                  f"{result['throughput']:.1f} {result['unit']}/s")
+        else:
+            print(f"   {result['status']} ({result['reason']})")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("params") != params:
+            print("⚠️  Baseline was recorded with different parameters; ratios may not be meaningful")
+        rows, regressions = compare(results, baseline, args.threshold)
+        print(f"\nAgainst {args.baseline} (threshold {args.threshold:.0%}):")
+        for name, ratio, verdict in rows:
+            shown = f"{ratio:.2f}x" if ratio is not None else "-"
+            print(f"  {name:<16} {shown:>7}  {verdict}")
+        if regressions:
+            print(f"❌ Regressions: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+"""
+Recall and latency of the vector engines against exact search.
+
+Builds each engine in a temporary directory from the same synthetic vectors, then times
+top-k queries and scores them against brute-force float32 ground truth: recall@k, p50/p95
+query latency, build time and reopen time (how long a restarted process waits before its
+first query). HNSW runs once per --ef value, so the recall/latency trade-off is visible.
+
+Usage (from Backend/):
+    python -m benchmarks.vector_recall
+    python -m benchmarks.vector_recall --vectors 200000 --ef 16,64,256 --output benchmarks/recall.json
+    python -m benchmarks.vector_recall --clusters 0    # uniform vectors, the hardest case for HNSW
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+from benchmarks import corpus
+from benchmarks.run import _percentile
+
+
+def _vectors(args):
+    import numpy as np
+
+    if not args.clusters:
+        return (corpus.unit_vectors(args.vectors, args.dim, args.seed),
+                corpus.unit_vectors(args.queries, args.dim, args.seed + 1))
+    # Real embeddings cluster by topic; points scattered around random centroids mimic that
+    rng = np.random.default_rng(args.seed)
+    centroids = rng.standard_normal((args.clusters, args.dim)).astype("float32")
+
+    def sample(count):
+        points = centroids[rng.integers(0, args.clusters, count)] + 0.6 * rng.standard_normal((count, args.dim))
+        points = points.astype("float32")
+        return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+    return sample(args.vectors), sample(args.queries)
+
+
+def _ground_truth(data, queries, k):
+    import numpy as np
+
+    scores = queries @ data.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def _fill(index, data, page=5000):
+    for start in range(0, len(data), page):
+        block = data[start:start + page]
+        index.upsert(
+            ids=[str(start + i) for i in range(len(block))],
+            embeddings=block.tolist(),
+            documents=[f"chunk {start + i}" for i in range(len(block))],
+            metadatas=[{"row": start + i} for i in range(len(block))],
+        )
+    index.persist()
+
+
+def _chroma_index(path):
+    import chromadb
+
+    from vector_index import ChromaIndex
+
+    class _Store:
+        # Just enough of LangChain's Chroma wrapper for ChromaIndex
+        def __init__(self, collection):
+            self._collection = collection
+
+        def persist(self):
+            pass
+
+    client = chromadb.PersistentClient(path=path)
+    return ChromaIndex(_Store(client.get_or_create_collection("bench")), client, "bench")
+
+
+def _engine_factories(args):
+    from vector_index import MmapIndex, HnswIndex
+
+    factories = [("chroma", _chroma_index), ("mmap", MmapIndex)]
+    for ef in args.ef:
+        factories.append((
+            f"hnsw(M={args.m},ef={ef})",
+            lambda path, ef=ef: HnswIndex(path, m=args.m, ef_construction=args.ef_construction, ef_search=ef),
+        ))
+    return factories
+
+
+def measure(name, factory, data, queries, truth, args):
+    path = tempfile.mkdtemp(prefix="bench-vectors-")
+    try:
+        started = time.perf_counter()
+        index = factory(path)
+        _fill(index, data)
+        build = time.perf_counter() - started
+        del index
+
+        started = time.perf_counter()
+        index = factory(path)
+        index.search(queries[0].tolist(), args.k)
+        reopen = time.perf_counter() - started
+
+        latencies, hits = [], 0
+        for query, expected in zip(queries, truth):
+            started = time.perf_counter()
+            found = index.search(query.tolist(), args.k)
+            latencies.append(time.perf_counter() - started)
+            hits += len({int(doc_id) for doc_id, _, _, _ in found} & set(expected.tolist()))
+        return {
+            "status": "ok",
+            f"recall_at_{args.k}": round(hits / (len(queries) * args.k), 4),
+            "p50_ms": round(_percentile(latencies, 0.5) * 1000, 3),
+            "p95_ms": round(_percentile(latencies, 0.95) * 1000, 3),
+            "build_seconds": round(build, 3),
+            "reopen_seconds": round(reopen, 3),
+            "disk_mb": round(sum(
+                os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files
+            ) / (1024 * 1024), 1),
+        }
+    except Exception as e:
+        # Missing optional dependency (chromadb, hnswlib), ...
+        return {"status": "skipped", "reason": f"{type(e).__name__}: {e}"}
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare vector engines' recall and latency.")
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=384, help="Vector dimension (all-MiniLM-L6-v2 is 384)")
+    parser.add_argument("--clusters", type=int, default=100, help="Topic clusters; 0 for uniform vectors")
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("-m", type=int, default=16, help="HNSW M")
+    parser.add_argument("--ef-construction", type=int, default=200)
+    parser.add_argument("--ef", type=lambda value: [int(v) for v in value.split(",")], default=[16, 64, 256],
+                        help="Comma-separated HNSW ef_search values")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results JSON here")
+    args = parser.parse_args(argv)
+
+    data, queries = _vectors(args)
+    truth = _ground_truth(data, queries, args.k)
+
+    results = {}
+    for name, factory in _engine_factories(args):
+        print(f"⏱️  {name} ...", flush=True)
+        result = results[name] = measure(name, factory, data, queries, truth, args)
+        if result["status"] == "ok":
+            print(f"   recall@{args.k} {result[f'recall_at_{args.k}']:.3f}, p50 {result['p50_ms']} ms, "
+                  f"p95 {result['p95_ms']} ms, build {result['build_seconds']}s, reopen {result['reopen_seconds']}s")
+        else:
+            print(f"   skipped ({result['reason']})")
+
+    if args.output:
+        params = {key: value for key, value in vars(args).items() if key != "output"}
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"params": params, "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,615 @@
+"""
+Bulk ingestion: many URLs or files run through one staged pipeline.
+
+Each stage has its own worker pool and hands items on through a bounded queue, so a slow
+stage holds the ones before it back instead of letting fetched content pile up in memory:
+
+    fetch    (I/O)  download URL content, upload file originals to S3
+    extract  (CPU)  parse files, split everything into chunks
+    embed           embed and store chunks (concurrent items share embedding batches)
+
+The extract threads only parallelize what releases the GIL: large PDFs are parsed on the
+pdf_extract process pool, images on the OCR pool and audio/video on the transcription
+pool, while small PDFs, DOCX parsing and splitting run on the threads themselves.
+Files stream through extract and embed in parts of STREAM_EMBED_BATCH chunks, so no
+stage holds a whole large document's chunks.
+
+Item progress is persisted in SQLite next to the job queue; after a crash, the unfinished
+items of a batch are run again. Chunks are content-addressed, so an item that was cut off
+half-way only embeds what is still missing.
+
+Usage:
+    python bulk_ingest.py --urls bookmarks.txt --dir ~/papers --owner <user id>
+    python bulk_ingest.py --resume <batch id> [--retry-failed]
+"""
+import os
+import json
+import logging
+import time
+import queue
+import shutil
+import sqlite3
+import zipfile
+import argparse
+import threading
+
+import lexical_index
+from jobs import JOBS_DB_PATH, new_job_id
+from observability import configure_logging
+from content_index import get_content_index, file_sha256, source_id, upload_source
+from registry import get_vector_index
+from ingest import (
+    store_chunks, reuse_known_file, upload_original, iter_split_file, fetch_url_documents, split_url_documents,
+    remove_source, STREAM_EMBED_BATCH,
+)
+
+logger = logging.getLogger(__name__)
+
+# --- Bulk Pipeline Configuration ---
+BULK_FETCH_WORKERS = int(os.getenv("BULK_FETCH_WORKERS", "8"))
+BULK_EXTRACT_WORKERS = int(os.getenv("BULK_EXTRACT_WORKERS", str(os.cpu_count() or 2)))
+BULK_EMBED_WORKERS = int(os.getenv("BULK_EMBED_WORKERS", "2"))
+# Items waiting between two stages; a full queue blocks the stage feeding it
+BULK_QUEUE_SIZE = int(os.getenv("BULK_QUEUE_SIZE", "16"))
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "10000"))
+BULK_DIR = os.getenv("BULK_DIR", os.path.join("temp_files", "bulk"))
+
+SUPPORTED_EXTENSIONS = {
+    "pdf", "docx", "txt", "md",
+    "mp3", "mp4", "wav", "m4a", "flac", "ogg",
+    "jpg", "png", "jpeg", "gif", "bmp", "tiff",
+}
+
+QUEUED = "queued"
+FETCHING = "fetching"
+EXTRACTING = "extracting"
+EMBEDDING = "embedding"
+COMPLETED = "completed"
+FAILED = "failed"
+RUNNING = "running"
+
+TERMINAL_STATUSES = (COMPLETED, FAILED)
+
+
+class BulkStore:
+    """Persistent batch and per-item records, in the same SQLite file as the job queue."""
+
+    def __init__(self, db_path=JOBS_DB_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS bulk_batches (
+                    id TEXT PRIMARY KEY,
+                    owner TEXT,
+                    status TEXT NOT NULL,
+                    work_dir TEXT,
+                    total INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS bulk_items (
+                    batch_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    kind TEXT NOT NULL,
+                    target TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (batch_id, idx)
+                )
+                """
+            )
+
+    def create_batch(self, batch_id, items, owner=None, work_dir=None):
+        """`items` are dicts with kind ("url" or "file"), target (URL or path) and name (the source)."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO bulk_batches (id, owner, status, work_dir, total, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (batch_id, owner, RUNNING, work_dir, len(items), now, now),
+            )
+            self._conn.executemany(
+                "INSERT INTO bulk_items (batch_id, idx, kind, target, name, status, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(batch_id, i, item["kind"], item["target"], item["name"], QUEUED, now) for i, item in enumerate(items)],
+            )
+
+    def get_batch(self, batch_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM bulk_batches WHERE id = ?", (batch_id,)).fetchone()
+            if row is None:
+                return None
+            counts = self._conn.execute(
+                "SELECT status, COUNT(*) FROM bulk_items WHERE batch_id = ? GROUP BY status", (batch_id,)
+            ).fetchall()
+        batch = dict(row)
+        batch["counts"] = {status: count for status, count in counts}
+        return batch
+
+    def list_items(self, batch_id, statuses=None, offset=0, limit=-1):
+        query = "SELECT * FROM bulk_items WHERE batch_id = ?"
+        params = [batch_id]
+        if statuses:
+            query += f" AND status IN ({', '.join('?' for _ in statuses)})"
+            params.extend(statuses)
+        query += " ORDER BY idx LIMIT ? OFFSET ?"
+        params.extend([limit, offset])
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        items = []
+        for row in rows:
+            item = dict(row)
+            item["result"] = json.loads(item["result"]) if item["result"] else None
+            items.append(item)
+        return items
+
+    def list_running(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM bulk_batches WHERE status = ? ORDER BY created_at", (RUNNING,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def update_item(self, batch_id, idx, **fields):
+        if fields.get("result") is not None:
+            fields["result"] = json.dumps(fields["result"])
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE bulk_items SET {columns} WHERE batch_id = ? AND idx = ?", (*fields.values(), batch_id, idx)
+            )
+
+    def set_batch_status(self, batch_id, status):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE bulk_batches SET status = ?, updated_at = ? WHERE id = ?", (status, time.time(), batch_id)
+            )
+
+    def requeue_items(self, batch_id, statuses):
+        """Put every item in `statuses` back to queued in one transaction."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE bulk_items SET status = ?, error = NULL, updated_at = ? "
+                f"WHERE batch_id = ? AND status IN ({', '.join('?' for _ in statuses)})",
+                (QUEUED, time.time(), batch_id, *statuses),
+            )
+
+    def remaining(self, batch_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM bulk_items WHERE batch_id = ? AND status NOT IN (?, ?)",
+                (batch_id, *TERMINAL_STATUSES),
+            ).fetchone()
+        return row[0]
+
+
+class _FileProgress:
+    """
+    Shared state of one file whose chunks reach the embed stage in several parts: totals
+    so far, parts still being stored, and whether splitting has finished or the item failed.
+    Whichever stage settles the last outstanding part completes the item, or, once it
+    failed, rolls back what its parts stored.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.parts = 0
+        self.pending = 0
+        self.split_done = False
+        self.failed = False
+        self._reported = False
+        self._rolled_back = False
+        self.totals = {"chunks": 0, "chunks_reused": 0, "chunks_embedded": 0}
+
+    def add_part(self):
+        with self._lock:
+            self.parts += 1
+            self.pending += 1
+
+    def part_stored(self, stored, count, failed=False):
+        """Record one settled part (`stored` is None if it was skipped or failed); True if the file is now complete."""
+        with self._lock:
+            self.pending -= 1
+            self.failed = self.failed or failed
+            if stored is not None:
+                self.totals["chunks"] += count
+                self.totals["chunks_reused"] += stored["chunks_reused"]
+                self.totals["chunks_embedded"] += stored["chunks_embedded"]
+            return self.split_done and not self.pending and not self.failed
+
+    def finish_split(self, failed=False):
+        """Splitting is over; True if every part was already stored."""
+        with self._lock:
+            self.split_done = True
+            self.failed = self.failed or failed
+            return not self.pending and not self.failed
+
+    def fail(self):
+        """True for the first report only, so the item is marked failed once."""
+        with self._lock:
+            first, self._reported = not self._reported, True
+            self.failed = True
+            return first
+
+    def take_rollback(self):
+        """True once, when the item failed and no part can still store chunks."""
+        with self._lock:
+            if not self.failed or not self.split_done or self.pending or self._rolled_back:
+                return False
+            self._rolled_back = True
+            return True
+
+
+class BulkPipeline:
+    """
+    fetch -> extract -> embed, each stage a pool of threads reading from a bounded queue.
+    Items are plain dicts carrying the stage outputs along; a stage that sets
+    item["result"] finishes the item early (e.g. a file whose bytes are already indexed).
+    """
+
+    def __init__(self, store, fetch_workers=BULK_FETCH_WORKERS, extract_workers=BULK_EXTRACT_WORKERS,
+                 embed_workers=BULK_EMBED_WORKERS, queue_size=BULK_QUEUE_SIZE):
+        self.store = store
+        self._stages = [
+            (FETCHING, self._fetch, fetch_workers),
+            (EXTRACTING, self._extract, extract_workers),
+            (EMBEDDING, self._embed, embed_workers),
+        ]
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in self._stages]
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for position, (status, _, workers) in enumerate(self._stages):
+                for n in range(workers):
+                    thread = threading.Thread(
+                        target=self._work, args=(position,), name=f"bulk-{status}-{n}", daemon=True
+                    )
+                    thread.start()
+                    self._threads.append(thread)
+
+    def submit(self, items, owner=None, work_dir=None, batch_id=None):
+        """Persist a new batch and start feeding it into the pipeline. Returns the batch ID."""
+        if len(items) > BULK_MAX_ITEMS:
+            raise ValueError(f"A batch may hold at most {BULK_MAX_ITEMS} items")
+        batch_id = batch_id or new_job_id()
+        self.store.create_batch(batch_id, items, owner=owner, work_dir=work_dir)
+        self._feed(batch_id)
+        return batch_id
+
+    def resume(self, batch_id, retry_failed=False):
+        """Run the unfinished (and optionally the failed) items of a batch again."""
+        statuses = [QUEUED, FETCHING, EXTRACTING, EMBEDDING] + ([FAILED] if retry_failed else [])
+        if not self.store.list_items(batch_id, statuses=statuses, limit=1):
+            return False
+        # Requeue everything before feeding: an item finishing meanwhile must not find the
+        # batch without remaining items while failed ones are still being reset
+        self.store.requeue_items(batch_id, statuses)
+        self.store.set_batch_status(batch_id, RUNNING)
+        self._feed(batch_id)
+        return True
+
+    def recover(self):
+        """Resume every batch a previous process left running."""
+        batch_ids = self.store.list_running()
+        for batch_id in batch_ids:
+            if not self.resume(batch_id):
+                self._finish_batch(batch_id)
+        if batch_ids:
+            logger.info(f"Resumed {len(batch_ids)} unfinished bulk batch(es)")
+        return len(batch_ids)
+
+    def shutdown(self):
+        self._stopping.set()
+
+    def _feed(self, batch_id):
+        self.start()
+        batch = self.store.get_batch(batch_id)
+
+        def feed():
+            # Blocks on the first queue whenever fetching is behind: that is the backpressure
+            for row in self.store.list_items(batch_id, statuses=[QUEUED]):
+                if self._stopping.is_set():
+                    return
+                self._queues[0].put({
+                    "batch_id": batch_id,
+                    "idx": row["idx"],
+                    "kind": row["kind"],
+                    "target": row["target"],
+                    "name": row["name"],
+                    # Files are separate sources per batch item, like uploads (see upload_source)
+                    "source": row["name"] if row["kind"] == "url" else upload_source(row["name"], f"{batch_id}-{row['idx']}"),
+                    "owner": batch["owner"],
+                })
+
+        threading.Thread(target=feed, name=f"bulk-feed-{batch_id[:8]}", daemon=True).start()
+
+    def _work(self, position):
+        status, handler, _ = self._stages[position]
+        inbox = self._queues[position]
+        outbox = self._queues[position + 1] if position + 1 < len(self._queues) else None
+        while not self._stopping.is_set():
+            try:
+                item = inbox.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                self.store.update_item(item["batch_id"], item["idx"], status=status)
+                handler(item)
+            except Exception as e:
+                logger.error(f"Bulk item {item['name']} failed while {status}: {e}")
+                progress = item.get("progress")
+                if progress is None or progress.fail():
+                    self.store.update_item(item["batch_id"], item["idx"], status=FAILED, error=str(e))
+                    self._item_done(item)
+                if progress is not None:
+                    self._settle(item)
+                continue
+
+            if item.get("streamed"):
+                # A file sent on in parts; it completes when its last part is stored
+                continue
+            if item.get("result") is None and outbox is not None:
+                outbox.put(item)
+            else:
+                self.store.update_item(item["batch_id"], item["idx"], status=COMPLETED, result=item.get("result"))
+                self._item_done(item)
+
+    # --- Stages ---
+
+    def _fetch(self, item):
+        if item["kind"] == "url":
+            documents, item["num_images"] = fetch_url_documents(item["target"])
+            if not documents:
+                raise Exception("Could not extract content from URL")
+            item["documents"] = documents
+            return
+
+        file_hash = file_sha256(item["target"])
+        known = get_content_index().get_file(file_hash)
+        reused = reuse_known_file(known, item["name"], item["owner"], source=item["source"])
+        if reused:
+            item["result"] = reused
+            return
+        item["file_hash"] = file_hash
+        item["s3_path"] = upload_original(item["target"], item["name"], file_hash, known)
+
+    def _extract(self, item):
+        if item["kind"] == "url":
+            item["chunks"] = split_url_documents(item.pop("documents"), item["target"])
+            if not item["chunks"]:
+                raise Exception("Could not extract content from URL")
+            return
+
+        progress = item["progress"] = _FileProgress()
+        part = []
+        try:
+            for chunk in iter_split_file(item["target"], item["name"], item["s3_path"], item["source"]):
+                part.append(chunk)
+                if len(part) >= STREAM_EMBED_BATCH:
+                    if not self._send_part(item, part):
+                        break
+                    part = []
+            else:
+                if part:
+                    self._send_part(item, part)
+                if not progress.parts:
+                    raise Exception("Could not extract text from document")
+        except Exception:
+            progress.finish_split(failed=True)
+            raise
+        item["streamed"] = True
+        if progress.finish_split():
+            self._complete_file(item)
+        else:
+            self._settle(item)
+
+    def _send_part(self, item, chunks):
+        """Queue one part for embedding; False once the item failed, so splitting stops."""
+        if item["progress"].failed:
+            return False
+        item["progress"].add_part()
+        # Blocks while the embed stage is behind, like any other hand-off
+        self._queues[-1].put({**item, "chunks": chunks})
+        return True
+
+    def _embed(self, item):
+        chunks = item.pop("chunks")
+        progress = item.get("progress")
+        if progress is not None:
+            item["streamed"] = True
+            try:
+                stored = None if progress.failed else store_chunks(chunks, item["source"], item["owner"])
+            except Exception:
+                progress.part_stored(None, len(chunks), failed=True)
+                raise
+            if progress.part_stored(stored, len(chunks)):
+                self._complete_file(item)
+            else:
+                self._settle(item)
+            return
+
+        stored = store_chunks(chunks, item["source"], item["owner"])
+        get_vector_index(item["owner"]).persist()
+        result = {
+            "source_id": source_id(item["source"], item["owner"]),
+            "chunks": len(chunks),
+            "chunks_reused": stored["chunks_reused"],
+            "chunks_embedded": stored["chunks_embedded"],
+            "num_images_processed": item.get("num_images", 0),
+        }
+        item["result"] = result
+
+    def _complete_file(self, item):
+        get_vector_index(item["owner"]).persist()
+        get_content_index().record_file(item["file_hash"], item["s3_path"], item["source"])
+        result = {
+            "source_id": source_id(item["source"], item["owner"]),
+            "s3_path": item["s3_path"],
+            **item["progress"].totals,
+        }
+        self.store.update_item(item["batch_id"], item["idx"], status=COMPLETED, result=result)
+        self._item_done(item)
+
+    def _settle(self, item):
+        """Once a failed file has no part in flight, remove what its parts stored."""
+        if not item["progress"].take_rollback():
+            return
+        try:
+            # Each bulk item is its own source, so this drops exactly this attempt's chunks
+            remove_source(item["source"], item["owner"])
+        except Exception as e:
+            logger.error(f"Could not roll back bulk item {item['name']}: {e}")
+
+    # --- Bookkeeping ---
+
+    def _item_done(self, item):
+        if not self.store.remaining(item["batch_id"]):
+            self._finish_batch(item["batch_id"])
+
+    def _finish_batch(self, batch_id):
+        with self._lock:
+            batch = self.store.get_batch(batch_id)
+            if batch is None or batch["status"] == COMPLETED:
+                return
+            self.store.set_batch_status(batch_id, COMPLETED)
+        if batch["work_dir"] and not batch["counts"].get(FAILED):
+            shutil.rmtree(batch["work_dir"], ignore_errors=True)
+        logger.info(f"Bulk batch {batch_id} finished: {batch['counts']}")
+
+
+def unpack_archive(archive_path, work_dir):
+    """Extract the supported files of a zip archive into `work_dir`; returns file items."""
+    items = []
+    used_names = set()
+    with zipfile.ZipFile(archive_path) as archive:
+        for info in archive.infolist():
+            name = os.path.basename(info.filename)
+            if info.is_dir() or not name or name.startswith(".") or "__MACOSX" in info.filename:
+                continue
+            if name.rsplit(".", 1)[-1].lower() not in SUPPORTED_EXTENSIONS:
+                continue
+            # Flatten folders; keep names unique so every file stays its own source
+            base, n = name, 1
+            while name in used_names:
+                stem, ext = os.path.splitext(base)
+                name, n = f"{stem} ({n}){ext}", n + 1
+            used_names.add(name)
+            path = os.path.join(work_dir, f"{len(items)}_{name}")
+            with archive.open(info) as src, open(path, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            items.append({"kind": "file", "target": path, "name": name})
+    return items
+
+
+def url_items(urls):
+    return [{"kind": "url", "target": url, "name": url} for url in urls]
+
+
+def parse_url_list(text):
+    """A JSON array of URLs, or one URL per line ('#' starts a comment)."""
+    text = text.strip()
+    if text.startswith("["):
+        return [url.strip() for url in json.loads(text) if url.strip()]
+    return [line.strip() for line in text.splitlines() if line.strip() and not line.strip().startswith("#")]
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def get_bulk_pipeline():
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = BulkPipeline(BulkStore())
+        return _pipeline
+
+
+def _directory_items(directory):
+    items = []
+    for root, _, filenames in os.walk(directory):
+        for filename in sorted(filenames):
+            if filename.rsplit(".", 1)[-1].lower() in SUPPORTED_EXTENSIONS:
+                items.append({"kind": "file", "target": os.path.join(root, filename), "name": filename})
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest many URLs and files through the staged bulk pipeline.")
+    parser.add_argument("--urls", help="File with one URL per line (or a JSON array)")
+    parser.add_argument("--dir", help="Directory whose supported files are ingested (recursively)")
+    parser.add_argument("--archive", help="Zip archive of files to ingest")
+    parser.add_argument("--owner", help="Owner ID (namespace) to ingest into")
+    parser.add_argument("--resume", metavar="BATCH_ID", help="Continue an interrupted batch")
+    parser.add_argument("--retry-failed", action="store_true", help="With --resume, also re-run failed items")
+    parser.add_argument("--interval", type=float, default=2.0, help="Seconds between progress lines")
+    args = parser.parse_args()
+
+    configure_logging()
+    pipeline = get_bulk_pipeline()
+    if args.resume:
+        batch_id = args.resume
+        if pipeline.store.get_batch(batch_id) is None:
+            parser.error(f"Unknown batch {batch_id}")
+        if not pipeline.resume(batch_id, retry_failed=args.retry_failed):
+            print(f"Nothing left to do in batch {batch_id}")
+            return
+    else:
+        batch_id = new_job_id()
+        items = []
+        work_dir = None
+        if args.urls:
+            with open(args.urls, encoding="utf-8") as f:
+                items.extend(url_items(parse_url_list(f.read())))
+        if args.dir:
+            items.extend(_directory_items(args.dir))
+        if args.archive:
+            work_dir = os.path.join(BULK_DIR, batch_id)
+            os.makedirs(work_dir, exist_ok=True)
+            items.extend(unpack_archive(args.archive, work_dir))
+        if not items:
+            parser.error("Nothing to ingest: pass --urls, --dir or --archive")
+        pipeline.submit(items, owner=args.owner, work_dir=work_dir, batch_id=batch_id)
+        print(f"Started batch {batch_id} with {len(items)} items (resume with --resume {batch_id})")
+
+    reported = set()
+    while True:
+        time.sleep(args.interval)
+        # Read the batch first: once it is completed, every item below is final
+        batch = pipeline.store.get_batch(batch_id)
+        for item in pipeline.store.list_items(batch_id, statuses=list(TERMINAL_STATUSES)):
+            if item["idx"] in reported:
+                continue
+            reported.add(item["idx"])
+            if item["status"] == COMPLETED:
+                result = item["result"] or {}
+                print(f"  ✅ {item['name']}: {result.get('chunks', 0)} chunks "
+                      f"({result.get('chunks_embedded', 0)} new)")
+            else:
+                print(f"  ❌ {item['name']}: {item['error']}")
+        print(f"[{batch_id[:8]}] {batch['counts']}")
+        if batch["status"] == COMPLETED:
+            break
+
+    lexical_index.flush_all()
+
+
+if __name__ == "__main__":
+    main()
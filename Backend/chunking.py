@@ -0,0 +1,148 @@
+import os
+import re
+import logging
+from langchain.docstore.document import Document
+
+logger = logging.getLogger(__name__)
+
+# --- Chunking Configuration ---
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+# "chars" sizes chunks by characters; "tokens" by the tokenizer named in CHUNK_TOKENIZER
+# (then CHUNK_SIZE/CHUNK_OVERLAP are token counts)
+CHUNK_UNIT = os.getenv("CHUNK_UNIT", "chars").lower()
+CHUNK_TOKENIZER = os.getenv("CHUNK_TOKENIZER", "sentence-transformers/all-MiniLM-L6-v2")
+
+# Preferred break points, strongest first: paragraph, line, sentence, word
+SEPARATORS = ("\n\n", "\n", ". ", " ")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class TextChunker:
+    """
+    Single-pass splitter producing chunks of at most chunk_size with about chunk_overlap of
+    shared text between neighbours.
+
+    Each chunk ends at the strongest separator in the last three quarters of its window (a
+    paragraph break if there is one, else a line break, a sentence end, a space; a hard cut
+    only for unbroken text). Separators are located with bounded rfind calls over the
+    current window, so the text is scanned a constant number of times and never copied into
+    intermediate splits; chunks are yielded one by one with their start offset.
+
+    With `count_tokens` (a callable text -> token count), sizes are measured in tokens: the
+    window is estimated from the characters-per-token ratio seen so far and shrunk at
+    separators until the chunk fits.
+    """
+
+    def __init__(self, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, count_tokens=None, separators=SEPARATORS):
+        if chunk_overlap >= chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) must be smaller than chunk_size ({chunk_size})")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.count_tokens = count_tokens
+        self.separators = separators
+        self._chars_per_token = 4.0
+
+    # --- Text ---
+
+    def iter_chunks(self, text):
+        """Yield (start_offset, chunk_text) in order; chunk_text == text[start:start + len]."""
+        n = len(text)
+        pos = _skip_whitespace(text, 0)
+        while pos < n:
+            end = self._chunk_end(text, pos)
+            chunk = text[pos:end].rstrip()
+            if chunk:
+                yield pos, chunk
+            if end >= n:
+                break
+            pos = _skip_whitespace(text, self._next_start(text, pos, end))
+
+    def split_text(self, text):
+        return [chunk for _, chunk in self.iter_chunks(text)]
+
+    # --- Documents ---
+
+    def iter_split_documents(self, documents):
+        """Yield chunk Documents carrying their parent's metadata plus `start_index`."""
+        for doc in documents:
+            for start, chunk in self.iter_chunks(doc.page_content):
+                metadata = dict(doc.metadata)
+                metadata["start_index"] = start
+                yield Document(page_content=chunk, metadata=metadata)
+
+    def split_documents(self, documents):
+        return list(self.iter_split_documents(documents))
+
+    # --- Boundaries ---
+
+    def _chunk_end(self, text, pos):
+        if self.count_tokens is None:
+            return self._break_before(text, pos, pos + self.chunk_size)
+
+        limit = pos + int(self.chunk_size * self._chars_per_token)
+        while True:
+            end = self._break_before(text, pos, limit)
+            tokens = self.count_tokens(text[pos:end])
+            if tokens <= self.chunk_size or end - pos <= 1:
+                if tokens and end < len(text):
+                    # Running estimate, so the next window starts close to the right size
+                    self._chars_per_token = 0.8 * self._chars_per_token + 0.2 * ((end - pos) / tokens)
+                return end
+            limit = pos + max(1, int((end - pos) * self.chunk_size / tokens * 0.95))
+
+    def _break_before(self, text, pos, limit):
+        """End of the chunk starting at `pos`: the strongest separator before `limit`."""
+        if limit >= len(text):
+            return len(text)
+        # A break in the first quarter would leave a fragment (e.g. a lone heading); a
+        # weaker separator further on is preferred
+        earliest = pos + max(1, (limit - pos) // 4)
+        for separator in self.separators:
+            i = text.rfind(separator, earliest, limit)
+            if i > pos:
+                # Keep a sentence's full stop with its sentence
+                return i + 1 if separator == ". " else i
+        return limit
+
+    def _next_start(self, text, pos, end):
+        """Start of the next chunk: the first word boundary inside the overlap region."""
+        if self.count_tokens is None:
+            overlap = self.chunk_overlap
+        else:
+            overlap = int(self.chunk_overlap * self._chars_per_token)
+        if overlap <= 0:
+            return end
+        # At most half of a short chunk is repeated, so progress stays linear
+        match = _WHITESPACE.search(text, max(pos + (end - pos) // 2, end - overlap, pos + 1), end)
+        return match.end() if match else end
+
+
+def _skip_whitespace(text, i):
+    n = len(text)
+    while i < n and text[i].isspace():
+        i += 1
+    return i
+
+
+def _token_counter(name):
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(name)
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+
+
+_default_chunker = None
+
+
+def get_chunker():
+    """The shared chunker configured from CHUNK_* (it holds no per-call state in char mode)."""
+    global _default_chunker
+    if _default_chunker is None:
+        if CHUNK_UNIT == "tokens":
+            logger.info(f"Sizing chunks by {CHUNK_TOKENIZER} tokens")
+            _default_chunker = TextChunker(count_tokens=_token_counter(CHUNK_TOKENIZER))
+        else:
+            _default_chunker = TextChunker()
+    return _default_chunker
@@ -0,0 +1,499 @@
+import os
+import re
+import time
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+
+# --- Content Hash Index ---
+# Maps raw file hashes to their stored original and records which sources (and owners)
+# point at each chunk. Chunk IDs are content hashes, so the same paragraph saved from two
+# places is embedded once and stored once in Chroma under the same ID.
+#
+# The sources table doubles as the source catalog: per-source chunk counts, sizes, types
+# and timestamps, kept in the same transaction as the chunk links, so listings and stats
+# never need to scan Chroma.
+
+CONTENT_INDEX_PATH = os.getenv("CONTENT_INDEX_PATH", "./content_index.db")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def file_sha256(file_path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def normalize_text(text):
+    """Normalize unicode forms and whitespace so trivially different copies hash the same."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def chunk_id(text):
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def source_id(source, owner=None):
+    """Stable ID of one owner's copy of a source (a filename or URL), used by /sources/{id}."""
+    return hashlib.sha256(f"{owner or ''}\0{source}".encode("utf-8")).hexdigest()[:32]
+
+
+def upload_source(filename, upload_id):
+    """
+    Source key of one uploaded file. Two uploads with the same name stay separate sources,
+    so deleting or replacing one never touches the other's chunks.
+    """
+    return f"{upload_id}/{filename}"
+
+
+def source_filename(source):
+    """The display filename of a source key (URLs are their own name)."""
+    if source.startswith(("http://", "https://")):
+        return source
+    return source.rsplit("/", 1)[-1]
+
+
+class ContentIndex:
+    def __init__(self, db_path=CONTENT_INDEX_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS files (
+                    sha256 TEXT PRIMARY KEY,
+                    s3_path TEXT,
+                    source TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS chunk_sources (
+                    chunk_id TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    owner TEXT NOT NULL DEFAULT '',
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (chunk_id, source, owner)
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunk_sources_source ON chunk_sources (source)")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sources (
+                    source_id TEXT PRIMARY KEY,
+                    source TEXT NOT NULL,
+                    owner TEXT NOT NULL DEFAULT '',
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunk_sources_owner ON chunk_sources (owner, chunk_id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sources_owner ON sources (owner, updated_at)")
+            # Catalog columns, added in place to databases created before them
+            self._add_column("chunk_sources", "chars", "INTEGER NOT NULL DEFAULT 0")
+            for column, decl in (
+                ("file_type", "TEXT"), ("content_type", "TEXT"), ("s3_path", "TEXT"),
+                ("chunk_count", "INTEGER NOT NULL DEFAULT 0"), ("chars", "INTEGER NOT NULL DEFAULT 0"),
+                ("s3_status", "TEXT"),
+            ):
+                if self._add_column("sources", column, decl) and column == "chunk_count":
+                    self._conn.execute(
+                        "UPDATE sources SET chunk_count = (SELECT COUNT(*) FROM chunk_sources c "
+                        "WHERE c.source = sources.source AND c.owner = sources.owner)"
+                    )
+            if self._conn.execute("SELECT 1 FROM sources LIMIT 1").fetchone() is None:
+                # Sources linked before the table existed
+                rows = self._conn.execute(
+                    "SELECT source, owner, MIN(created_at), MAX(created_at), COUNT(*), SUM(chars) "
+                    "FROM chunk_sources GROUP BY source, owner"
+                ).fetchall()
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO sources (source_id, source, owner, created_at, updated_at, chunk_count, chars) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(source_id(source, owner), source, owner, created, updated, count, chars or 0)
+                     for source, owner, created, updated, count, chars in rows],
+                )
+            # Distinct chunks per owner, kept with the links so stats never count the link table
+            exists = self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'owner_chunks'"
+            ).fetchone()
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS owner_chunks (owner TEXT PRIMARY KEY, chunks INTEGER NOT NULL DEFAULT 0)"
+            )
+            if not exists:
+                self._conn.execute(
+                    "INSERT INTO owner_chunks (owner, chunks) "
+                    "SELECT owner, COUNT(DISTINCT chunk_id) FROM chunk_sources GROUP BY owner"
+                )
+            # Namespaces whose pre-existing chunks were linked by backfill
+            self._conn.execute("CREATE TABLE IF NOT EXISTS backfilled (namespace TEXT PRIMARY KEY, at REAL NOT NULL)")
+            # Originals kept locally because their S3 upload failed (S3_FAILURE_POLICY=pending)
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS pending_uploads (
+                    sha256 TEXT PRIMARY KEY,
+                    local_path TEXT NOT NULL,
+                    local_url TEXT NOT NULL,
+                    s3_key TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+
+    def _add_column(self, table, column, decl):
+        """Add `column` unless it exists; True if it was added."""
+        columns = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+        if column in columns:
+            return False
+        self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+        return True
+
+    def _owned(self, chunk_ids, owner):
+        # Caller holds the lock: the subset of chunk_ids any source of the owner links to
+        owned = set()
+        for start in range(0, len(chunk_ids), 500):
+            block = chunk_ids[start:start + 500]
+            owned.update(row[0] for row in self._conn.execute(
+                f"SELECT DISTINCT chunk_id FROM chunk_sources WHERE owner = ? "
+                f"AND chunk_id IN ({','.join('?' * len(block))})", [owner or ""] + block
+            ))
+        return owned
+
+    def _count_chunks(self, owner, delta):
+        # Caller holds the lock and the transaction
+        if delta:
+            self._conn.execute(
+                "INSERT INTO owner_chunks (owner, chunks) VALUES (?, ?) "
+                "ON CONFLICT(owner) DO UPDATE SET chunks = chunks + excluded.chunks",
+                (owner or "", delta),
+            )
+
+    def _refresh_source(self, source, owner):
+        # Caller holds the lock and the transaction
+        self._conn.execute(
+            """
+            UPDATE sources SET
+                chunk_count = (SELECT COUNT(*) FROM chunk_sources WHERE source = ? AND owner = ?),
+                chars = (SELECT COALESCE(SUM(chars), 0) FROM chunk_sources WHERE source = ? AND owner = ?)
+            WHERE source_id = ?
+            """,
+            (source, owner or "", source, owner or "", source_id(source, owner)),
+        )
+
+    def get_file(self, sha256):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT f.s3_path, f.source, p.sha256 FROM files f LEFT JOIN pending_uploads p ON p.sha256 = f.sha256 "
+                "WHERE f.sha256 = ?", (sha256,)
+            ).fetchone()
+        return {"s3_path": row[0], "source": row[1], "s3_status": "pending" if row[2] else "stored"} if row else None
+
+    def record_file(self, sha256, s3_path, source):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (sha256, s3_path, source, created_at) VALUES (?, ?, ?, ?)",
+                (sha256, s3_path, source, time.time()),
+            )
+
+    def chunks_for_source(self, source):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT chunk_id FROM chunk_sources WHERE source = ?", (source,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def source_chunks(self, source, owner=None):
+        """Chunk IDs linked to one owner's copy of `source`."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_id FROM chunk_sources WHERE source = ? AND owner = ?", (source, owner or "")
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def link_chunks(self, chunk_ids, source, owner=None, sizes=None, info=None):
+        """
+        Link chunks to one owner's copy of `source` and update its catalog entry in the same
+        transaction. `sizes` maps chunk IDs to their length in characters (chunks without
+        one take the size recorded by another source); `info` may carry the source's
+        file_type, content_type and s3_path.
+        Returns the chunk IDs whose link to the source did not exist before.
+        """
+        now = time.time()
+        chunk_ids = list(chunk_ids)
+        sizes = sizes or {}
+        info = info or {}
+        with self._lock, self._conn:
+            linked = set()
+            for start in range(0, len(chunk_ids), 500):
+                block = list(chunk_ids[start:start + 500])
+                linked.update(row[0] for row in self._conn.execute(
+                    f"SELECT chunk_id FROM chunk_sources WHERE source = ? AND owner = ? "
+                    f"AND chunk_id IN ({','.join('?' * len(block))})", [source, owner or ""] + block
+                ))
+            unique = list(dict.fromkeys(chunk_ids))
+            self._count_chunks(owner, len(unique) - len(self._owned(unique, owner)))
+            unsized = [cid for cid in chunk_ids if cid not in sizes]
+            for start in range(0, len(unsized), 500):
+                block = unsized[start:start + 500]
+                sizes.update(self._conn.execute(
+                    f"SELECT chunk_id, MAX(chars) FROM chunk_sources WHERE chunk_id IN ({','.join('?' * len(block))}) "
+                    "GROUP BY chunk_id", block
+                ).fetchall())
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO chunk_sources (chunk_id, source, owner, created_at, chars) VALUES (?, ?, ?, ?, ?)",
+                [(cid, source, owner or "", now, sizes.get(cid) or 0) for cid in chunk_ids],
+            )
+            self._conn.execute(
+                """
+                INSERT INTO sources (source_id, source, owner, created_at, updated_at, file_type, content_type, s3_path, s3_status)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(source_id) DO UPDATE SET
+                    updated_at = excluded.updated_at,
+                    file_type = COALESCE(excluded.file_type, file_type),
+                    content_type = COALESCE(excluded.content_type, content_type),
+                    s3_path = COALESCE(excluded.s3_path, s3_path),
+                    s3_status = CASE WHEN excluded.s3_path IS NULL THEN s3_status ELSE excluded.s3_status END
+                """,
+                (source_id(source, owner), source, owner or "", now, now,
+                 info.get("file_type"), info.get("content_type"), info.get("s3_path"), info.get("s3_status")),
+            )
+            self._refresh_source(source, owner)
+        return [cid for cid in dict.fromkeys(chunk_ids) if cid not in linked]
+
+    def unlink_chunks(self, chunk_ids, source, owner=None):
+        """Drop some of a source's chunk links; a source left without chunks leaves the catalog."""
+        unique = list(dict.fromkeys(chunk_ids))
+        with self._lock, self._conn:
+            before = self._owned(unique, owner)
+            self._conn.executemany(
+                "DELETE FROM chunk_sources WHERE chunk_id = ? AND source = ? AND owner = ?",
+                [(cid, source, owner or "") for cid in unique],
+            )
+            self._count_chunks(owner, len(self._owned(list(before), owner)) - len(before))
+            self._refresh_source(source, owner)
+            self._conn.execute(
+                "UPDATE sources SET updated_at = ? WHERE source_id = ?", (time.time(), source_id(source, owner))
+            )
+            self._conn.execute(
+                "DELETE FROM sources WHERE source_id = ? AND chunk_count = 0", (source_id(source, owner),)
+            )
+
+    def unlink_source(self, source, owner=None):
+        with self._lock, self._conn:
+            chunk_ids = [row[0] for row in self._conn.execute(
+                "SELECT chunk_id FROM chunk_sources WHERE source = ? AND owner = ?", (source, owner or "")
+            )]
+            self._conn.execute(
+                "DELETE FROM chunk_sources WHERE source = ? AND owner = ?", (source, owner or "")
+            )
+            self._count_chunks(owner, len(self._owned(chunk_ids, owner)) - len(chunk_ids))
+            self._conn.execute("DELETE FROM sources WHERE source_id = ?", (source_id(source, owner),))
+
+    def linked_sources(self, chunk_ids, owner=None):
+        """
+        {chunk_id: {source: {"file_type", "content_type", "s3_path"}}} for the sources each
+        chunk is still linked to in the owner's namespace, least recently updated first.
+        """
+        chunk_ids = list(chunk_ids)
+        linked = {}
+        with self._lock:
+            for start in range(0, len(chunk_ids), 500):
+                block = chunk_ids[start:start + 500]
+                rows = self._conn.execute(
+                    "SELECT c.chunk_id, s.source, s.file_type, s.content_type, s.s3_path "
+                    "FROM chunk_sources c JOIN sources s ON s.source = c.source AND s.owner = c.owner "
+                    f"WHERE c.owner = ? AND c.chunk_id IN ({','.join('?' * len(block))}) ORDER BY s.updated_at",
+                    [owner or ""] + block,
+                )
+                for cid, source, file_type, content_type, s3_path in rows:
+                    linked.setdefault(cid, {})[source] = {
+                        "file_type": file_type, "content_type": content_type, "s3_path": s3_path,
+                    }
+        return linked
+
+    def orphaned(self, chunk_ids, owner=None):
+        """The subset of `chunk_ids` no source in the owner's namespace links to any more."""
+        orphans = []
+        with self._lock:
+            for cid in chunk_ids:
+                row = self._conn.execute(
+                    "SELECT 1 FROM chunk_sources WHERE chunk_id = ? AND owner = ? LIMIT 1", (cid, owner or "")
+                ).fetchone()
+                if row is None:
+                    orphans.append(cid)
+        return orphans
+
+    _SOURCE_COLUMNS = (
+        "source_id, source, owner, created_at, updated_at, file_type, content_type, s3_path, chunk_count, chars, s3_status"
+    )
+
+    @staticmethod
+    def _source_row(row):
+        return {
+            "source_id": row[0], "source": row[1], "name": source_filename(row[1]), "owner": row[2] or None,
+            "created_at": row[3], "updated_at": row[4], "file_type": row[5],
+            "content_type": row[6], "s3_path": row[7], "chunks": row[8], "chars": row[9], "s3_status": row[10],
+        }
+
+    def get_source(self, sid):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {self._SOURCE_COLUMNS} FROM sources WHERE source_id = ?", (sid,)
+            ).fetchone()
+        return self._source_row(row) if row else None
+
+    def list_sources(self, owner=None, offset=0, limit=50, file_type=None):
+        """One page of the owner's sources, most recently updated first, and the total count."""
+        where, params = "owner = ?", [owner or ""]
+        if file_type:
+            where += " AND file_type = ?"
+            params.append(file_type)
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM sources WHERE {where}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT {self._SOURCE_COLUMNS} FROM sources WHERE {where} "
+                "ORDER BY updated_at DESC, source_id LIMIT ? OFFSET ?",
+                params + [limit, offset],
+            ).fetchall()
+        return [self._source_row(row) for row in rows], total
+
+    def stats(self, owner=None):
+        """
+        Source and chunk totals with per-file-type and per-content-type breakdowns, for one
+        owner's namespace, or across all of them (then also per owner) when owner is None.
+        A chunk shared by several sources counts once in `chunks` but in each breakdown.
+        """
+        where, params = ("WHERE owner = ?", [owner or ""]) if owner is not None else ("", [])
+        with self._lock:
+            sources, linked, chars = self._conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(chunk_count), 0), COALESCE(SUM(chars), 0) FROM sources {where}", params
+            ).fetchone()
+            chunks = self._conn.execute(
+                f"SELECT COALESCE(SUM(chunks), 0) FROM owner_chunks {where}", params
+            ).fetchone()[0]
+
+            def breakdown(column):
+                rows = self._conn.execute(
+                    f"SELECT COALESCE({column}, 'unknown'), COUNT(*), SUM(chunk_count), SUM(chars) "
+                    f"FROM sources {where} GROUP BY 1 ORDER BY 3 DESC", params
+                ).fetchall()
+                return {key: {"sources": n, "chunks": c, "chars": size} for key, n, c, size in rows}
+
+            result = {
+                "sources": sources,
+                "chunks": chunks,
+                "source_chunks": linked,
+                "chars": chars,
+                "by_file_type": breakdown("file_type"),
+                "by_content_type": breakdown("content_type"),
+            }
+            if owner is None:
+                result["by_owner"] = {
+                    (key or "default"): value for key, value in breakdown("owner").items()
+                }
+        return result
+
+    def is_backfilled(self, namespace):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM backfilled WHERE namespace = ?", (namespace,)
+            ).fetchone() is not None
+
+    def mark_backfilled(self, namespace):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO backfilled (namespace, at) VALUES (?, ?)", (namespace, time.time())
+            )
+
+    def changed_since(self, sources, owner=None, since=0.0):
+        """True if any of one owner's `sources` was updated or removed at or after `since`."""
+        ids = list({source_id(source, owner) for source in sources})
+        if not ids:
+            return False
+        found, latest = 0, 0.0
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                block = ids[start:start + 500]
+                count, updated = self._conn.execute(
+                    f"SELECT COUNT(*), MAX(updated_at) FROM sources WHERE source_id IN ({','.join('?' * len(block))})",
+                    block,
+                ).fetchone()
+                found += count
+                latest = max(latest, updated or 0.0)
+        return found < len(ids) or latest >= since
+
+    # --- Pending S3 uploads ---
+
+    def defer_upload(self, sha256, local_path, local_url, s3_key, s3_url, source):
+        """
+        Record an original whose upload failed: sources pointing at the S3 object it was
+        meant to become point at the local copy instead, marked pending, until
+        complete_upload() runs.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pending_uploads (sha256, local_path, local_url, s3_key, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (sha256, local_path, local_url, s3_key, now),
+            )
+            self._conn.execute(
+                "UPDATE sources SET s3_path = ?, s3_status = 'pending' WHERE s3_path = ?", (local_url, s3_url)
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (sha256, s3_path, source, created_at) VALUES (?, ?, ?, ?)",
+                (sha256, local_url, source, now),
+            )
+
+    def pending_uploads(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT sha256, local_path, local_url, s3_key FROM pending_uploads ORDER BY created_at"
+            ).fetchall()
+        return [{"sha256": r[0], "local_path": r[1], "local_url": r[2], "s3_key": r[3]} for r in rows]
+
+    def complete_upload(self, sha256, s3_url):
+        """Point everything at the uploaded object; returns the (source, owner) pairs that moved."""
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT local_url FROM pending_uploads WHERE sha256 = ?", (sha256,)).fetchone()
+            if row is None:
+                return []
+            moved = [
+                (source, owner or None) for source, owner in self._conn.execute(
+                    "SELECT source, owner FROM sources WHERE s3_path = ?", (row[0],)
+                )
+            ]
+            self._conn.execute("UPDATE sources SET s3_path = ?, s3_status = NULL WHERE s3_path = ?", (s3_url, row[0]))
+            self._conn.execute("UPDATE files SET s3_path = ? WHERE sha256 = ?", (s3_url, sha256))
+            self._conn.execute("DELETE FROM pending_uploads WHERE sha256 = ?", (sha256,))
+        return moved
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM pending_uploads")
+            self._conn.execute("DELETE FROM files")
+            self._conn.execute("DELETE FROM chunk_sources")
+            self._conn.execute("DELETE FROM sources")
+            self._conn.execute("DELETE FROM owner_chunks")
+            self._conn.execute("DELETE FROM backfilled")
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_content_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = ContentIndex()
+        return _index
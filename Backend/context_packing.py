@@ -0,0 +1,171 @@
+import os
+import re
+import math
+from langchain.docstore.document import Document
+
+# --- Context Assembly Configuration ---
+# Retrieved chunks are cut with a 200-character overlap, and several often come from the
+# same page. Before they reach the LLM, neighbours are merged, near-duplicates dropped and
+# the rest packed by relevance into a token budget.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+# Gemini's tokenizer is not available offline; ~4 characters per token holds for English prose
+CONTEXT_CHARS_PER_TOKEN = float(os.getenv("CONTEXT_CHARS_PER_TOKEN", "4"))
+# Share of word 5-grams two passages must have in common to count as near-duplicates
+CONTEXT_DUPLICATE_THRESHOLD = float(os.getenv("CONTEXT_DUPLICATE_THRESHOLD", "0.8"))
+# Without start offsets, a suffix/prefix match at least this long counts as chunk overlap
+MIN_TEXT_OVERLAP = 40
+
+_SHINGLE = 5
+_WORD = re.compile(r"\w+")
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CONTEXT_CHARS_PER_TOKEN) if text else 0
+
+
+class _Passage:
+    __slots__ = ("rank", "text", "metadata", "start", "end")
+
+    def __init__(self, rank, doc):
+        self.rank = rank
+        self.text = doc.page_content
+        self.metadata = doc.metadata or {}
+        start = self.metadata.get("start_index")
+        self.start = start if isinstance(start, int) and start >= 0 else None
+        self.end = self.start + len(self.text) if self.start is not None else None
+
+
+def pack_context(documents, budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Documents to place in the prompt, most relevant first (`documents` must be in
+    relevance order). Overlapping or adjacent chunks of the same source are merged,
+    near-duplicate passages dropped and the remainder packed greedily into `budget`
+    estimated tokens; a top passage larger than the budget is truncated.
+    """
+    passages = _merge_neighbours([_Passage(rank, doc) for rank, doc in enumerate(documents) if doc.page_content])
+    passages = _drop_near_duplicates(sorted(passages, key=lambda p: p.rank))
+
+    packed, used = [], 0
+    for passage in passages:
+        tokens = estimate_tokens(passage.text)
+        if used + tokens > budget:
+            if packed:
+                continue  # a smaller, less relevant passage may still fit
+            passage.text = _truncate(passage.text, budget)
+            tokens = estimate_tokens(passage.text)
+        packed.append(Document(page_content=passage.text, metadata=passage.metadata))
+        used += tokens
+    return packed
+
+
+def _merge_neighbours(passages):
+    groups = {}
+    for passage in passages:
+        key = (passage.metadata.get("source"), passage.metadata.get("page"))
+        groups.setdefault(key, []).append(passage)
+
+    merged = []
+    for group in groups.values():
+        group.sort(key=lambda p: (p.start is None, p.start or 0))
+        joined = [group[0]]
+        for nxt in group[1:]:
+            if not _merge_into(joined[-1], nxt):
+                joined.append(nxt)
+        merged.extend(_merge_unordered(joined))
+    return merged
+
+
+def _merge_unordered(passages):
+    """
+    Retry merges involving passages without offsets until none applies: those arrive in
+    rank order, so a merged pair can overlap a passage the single pass already went by.
+    """
+    merging = True
+    while merging:
+        merging = False
+        for i, current in enumerate(passages):
+            for j in range(i + 1, len(passages)):
+                nxt = passages[j]
+                if (current.start is None or nxt.start is None) and _merge_into(current, nxt):
+                    del passages[j]
+                    merging = True
+                    break
+            if merging:
+                break
+    return passages
+
+
+def _merge_into(current, nxt):
+    """Append `nxt` to `current` if they overlap or touch; False when they are apart."""
+    if current.start is not None and nxt.start is not None:
+        overlap = current.end - nxt.start
+        if overlap > 0:
+            # A source yields several documents (page text, OCR, transcripts) whose offsets
+            # restart at 0, so the offsets must be confirmed by the text itself
+            if overlap > len(nxt.text) or current.text[-overlap:] != nxt.text[:overlap]:
+                return False
+            tail = nxt.text[overlap:]
+        elif overlap >= -2:
+            tail = " " + nxt.text
+        else:
+            return False
+    else:
+        # Without offsets the pair is in rank order, not text order: `nxt` may just as well
+        # be the chunk that precedes `current`
+        overlap = _text_overlap(current.text, nxt.text)
+        if overlap:
+            tail = nxt.text[overlap:]
+        else:
+            overlap = _text_overlap(nxt.text, current.text)
+            if not overlap:
+                return False
+            current.text = nxt.text[:len(nxt.text) - overlap] + current.text
+            tail = ""
+
+    current.text += tail
+    if current.end is not None and nxt.end is not None:
+        current.end = max(current.end, nxt.end)
+    current.rank = min(current.rank, nxt.rank)
+    return True
+
+
+def _text_overlap(left, right):
+    """Length of the longest suffix of `left` that is a prefix of `right` (0 if short)."""
+    for size in range(min(len(left), len(right)), MIN_TEXT_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _shingles(text):
+    words = _WORD.findall(text.lower())
+    if len(words) < _SHINGLE:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + _SHINGLE]) for i in range(len(words) - _SHINGLE + 1)}
+
+
+def _drop_near_duplicates(passages):
+    """Keep the more relevant of any two passages that mostly repeat each other."""
+    kept, kept_shingles = [], []
+    for passage in passages:
+        shingles = _shingles(passage.text)
+        duplicate = shingles and any(
+            len(shingles & other) / min(len(shingles), len(other)) >= CONTEXT_DUPLICATE_THRESHOLD
+            for other in kept_shingles if other
+        )
+        if not duplicate:
+            kept.append(passage)
+            kept_shingles.append(shingles)
+    return kept
+
+
+def _truncate(text, budget):
+    limit = int(budget * CONTEXT_CHARS_PER_TOKEN)
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    # End on a sentence, or at least a word, rather than mid-token
+    boundary = max(cut.rfind(". "), cut.rfind("\n"))
+    if boundary < limit // 2:
+        boundary = cut.rfind(" ")
+    return cut[:boundary + 1].rstrip() if boundary > 0 else cut
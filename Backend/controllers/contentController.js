@@ -1,7 +1,7 @@
 const Content = require('../models/Content');
 const User = require('../models/User');
 const Activity = require('../models/Activity');
-const { ingestContent } = require('../services/mlService');
+const { ingestContent, updateSource, deleteSource } = require('../services/mlService');
 
 /**
  * Helper function to create an activity log for a user action.
@@ -39,7 +39,7 @@ exports.uploadContent = async (req, res) => {
     }
 
     // 1. Call the Python ML service to process the content
-    const mlServicePayload = file ? { file } : { url };
+    const mlServicePayload = file ? { file, ownerId: req.user.id } : { url, ownerId: req.user.id };
     const mlResponse = await ingestContent(mlServicePayload);
 
     // 2. Create the content record in our MongoDB
@@ -51,6 +51,7 @@ exports.uploadContent = async (req, res) => {
       contentType: mlResponse.type || 'unknown',
       source: file ? file.originalname : url,
       s3Path: mlResponse.s3_path || null,
+      mlSourceId: mlResponse.source_id || null,
     };
     
     const content = await Content.create(contentData);
@@ -85,7 +86,8 @@ exports.getAllContent = async (req, res) => {
 };
 
 /**
- * @desc    Update a specific piece of content.
+ * @desc    Update a specific piece of content. A new file (or `refresh=true` for URLs)
+ *          re-ingests it in the ML service, re-embedding only the chunks that changed.
  * @route   PUT /api/content/:id
  * @access  Private
  */
@@ -101,8 +103,16 @@ exports.updateContent = async (req, res) => {
             return res.status(401).json({ success: false, message: 'Not authorized to edit this content' });
         }
         
+        const { refresh, ...updates } = req.body;
+
+        // Re-ingest the new version so retrieval stops returning the old text
+        if ((req.file || refresh === 'true' || refresh === true) && content.mlSourceId) {
+            const mlResponse = await updateSource(content.mlSourceId, { file: req.file, ownerId: req.user.id });
+            updates.s3Path = mlResponse.s3_path || content.s3Path;
+        }
+
         // Update the content with the request body
-        content = await Content.findByIdAndUpdate(req.params.id, req.body, { 
+        content = await Content.findByIdAndUpdate(req.params.id, updates, { 
             new: true, 
             runValidators: true 
         });
@@ -132,6 +142,11 @@ exports.deleteContent = async (req, res) => {
             return res.status(401).json({ success: false, message: 'Not authorized to delete this content' });
         }
 
+        // Remove its chunks first so deleted content never shows up in answers
+        if (content.mlSourceId) {
+            await deleteSource(content.mlSourceId, req.user.id);
+        }
+
         await content.deleteOne();
 
         await logActivity(req.user.id, 'delete_content', req.params.id);
@@ -1,4 +1,4 @@
-const { queryModel } = require('../services/mlService');
+const { queryModel, streamQuery } = require('../services/mlService');
 const Content = require('../models/Content');
 
 /**
@@ -15,17 +15,23 @@ exports.performSearch = async (req, res) => {
     }
 
     // 1. Get the AI-generated answer and sources from the ML service
-    const mlResponse = await queryModel(query);
+    const mlResponse = await queryModel(query, req.user.id);
 
-    // 2. (Optional but recommended) Enhance the sources with data from our DB
-    const sourceIdentifiers = mlResponse.sources.map(s => s.source || s.filename);
+    // 2. (Optional but recommended) Enhance the sources with data from our DB.
+    // File chunks are keyed "<upload id>/<name>" in the ML service, so files match on their
+    // ML source ID or original filename; URLs match on the URL itself.
+    const sourceIds = mlResponse.sources.map(s => s.source_id).filter(Boolean);
+    const sourceNames = mlResponse.sources.flatMap(s => [s.source, s.filename]).filter(Boolean);
     const ourContent = await Content.find({
         user: req.user.id,
-        source: { $in: sourceIdentifiers }
+        $or: [{ mlSourceId: { $in: sourceIds } }, { source: { $in: sourceNames } }]
     });
 
     const enrichedSources = mlResponse.sources.map(source => {
-        const matchingContent = ourContent.find(c => c.source === (source.source || source.filename));
+        const matchingContent =
+            ourContent.find(c => c.mlSourceId && c.mlSourceId === source.source_id) ||
+            ourContent.find(c => c.source === source.source) ||
+            ourContent.find(c => source.s3_path && c.source === source.filename);
         return {
             ...source, // Original source info from ML service
             dbId: matchingContent ? matchingContent._id : null,
@@ -44,4 +50,43 @@ exports.performSearch = async (req, res) => {
     console.error('Search error:', error);
     res.status(500).json({ success: false, message: error.message });
   }
-};
\ No newline at end of file
+};
+
+/**
+ * @desc    Stream a search answer from the ML service as server-sent events
+ * @route   POST /api/search/stream
+ * @access  Private
+ */
+exports.streamSearch = async (req, res) => {
+  const { query } = req.body;
+
+  if (!query) {
+    return res.status(400).json({ success: false, message: 'Query is required' });
+  }
+
+  // Abort the upstream request when the browser goes away so the LLM stops generating
+  const controller = new AbortController();
+  res.on('close', () => {
+    if (!res.writableEnded) {
+      controller.abort();
+    }
+  });
+
+  try {
+    const stream = await streamQuery(query, req.user.id, controller.signal);
+
+    res.writeHead(200, {
+      'Content-Type': 'text/event-stream',
+      'Cache-Control': 'no-cache',
+      Connection: 'keep-alive',
+    });
+    stream.pipe(res);
+    stream.on('error', () => res.end());
+  } catch (error) {
+    if (controller.signal.aborted) {
+      return;
+    }
+    console.error('Streaming search error:', error.message);
+    res.status(500).json({ success: false, message: 'Failed to stream search result from ML service' });
+  }
+};
@@ -0,0 +1,166 @@
+import os
+import logging
+import threading
+from langchain.embeddings.base import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# --- Embedding Backend Configuration ---
+# "sentence-transformers" runs the reference PyTorch model; "onnx" runs the same model
+# through ONNX Runtime, dynamically quantized to int8 by default.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "sentence-transformers").lower()
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "./onnx_models")
+ONNX_QUANTIZE = os.getenv("ONNX_QUANTIZE", "int8").lower()  # "int8" or "none"
+# Intra-op threads per session; 0 lets ONNX Runtime use every physical core
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))
+ONNX_BATCH_SIZE = int(os.getenv("ONNX_BATCH_SIZE", "32"))
+ONNX_MAX_SEQ_LENGTH = int(os.getenv("ONNX_MAX_SEQ_LENGTH", "256"))
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence-transformer embeddings served by ONNX Runtime on CPU.
+
+    The Hugging Face model is exported to ONNX once and, with quantize="int8", its weights
+    are dynamically quantized; both files are cached under model_dir. Pooling matches the
+    reference pipeline of all-MiniLM-L6-v2: attention-masked mean, then L2 normalization.
+    """
+
+    def __init__(self, model_name, model_dir=ONNX_MODEL_DIR, quantize=ONNX_QUANTIZE,
+                 threads=ONNX_THREADS, batch_size=ONNX_BATCH_SIZE, max_seq_length=ONNX_MAX_SEQ_LENGTH):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.quantize = quantize
+        self.threads = threads
+        self.batch_size = batch_size
+        self.max_seq_length = max_seq_length
+
+        directory = os.path.join(model_dir, model_name.replace("/", "__"))
+        model_path = _ensure_onnx_model(_hub_name(model_name), directory, quantize)
+        self.tokenizer = AutoTokenizer.from_pretrained(directory)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def embed_documents(self, texts):
+        import numpy as np
+
+        texts = list(texts)
+        vectors = [None] * len(texts)
+        # Similar lengths share a batch, so little compute is spent on padding
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), self.batch_size):
+            indices = order[start:start + self.batch_size]
+            encoded = self.tokenizer(
+                [texts[i] for i in indices], padding=True, truncation=True,
+                max_length=self.max_seq_length, return_tensors="np",
+            )
+            mask = encoded["attention_mask"].astype(np.int64)
+            feeds = {
+                name: encoded[name].astype(np.int64) if name in encoded else np.zeros_like(mask)
+                for name in self.input_names
+            }
+            hidden = self.session.run(None, feeds)[0]
+            weights = mask[..., None].astype(np.float32)
+            pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            for i, vector in zip(indices, pooled):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def _hub_name(model_name):
+    # sentence-transformers accepts short names for its own models; the hub does not
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+
+_export_lock = threading.Lock()
+
+
+def _ensure_onnx_model(hub_name, directory, quantize):
+    """Path of the (optionally quantized) ONNX model, exporting it on first use."""
+    fp32_path = os.path.join(directory, "model.onnx")
+    int8_path = os.path.join(directory, "model.int8.onnx")
+    with _export_lock:
+        if not os.path.exists(fp32_path):
+            _export(hub_name, directory, fp32_path)
+        if quantize != "int8":
+            return fp32_path
+        if not os.path.exists(int8_path):
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+
+            logger.info(f"Quantizing {fp32_path} to int8")
+            partial = int8_path + ".part"
+            quantize_dynamic(fp32_path, partial, weight_type=QuantType.QInt8)
+            os.replace(partial, int8_path)
+        return int8_path
+
+
+def _export(hub_name, directory, path):
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    logger.info(f"Exporting {hub_name} to ONNX in {directory}")
+    os.makedirs(directory, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(hub_name)
+    model = AutoModel.from_pretrained(hub_name).eval()
+    sample = tokenizer(["An example sentence to trace the graph."], return_tensors="pt")
+    # BERT-style forward(input_ids, attention_mask, token_type_ids) positional order
+    names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    axes = {name: {0: "batch", 1: "sequence"} for name in names + ["last_hidden_state"]}
+    partial = path + ".part"
+    with torch.no_grad():
+        torch.onnx.export(
+            model, tuple(sample[name] for name in names), partial,
+            input_names=names, output_names=["last_hidden_state"],
+            dynamic_axes=axes, opset_version=14,
+        )
+    tokenizer.save_pretrained(directory)
+    os.replace(partial, path)
+
+
+def _create_sentence_transformers(model_name):
+    from langchain.embeddings import SentenceTransformerEmbeddings
+    return SentenceTransformerEmbeddings(model_name=model_name)
+
+
+def _create_onnx(model_name, quantize=ONNX_QUANTIZE):
+    return OnnxEmbeddings(model_name, quantize=quantize)
+
+
+BACKENDS = {
+    "sentence-transformers": _create_sentence_transformers,
+    "onnx": _create_onnx,
+    # Same runtime without quantization; mainly for the accuracy check
+    "onnx-fp32": lambda model_name: _create_onnx(model_name, quantize="none"),
+}
+
+
+def embedding_space(model_name, backend=None):
+    """
+    Identifier of the vector space `model_name` produces on a backend. Vectors are only
+    comparable within one space: the int8 model's vectors drift from the fp32 ones.
+    """
+    backend = (backend or EMBEDDING_BACKEND).lower()
+    if backend == "onnx":
+        precision = "int8" if ONNX_QUANTIZE == "int8" else "fp32"
+    else:
+        precision = "fp32"
+    return f"{model_name}|{backend}|{precision}"
+
+
+def create_embeddings(model_name, backend=None):
+    """Unwrapped LangChain embeddings for `model_name` on the configured backend."""
+    backend = (backend or EMBEDDING_BACKEND).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}'; expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[backend](model_name)
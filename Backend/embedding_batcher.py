@@ -0,0 +1,167 @@
+import os
+import time
+import queue
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from langchain.embeddings.base import Embeddings
+
+# --- Micro-batching Configuration ---
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "64"))
+EMBED_BATCH_MAX_WAIT_MS = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "10"))
+
+logger = logging.getLogger(__name__)
+
+
+class _Request:
+    __slots__ = ("texts", "future", "enqueued_at")
+
+    def __init__(self, texts):
+        self.texts = texts
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class BatchingEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that coalesces concurrent embed calls into shared forward passes.
+
+    Callers from any thread (ingestion workers, the query threadpool) enqueue their texts
+    and block on a future; one background thread drains the queue into batches of up to
+    max_batch_size texts, waiting at most max_wait_ms for a batch to fill.
+
+    Queries go through the same batches as documents, which is correct for symmetric
+    sentence-transformer models such as all-MiniLM-L6-v2.
+    """
+
+    def __init__(self, base, max_batch_size=EMBED_BATCH_MAX_SIZE, max_wait_ms=EMBED_BATCH_MAX_WAIT_MS):
+        self.base = base
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+
+    # --- Embeddings interface ---
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        return self._submit(list(texts)).result()
+
+    def embed_query(self, text):
+        return self._submit([text]).result()[0]
+
+    async def aembed_documents(self, texts):
+        if not texts:
+            return []
+        return await asyncio.wrap_future(self._submit(list(texts)))
+
+    async def aembed_query(self, text):
+        return (await asyncio.wrap_future(self._submit([text])))[0]
+
+    # --- Batching ---
+
+    def _submit(self, texts):
+        self._ensure_worker()
+        request = _Request(texts)
+        self._queue.put(request)
+        return request.future
+
+    def _ensure_worker(self):
+        # A forked child inherits the object but not the thread, so restart per process
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._stats_lock = threading.Lock()
+            thread = threading.Thread(target=self._worker, name="embed-batcher", daemon=True)
+            thread.start()
+            self._pid = os.getpid()
+
+    def _worker(self):
+        # The only consumer of the queue: a failure here must not stop the thread, or every
+        # later embed call would wait forever
+        while True:
+            try:
+                self._next_batch()
+            except Exception:
+                logger.exception("Embedding batch failed")
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        size = len(batch[0].texts)
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.texts)
+
+        # Requests cancelled while queued (e.g. an aembed_* task that was cancelled) are
+        # dropped; the rest can no longer be cancelled, so setting their result is safe
+        batch = [request for request in batch if request.future.set_running_or_notify_cancel()]
+        if batch:
+            self._run_batch(batch, sum(len(request.texts) for request in batch))
+
+    def _run_batch(self, batch, size):
+        started = time.perf_counter()
+        texts = [text for request in batch for text in request.texts]
+        try:
+            vectors = self.base.embed_documents(texts)
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        offset = 0
+        for request in batch:
+            request.future.set_result(vectors[offset:offset + len(request.texts)])
+            offset += len(request.texts)
+
+        with self._stats_lock:
+            self._stats["batches"] += 1
+            self._stats["requests"] += len(batch)
+            self._stats["texts"] += size
+            self._stats["max_batch_size"] = max(self._stats["max_batch_size"], size)
+            for request in batch:
+                wait = started - request.enqueued_at
+                self._stats["queue_wait_seconds_total"] += wait
+                self._stats["max_queue_wait_seconds"] = max(self._stats["max_queue_wait_seconds"], wait)
+            self._stats["embed_seconds_total"] += time.perf_counter() - started
+
+    # --- Counters ---
+
+    def _reset_stats(self):
+        self._stats = {
+            "batches": 0,
+            "requests": 0,
+            "texts": 0,
+            "max_batch_size": 0,
+            "queue_wait_seconds_total": 0.0,
+            "max_queue_wait_seconds": 0.0,
+            "embed_seconds_total": 0.0,
+        }
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        batches = stats["batches"] or 1
+        requests = stats["requests"] or 1
+        stats["avg_batch_size"] = round(stats["texts"] / batches, 2)
+        stats["avg_requests_per_batch"] = round(stats["requests"] / batches, 2)
+        stats["avg_queue_wait_ms"] = round(stats["queue_wait_seconds_total"] / requests * 1000, 3)
+        stats["max_queue_wait_ms"] = round(stats.pop("max_queue_wait_seconds") * 1000, 3)
+        stats.pop("queue_wait_seconds_total")
+        stats["texts_per_second"] = round(stats["texts"] / stats["embed_seconds_total"], 1) if stats["embed_seconds_total"] else None
+        stats["embed_seconds_total"] = round(stats["embed_seconds_total"], 3)
+        return stats
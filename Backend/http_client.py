@@ -0,0 +1,136 @@
+import os
+import asyncio
+import threading
+import importlib.util
+from urllib.parse import urlparse
+import httpx
+
+# --- Shared HTTP Client Configuration ---
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_PER_HOST_LIMIT = int(os.getenv("HTTP_PER_HOST_LIMIT", "6"))
+
+HEADERS = {"User-Agent": "Mozilla/5.0"}
+
+
+class HttpClient:
+    """
+    One pooled httpx.AsyncClient for every outbound fetch in the ML service.
+
+    Connections are kept alive and reused (HTTP/2 when the `h2` package is installed),
+    each host gets at most HTTP_PER_HOST_LIMIT concurrent requests, and every request has
+    a timeout. The client lives on its own event loop thread, so coroutine callers await
+    the async methods while worker-thread code uses the blocking get()/download() wrappers.
+    """
+
+    def __init__(self):
+        self._pid = None
+        self._lock = threading.Lock()
+
+    # --- Event loop management ---
+
+    def _ensure_loop(self):
+        # Sockets and the loop thread do not survive a fork, so start fresh per process
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._loop = asyncio.new_event_loop()
+            self._client = None
+            self._host_limits = {}
+            thread = threading.Thread(target=self._loop.run_forever, name="http-client", daemon=True)
+            thread.start()
+            self._pid = os.getpid()
+
+    def _run(self, coroutine):
+        self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=importlib.util.find_spec("h2") is not None,
+                headers=HEADERS,
+                follow_redirects=True,
+                timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                ),
+            )
+        return self._client
+
+    def _host_limit(self, url):
+        host = urlparse(url).netloc.lower()
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(HTTP_PER_HOST_LIMIT)
+        return self._host_limits[host]
+
+    # --- Async API (must run on the client's loop; use the sync wrappers elsewhere) ---
+
+    async def _request(self, method, url, **kwargs):
+        async with self._host_limit(url):
+            return await self._get_client().request(method, url, **kwargs)
+
+    async def _download(self, url, fileobj, chunk_size=65536, **kwargs):
+        total = 0
+        async with self._host_limit(url):
+            async with self._get_client().stream("GET", url, **kwargs) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes(chunk_size):
+                    fileobj.write(chunk)
+                    total += len(chunk)
+        return total
+
+    async def _get_prefix(self, url, max_bytes, **kwargs):
+        # Ask for a byte range, and stop reading anyway once max_bytes arrived in case the
+        # server ignores Range and sends the whole body
+        headers = {**kwargs.pop("headers", {}), "Range": f"bytes=0-{max_bytes - 1}"}
+        data = bytearray()
+        async with self._host_limit(url):
+            async with self._get_client().stream("GET", url, headers=headers, **kwargs) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes():
+                    data.extend(chunk)
+                    if len(data) >= max_bytes:
+                        break
+        return response, bytes(data[:max_bytes])
+
+    async def arequest(self, method, url, **kwargs):
+        """Await a request from any event loop; the work runs on the client's loop."""
+        self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(self._request(method, url, **kwargs), self._loop)
+        return await asyncio.wrap_future(future)
+
+    async def aget(self, url, **kwargs):
+        return await self.arequest("GET", url, **kwargs)
+
+    # --- Blocking API for worker threads ---
+
+    def request(self, method, url, **kwargs):
+        return self._run(self._request(method, url, **kwargs))
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request("HEAD", url, **kwargs)
+
+    def get_prefix(self, url, max_bytes, **kwargs):
+        """(response, first max_bytes of the body); the response body itself is not read."""
+        return self._run(self._get_prefix(url, max_bytes, **kwargs))
+
+    def download(self, url, fileobj, **kwargs):
+        """Stream a response body into an open binary file without buffering it in memory."""
+        return self._run(self._download(url, fileobj, **kwargs))
+
+    def close(self):
+        if self._pid == os.getpid() and self._client is not None:
+            self._run(self._client.aclose())
+            self._client = None
+
+
+http_client = HttpClient()
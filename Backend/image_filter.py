@@ -0,0 +1,254 @@
+import os
+import re
+import logging
+from io import BytesIO
+from urllib.parse import urljoin, urlparse
+from concurrent.futures import ThreadPoolExecutor
+from http_client import http_client
+from media_cache import get_media_cache, OCR
+
+logger = logging.getLogger(__name__)
+
+# --- Image Pre-filter Configuration ---
+# Web pages are full of icons, tracking pixels, avatars and photos without text. Images
+# go through cheap checks, cheapest first, before any of them reaches Tesseract:
+#   1. HTML: URL patterns, declared sizes and srcset hints (no network)
+#   2. A ranged request: content type and total size from the first few KB
+#   3. Dimensions decoded from those bytes (image header only)
+#   4. A text-likelihood score on a downscaled copy
+# Survivors are ranked by that score so the OCR slots go to the likeliest text images.
+IMAGE_MIN_SIDE = int(os.getenv("IMAGE_MIN_SIDE", "100"))
+IMAGE_MIN_BYTES = int(os.getenv("IMAGE_MIN_BYTES", "2048"))
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(10 * 1024 * 1024)))
+IMAGE_PROBE_BYTES = int(os.getenv("IMAGE_PROBE_BYTES", "32768"))
+# Images probed per page, and how many of those are downloaded in full to be scored
+IMAGE_MAX_PROBES = int(os.getenv("IMAGE_MAX_PROBES", "30"))
+IMAGE_MAX_SCORED = int(os.getenv("IMAGE_MAX_SCORED", "12"))
+IMAGE_TEXT_MIN_SCORE = float(os.getenv("IMAGE_TEXT_MIN_SCORE", "0.25"))
+IMAGE_PROBE_WORKERS = int(os.getenv("IMAGE_PROBE_WORKERS", "8"))
+IMAGE_TIMEOUT = float(os.getenv("IMAGE_TIMEOUT", "15"))
+# Largest srcset candidate worth fetching; beyond this OCR gains nothing
+IMAGE_MAX_SRCSET_WIDTH = int(os.getenv("IMAGE_MAX_SRCSET_WIDTH", "2000"))
+
+# Whole words of the path only, bounded by separators or digits: "site-logo_2x" matches,
+# "silicon" and "soundtrack" do not. Plus an /ad(s)/ segment and 1x1 pixels.
+_SKIP_URL = re.compile(
+    r"(?<![a-z])(pixel|track(ing|er)?|beacon|spacer|blank|transparent|avatar|profile[_-]?(pic(ture)?|image|photo)|"
+    r"favicon|icon|logo|emoji|badge|sprite|button|spinner|loading|placeholder|doubleclick|gravatar)s?(?![a-z])|"
+    r"/ads?/|(?<![0-9])1x1(?![0-9])",
+    re.IGNORECASE,
+)
+_SKIP_EXTENSIONS = (".svg", ".ico", ".gif")
+_TEXT_HINT = re.compile(
+    r"(screenshot|screen[_-]?shot|chart|diagram|slide|table|infographic|graph|figure|scan|"
+    r"document|quote|code|whiteboard|notes|receipt|poster|meme|comic)",
+    re.IGNORECASE,
+)
+_SKIP_CONTENT_TYPES = ("image/svg+xml", "image/gif", "image/x-icon", "image/vnd.microsoft.icon")
+
+
+class ImageCandidate:
+    __slots__ = ("url", "hint", "data", "size", "width", "height", "score", "cached_text")
+
+    def __init__(self, url, hint=0.0):
+        self.url = url
+        self.hint = hint
+        self.data = None
+        self.size = None
+        self.width = self.height = None
+        self.score = 0.0
+        self.cached_text = None
+
+
+# --- 1. HTML ---
+
+def candidates_from_html(soup, base_url):
+    """Image candidates of a parsed page, in order of their HTML text hints, minus obvious misses."""
+    seen, candidates = set(), []
+    for position, img in enumerate(soup.find_all("img")):
+        src = _pick_source(img)
+        if not src or src.startswith("data:"):
+            continue
+        url = urljoin(base_url, src)
+        path = urlparse(url).path.lower()
+        if url in seen or path.endswith(_SKIP_EXTENSIONS) or _SKIP_URL.search(path):
+            continue
+        width, height = _int_attr(img, "width"), _int_attr(img, "height")
+        if (width and width < IMAGE_MIN_SIDE) or (height and height < IMAGE_MIN_SIDE):
+            continue
+        seen.add(url)
+
+        described = " ".join(filter(None, [img.get("alt"), img.get("title"), " ".join(img.get("class") or [])]))
+        hint = 1.0 if _TEXT_HINT.search(described) or _TEXT_HINT.search(path) else 0.0
+        if img.find_parent("figure") is not None:
+            hint += 0.5
+        # Earlier images are usually the article's own; later ones are often related-post thumbnails
+        candidates.append(ImageCandidate(url, hint - position * 0.01))
+    candidates.sort(key=lambda c: -c.hint)
+    return candidates
+
+
+def _pick_source(img):
+    """The best URL from srcset (largest width up to IMAGE_MAX_SRCSET_WIDTH), else src."""
+    srcset = img.get("srcset") or img.get("data-srcset")
+    options = []
+    for entry in (srcset or "").split(","):
+        parts = entry.strip().split()
+        if not parts:
+            continue
+        descriptor, width = parts[1] if len(parts) > 1 else "", 0
+        try:
+            if descriptor.endswith("w"):
+                width = int(descriptor[:-1])
+            elif descriptor.endswith("x"):
+                # Density only: assume a 1x image is about 1000px wide
+                width = int(float(descriptor[:-1]) * 1000)
+        except ValueError:
+            pass
+        options.append((width, parts[0]))
+    fitting = [option for option in options if option[0] <= IMAGE_MAX_SRCSET_WIDTH]
+    best = max(fitting)[1] if fitting else (min(options)[1] if options else None)
+    return best or img.get("src") or img.get("data-src")
+
+
+def _int_attr(img, name):
+    try:
+        return int(str(img.get(name, "")).strip().rstrip("px"))
+    except ValueError:
+        return None
+
+
+# --- 2 + 3. Ranged request and header decode ---
+
+def _probe(candidate):
+    """Fill in size and dimensions; False when the image can be skipped."""
+    hit, text = get_media_cache().get(OCR, url=candidate.url)
+    if hit:
+        # OCR'd before: no need to look at it again
+        candidate.cached_text = text
+        candidate.score = 1.0 if text else 0.0
+        return bool(text)
+
+    response, prefix = http_client.get_prefix(candidate.url, IMAGE_PROBE_BYTES, timeout=IMAGE_TIMEOUT)
+    content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type and (not content_type.startswith("image/") or content_type in _SKIP_CONTENT_TYPES):
+        return False
+
+    candidate.size = _total_size(response, prefix)
+    if candidate.size is not None and not IMAGE_MIN_BYTES <= candidate.size <= IMAGE_MAX_BYTES:
+        return False
+    if candidate.size is not None and candidate.size <= len(prefix):
+        candidate.data = prefix
+
+    dimensions = _header_dimensions(prefix)
+    if dimensions:
+        candidate.width, candidate.height = dimensions
+        if min(dimensions) < IMAGE_MIN_SIDE or max(dimensions) > 12 * min(dimensions):
+            # Too small to hold legible text, or a divider/banner strip
+            return False
+    return True
+
+
+def _total_size(response, prefix):
+    content_range = response.headers.get("content-range", "")
+    if "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        if total.isdigit():
+            return int(total)
+    if response.status_code == 200:
+        length = response.headers.get("content-length")
+        if length and length.isdigit():
+            return int(length)
+        if len(prefix) < IMAGE_PROBE_BYTES:
+            return len(prefix)
+    return None
+
+
+def _header_dimensions(prefix):
+    """(width, height) from the image header alone; Pillow reads no pixel data here."""
+    from PIL import Image
+    try:
+        with Image.open(BytesIO(prefix)) as img:
+            return img.size
+    except Exception:
+        return None
+
+
+# --- 4. Text likelihood ---
+
+def text_score(data, side=256):
+    """
+    0..1 estimate of how likely an image holds text, from a grayscale copy at most `side`
+    pixels wide: dense strong edges, a high-contrast histogram, and rows alternating
+    between ink and blank space (lines of text) push it up; smooth photos score low.
+    """
+    from PIL import Image, ImageFilter, ImageStat
+
+    with Image.open(BytesIO(data)) as img:
+        # JPEG can decode straight to a reduced size, skipping most of the work
+        img.draft("L", (side, side))
+        gray = img.convert("L")
+    gray.thumbnail((side, side))
+    width, height = gray.size
+    if width < 8 or height < 8:
+        return 0.0
+
+    edges = gray.filter(ImageFilter.FIND_EDGES).point(lambda p: 255 if p > 64 else 0)
+    edge_density = ImageStat.Stat(edges).mean[0] / 255
+
+    histogram = gray.histogram()
+    contrast = (sum(histogram[:64]) + sum(histogram[192:])) / (width * height)
+
+    rows = list(edges.resize((1, height), Image.BILINEAR).getdata())
+    inked = [value > 8 for value in rows]
+    transitions = sum(1 for a, b in zip(inked, inked[1:]) if a != b)
+    line_structure = min(1.0, transitions / max(1, height / 12))
+
+    return round(0.45 * min(1.0, edge_density / 0.12) + 0.25 * contrast + 0.30 * line_structure, 4)
+
+
+def _score(candidate):
+    if candidate.data is None:
+        # Streamed with a cap: the probe could not always learn the size
+        _, data = http_client.get_prefix(candidate.url, IMAGE_MAX_BYTES + 1, timeout=IMAGE_TIMEOUT)
+        if len(data) > IMAGE_MAX_BYTES:
+            return False
+        candidate.data = data
+    candidate.score = text_score(candidate.data)
+    return candidate.score >= IMAGE_TEXT_MIN_SCORE
+
+
+# --- Pipeline ---
+
+_pool = ThreadPoolExecutor(max_workers=IMAGE_PROBE_WORKERS, thread_name_prefix="image-filter")
+
+
+def _passing(step, candidates):
+    futures = [(candidate, _pool.submit(step, candidate)) for candidate in candidates]
+    kept = []
+    for candidate, future in futures:
+        try:
+            if future.result(timeout=IMAGE_TIMEOUT * 2):
+                kept.append(candidate)
+        except Exception as e:
+            logger.debug(f"Skipping image {candidate.url}: {e!r}")
+    return kept
+
+
+def rank_images(candidates):
+    """
+    Candidates worth OCR, likeliest text first. Returned candidates carry their downloaded
+    bytes in `data`, or `cached_text` when the URL was OCR'd before.
+    """
+    probed = _passing(_probe, candidates[:IMAGE_MAX_PROBES])
+    cached = [c for c in probed if c.cached_text]
+    fresh = [c for c in probed if not c.cached_text]
+    # Bigger images of known size first: more pixels, more room for text
+    fresh.sort(key=lambda c: (-c.hint, -((c.width or 0) * (c.height or 0))))
+    scored = _passing(_score, fresh[:IMAGE_MAX_SCORED])
+    scored.sort(key=lambda c: (-c.score, -c.hint))
+    logger.info(
+        f"Image pre-filter: {len(candidates)} candidates, {len(probed)} passed probing, "
+        f"{len(scored)} likely text, {len(cached)} cached"
+    )
+    return cached + scored
@@ -1,19 +1,61 @@
 import os
+import time
+import logging
+import shutil
 import boto3
-from langchain.document_loaders import PyPDFLoader, UnstructuredURLLoader, Docx2txtLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.embeddings import SentenceTransformerEmbeddings
-from langchain.vectorstores import Chroma
-import pytesseract
-from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+from boto3.s3.transfer import TransferConfig
+from langchain.document_loaders import UnstructuredURLLoader, Docx2txtLoader
 from langchain.docstore.document import Document
 from dotenv import load_dotenv
+from registry import get_vector_index, get_embeddings, list_collections, namespace_index, DEFAULT_COLLECTION
+from observability import stage_timer, observe_stage, count_chunks, extractor_error
+from ocr import ocr_image_file
+from media_cache import get_media_cache, TRANSCRIPT
+from answer_cache import get_answer_cache
+from lexical_index import get_lexical_index
+from content_index import get_content_index, file_sha256, chunk_id, source_id, source_filename
+from pdf_extract import iter_pdf_pages, iter_docx_sections
+from chunking import get_chunker
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 
 # --- AWS S3 Configuration ---
 S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME", "second-brain-bucket1")
 
+# Chunks are embedded and stored in batches of this size while a document streams through
+STREAM_EMBED_BATCH = int(os.getenv("STREAM_EMBED_BATCH", "256"))
+
+# Metadata that locates a chunk within the source it was split from; meaningless once the
+# chunk is re-attributed to another source
+_POSITION_KEYS = ("page", "section", "start_index", "start_time", "end_time")
+
+# Point at a local S3 stand-in (MinIO, moto server, LocalStack) for development and tests
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+
+# Originals are uploaded in the background while the file is parsed and embedded.
+# Files above the threshold go up as multipart uploads with parts sent in parallel.
+S3_MULTIPART_THRESHOLD = int(os.getenv("S3_MULTIPART_THRESHOLD_MB", "8")) * 1024 * 1024
+S3_MULTIPART_CHUNKSIZE = int(os.getenv("S3_MULTIPART_CHUNKSIZE_MB", "8")) * 1024 * 1024
+S3_UPLOAD_CONCURRENCY = int(os.getenv("S3_UPLOAD_CONCURRENCY", "8"))
+# What to do with the indexed chunks when the upload fails after processing:
+# "rollback" removes them again, "pending" keeps them pointing at a local copy of the
+# original (s3_status "pending") until retry_pending_uploads() gets it into S3
+S3_FAILURE_POLICY = os.getenv("S3_FAILURE_POLICY", "rollback").lower()
+S3_PENDING_DIR = os.getenv("S3_PENDING_DIR", "./pending_uploads")
+
+s3_transfer_config = TransferConfig(
+    multipart_threshold=S3_MULTIPART_THRESHOLD,
+    multipart_chunksize=S3_MULTIPART_CHUNKSIZE,
+    max_concurrency=S3_UPLOAD_CONCURRENCY,
+    use_threads=True,
+)
+_upload_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("S3_UPLOAD_WORKERS", "4")), thread_name_prefix="s3-upload"
+)
+
 # Try to initialize S3 client with explicit credentials first, fall back to default
 try:
     if os.getenv("AWS_ACCESS_KEY_ID") and os.getenv("AWS_SECRET_ACCESS_KEY"):
@@ -21,63 +63,96 @@ try:
             's3',
             aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
             aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-            region_name=os.getenv("AWS_REGION", "us-east-1")
+            region_name=os.getenv("AWS_REGION", "us-east-1"),
+            endpoint_url=S3_ENDPOINT_URL,
         )
-        print("Using AWS credentials from environment variables")
+        logger.info("Using AWS credentials from environment variables")
     else:
-        s3_client = boto3.client('s3')
-        print("Using default AWS credentials (AWS CLI or IAM role)")
+        s3_client = boto3.client('s3', endpoint_url=S3_ENDPOINT_URL)
+        logger.info("Using default AWS credentials (AWS CLI or IAM role)")
+    if S3_ENDPOINT_URL:
+        logger.info(f"Using S3 endpoint {S3_ENDPOINT_URL}")
 except Exception as e:
-    print(f"Warning: Could not initialize S3 client: {e}")
+    logger.warning(f"Could not initialize S3 client: {e}")
     s3_client = None
 
-# --- Vector DB and Embeddings Configuration ---
-embedding_function = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
-vector_db = Chroma(persist_directory="./chroma_db", embedding_function=embedding_function)
-
 # --- Helper Functions for Data Extraction ---
 
+def iter_pdf_documents(file_path):
+    """One Document per page, produced lazily; metadata matches PyPDFLoader's."""
+    for page, text in iter_pdf_pages(file_path):
+        yield Document(page_content=text, metadata={"source": file_path, "page": page})
+
+def iter_docx_documents(file_path):
+    """Paragraph groups of a DOCX produced lazily; falls back to docx2txt without python-docx."""
+    try:
+        import docx  # noqa: F401
+    except ImportError:
+        yield from Docx2txtLoader(file_path).load()
+        return
+    for section, text in iter_docx_sections(file_path):
+        yield Document(page_content=text, metadata={"source": file_path, "section": section})
+
 def extract_text_from_pdf(file_path):
-    loader = PyPDFLoader(file_path)
-    return loader.load()
+    return list(iter_pdf_documents(file_path))
 
 def extract_text_from_docx(file_path):
-    loader = Docx2txtLoader(file_path)
-    return loader.load()
+    return list(iter_docx_documents(file_path))
 
-def transcribe_audio_video(file_path):
+def transcribe_audio_video(file_path, source_url=None):
     """
-    Transcribe audio/video files using OpenAI Whisper.
+    Transcribe audio/video files using OpenAI Whisper on the shared transcription pool.
+    Returns one Document per stretch of speech, with start_time/end_time in metadata.
+    Results are cached by file hash (and by `source_url`, when given).
     Falls back to a placeholder if Whisper is not available.
     """
+    from transcription import transcribe_file, TranscriptionQueueFull
     try:
-        # Try to import and use whisper
-        import whisper
-        print(f"Transcribing audio/video file: {file_path}")
-        model = whisper.load_model("base")
-        result = model.transcribe(file_path)
-        return [Document(page_content=result["text"])]
+        cache = get_media_cache()
+        content_hash = file_sha256(file_path)
+        hit, cached = cache.get(TRANSCRIPT, content_hash=content_hash)
+        if hit:
+            logger.info(f"Using cached transcript for: {file_path}")
+            if source_url is not None:
+                cache.set(TRANSCRIPT, content_hash, cached, url=source_url)
+            return [Document(page_content=d["page_content"], metadata=d["metadata"]) for d in cached]
+
+        logger.info(f"Transcribing audio/video file: {file_path}")
+        documents = transcribe_file(file_path)
+        cache.set(
+            TRANSCRIPT,
+            content_hash,
+            [{"page_content": d.page_content, "metadata": d.metadata} for d in documents],
+            url=source_url,
+        )
+        return documents
     except ImportError as e:
-        print(f"Whisper not available: {e}")
+        logger.warning(f"Whisper not available: {e}")
         # Alternative: Return a placeholder
         return [Document(
             page_content=f"Audio/Video file uploaded but transcription not available. "
                         f"Please install openai-whisper: pip install openai-whisper"
         )]
+    except (TimeoutError, TranscriptionQueueFull):
+        # Transient: let the job retry instead of indexing an error message
+        extractor_error("transcription")
+        raise
     except Exception as e:
-        print(f"Error transcribing audio/video: {e}")
+        logger.error(f"Error transcribing audio/video: {e}")
+        extractor_error("transcription")
         return [Document(
             page_content=f"Error transcribing audio/video file: {str(e)}"
         )]
 
 def ocr_image(file_path):
     try:
-        text = pytesseract.image_to_string(Image.open(file_path))
-        if not text.strip():
+        text = ocr_image_file(file_path)
+        if not text:
             text = "Image uploaded but no text detected."
         return [Document(page_content=text)]
     except Exception as e:
-        print(f"Error performing OCR: {e}")
+        logger.error(f"Error performing OCR: {e}")
+        extractor_error("ocr")
         return [Document(page_content=f"Error performing OCR: {str(e)}")]
 
 def get_documents_from_file(file_path, file_type, url=None):
@@ -95,68 +170,562 @@ def get_documents_from_file(file_path, file_type, url=None):
             text = f.read()
             return [Document(page_content=text)]
     else:
-        print(f"Unsupported file type: {file_type}")
+        logger.warning(f"Unsupported file type: {file_type}")
         return None
 
+def iter_documents_from_file(file_path, file_type):
+    """Like get_documents_from_file, but streams page by page for PDF and DOCX."""
+    if file_type == 'pdf':
+        return iter_pdf_documents(file_path)
+    elif file_type == 'docx':
+        return iter_docx_documents(file_path)
+    return get_documents_from_file(file_path, file_type)
+
 # --- Main Ingestion Logic ---
 
-def process_and_store(file_path, original_filename):
+def store_chunks(chunks, source, owner=None):
     """
-    The main function to process a file and store it in S3 and Vector DB.
+    Embed and store only the chunks that are not already indexed in the owner's namespace,
+    then link every chunk to `source`. Chunk IDs are content hashes, so re-shared
+    paragraphs are reused.
+    Returns a dict with the chunk IDs and how many were reused vs newly embedded.
     """
-    print(f"Starting processing for: {original_filename}")
+    vector_index = get_vector_index(owner)
+    content_index = get_content_index()
 
-    # 1. Upload original file to S3
-    s3_url = None
-    s3_object_key = f"originals/{original_filename}"
-    
-    if s3_client:
+    ids = []
+    unique = {}
+    for chunk in chunks:
+        if owner:
+            chunk.metadata["owner_id"] = owner
+        cid = chunk_id(chunk.page_content)
+        ids.append(cid)
+        unique.setdefault(cid, chunk)
+
+    existing = set(vector_index.get(ids=list(unique), include=[])["ids"]) if unique else set()
+    new_ids = [cid for cid in unique if cid not in existing]
+
+    if new_ids:
+        # Embed and write separately (rather than add_documents) so each gets its own timing
+        new_chunks = [unique[cid] for cid in new_ids]
+        texts = [chunk.page_content for chunk in new_chunks]
+        with stage_timer("embed"):
+            embeddings = get_embeddings().embed_documents(texts)
+        with stage_timer("vector_write"):
+            vector_index.upsert(
+                ids=new_ids, embeddings=embeddings, documents=texts,
+                metadatas=[chunk.metadata for chunk in new_chunks]
+            )
+        lexical_index = get_lexical_index(owner)
+        lexical_index.add(new_ids, [unique[cid].page_content for cid in new_ids])
+        lexical_index.save_if_due()
+        # Cached answers that cited these sources may now be incomplete
+        get_answer_cache().invalidate_sources(
+            {source} | {unique[cid].metadata.get("source") for cid in new_ids if unique[cid].metadata.get("source")},
+            namespace=owner
+        )
+    first = chunks[0].metadata if chunks else {}
+    linked_ids = content_index.link_chunks(
+        list(unique), source, owner,
+        sizes={cid: len(chunk.page_content) for cid, chunk in unique.items()},
+        info={"file_type": first.get("file_type"), "content_type": first.get("type"),
+              "s3_path": first.get("s3_path"), "s3_status": first.get("s3_status")},
+    )
+    count_chunks("embedded", len(new_ids))
+    count_chunks("reused", len(ids) - len(new_ids))
+
+    return {
+        "chunk_ids": list(unique),
+        "embedded_ids": new_ids,
+        "linked_ids": linked_ids,
+        "chunks_reused": len(ids) - len(new_ids),
+        "chunks_embedded": len(new_ids),
+    }
+
+def remove_chunks(chunk_ids, owner=None, sources=()):
+    """
+    Delete the given chunks from the owner's namespace, but only those no source links to
+    any more. Returns the number of chunks actually deleted.
+    """
+    orphans = get_content_index().orphaned(chunk_ids, owner)
+    if orphans:
+        get_vector_index(owner).delete(orphans)
+        lexical_index = get_lexical_index(owner)
+        lexical_index.remove(orphans)
+        lexical_index.save_if_due()
+    orphan_set = set(orphans)
+    retarget_chunks([cid for cid in chunk_ids if cid not in orphan_set], owner)
+    if sources:
+        get_answer_cache().invalidate_sources(set(sources), namespace=owner)
+    count_chunks("removed", len(orphans))
+    return len(orphans)
+
+
+def retarget_chunks(chunk_ids, owner=None):
+    """
+    Kept chunks whose metadata still names a source they are no longer linked to (it was
+    deleted, or its new version dropped them) are attributed to a source that still holds
+    them, so answers stop citing removed content. Returns the number rewritten.
+    """
+    if not chunk_ids:
+        return 0
+    vector_index = get_vector_index(owner)
+    linked = get_content_index().linked_sources(chunk_ids, owner)
+    fetched = vector_index.get(ids=list(chunk_ids), include=["metadatas"])
+    ids, metadatas = [], []
+    for cid, metadata in zip(fetched["ids"], fetched["metadatas"]):
+        metadata = metadata or {}
+        sources = linked.get(cid)
+        if not sources or metadata.get("source") in sources:
+            continue
+        # The most recently updated source that still has the chunk
+        target, info = list(sources.items())[-1]
+        metadata = {key: value for key, value in metadata.items() if key not in _POSITION_KEYS}
+        metadata["source"] = target
+        metadata["filename"] = source_filename(target)
+        for key, value in (("s3_path", info["s3_path"]), ("file_type", info["file_type"]), ("type", info["content_type"])):
+            if value is None:
+                metadata.pop(key, None)
+            else:
+                metadata[key] = value
+        ids.append(cid)
+        metadatas.append(metadata)
+    if ids:
+        vector_index.update_metadata(ids, metadatas)
+        logger.info(f"Re-attributed {len(ids)} shared chunks to their remaining sources")
+    return len(ids)
+
+
+def backfill_catalog(page_size=1000):
+    """
+    Link chunks the vector store holds but the catalog never saw (indexed before it existed,
+    or left in the default collection by partition_collection) to the source named in their
+    metadata, once per namespace. Returns the number of chunks linked.
+    """
+    content_index = get_content_index()
+    linked = 0
+    for name in list_collections():
+        if content_index.is_backfilled(name):
+            continue
         try:
-            s3_client.upload_file(file_path, S3_BUCKET_NAME, s3_object_key)
-            s3_url = f"s3://{S3_BUCKET_NAME}/{s3_object_key}"
-            print(f"Successfully uploaded {original_filename} to {s3_url}")
+            linked += _backfill_namespace(name, page_size)
         except Exception as e:
-            print(f"Error uploading to S3: {e}")
-            raise Exception(f"Failed to upload file to S3: {str(e)}")
-    else:
-        print("Warning: S3 client not initialized. Skipping S3 upload.")
-        s3_url = f"local://originals/{original_filename}"
+            logger.error(f"Catalog backfill of {name} failed: {e}")
+            continue
+        content_index.mark_backfilled(name)
+    if linked:
+        logger.info(f"Catalog backfill linked {linked} chunks")
+    return linked
+
+
+def _backfill_namespace(name, page_size):
+    content_index = get_content_index()
+    vector_index = namespace_index(name)
+    fallback_owner = None if name == DEFAULT_COLLECTION else name[len("user_"):]
+    linked = offset = 0
+    while True:
+        page = vector_index.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            return linked
+        offset += len(page["ids"])
+        groups = {}
+        for cid, document, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+            metadata = metadata or {}
+            owner = metadata.get("owner_id") or fallback_owner
+            key = (metadata.get("source") or metadata.get("filename", ""), owner)
+            groups.setdefault(key, []).append((cid, len(document or ""), metadata))
+        for (source, owner), chunks in groups.items():
+            orphans = set(content_index.orphaned([cid for cid, _, _ in chunks], owner))
+            chunks = [chunk for chunk in chunks if chunk[0] in orphans]
+            if not chunks:
+                continue
+            first = chunks[0][2]
+            linked += len(content_index.link_chunks(
+                [cid for cid, _, _ in chunks], source, owner,
+                sizes={cid: size for cid, size, _ in chunks},
+                info={"file_type": first.get("file_type"), "content_type": first.get("type"), "s3_path": first.get("s3_path")},
+            ))
+
+
+def remove_source(source, owner=None):
+    """Forget one owner's copy of a source; chunks other sources still use are kept."""
+    content_index = get_content_index()
+    chunk_ids = content_index.source_chunks(source, owner)
+    content_index.unlink_source(source, owner)
+    removed = remove_chunks(chunk_ids, owner, sources={source})
+    logger.info(f"Removed {source}: {removed} chunks deleted, {len(chunk_ids) - removed} still shared")
+    return {"chunks_removed": removed, "chunks_shared": len(chunk_ids) - removed}
+
+
+def remove_sources(sources, owner=None):
+    """
+    Forget several of one owner's sources with a single delete of the exact chunk IDs that
+    are left orphaned, rather than one metadata-filtered scan per source.
+    """
+    content_index = get_content_index()
+    chunk_ids = set()
+    for source in sources:
+        chunk_ids.update(content_index.source_chunks(source, owner))
+        content_index.unlink_source(source, owner)
+    removed = remove_chunks(list(chunk_ids), owner, sources=set(sources))
+    logger.info(f"Removed {len(sources)} sources: {removed} chunks deleted, {len(chunk_ids) - removed} still shared")
+    return {"sources_removed": len(sources), "chunks_removed": removed, "chunks_shared": len(chunk_ids) - removed}
+
+
+def prune_source(source, keep_ids, owner=None):
+    """
+    After re-ingesting `source`, drop the chunks its previous version had that the new one
+    does not. Unchanged chunks kept their content-hash IDs and were never re-embedded.
+    """
+    content_index = get_content_index()
+    keep_ids = set(keep_ids)
+    stale = [cid for cid in content_index.source_chunks(source, owner) if cid not in keep_ids]
+    if not stale:
+        return 0
+    content_index.unlink_chunks(stale, source, owner)
+    return remove_chunks(stale, owner, sources={source})
+
+
+def new_text_splitter():
+    """The shared chunker (see chunking.py); chunks carry `start_index` in their metadata."""
+    return get_chunker()
+
+
+def reuse_known_file(known, original_filename, owner=None, replace=False, source=None):
+    """
+    If `known` (the content index record of a file with the same bytes) is still fully
+    indexed in the owner's namespace, link its chunks to `source` (by default
+    `original_filename`) and return the ingest result. Returns None when the file has to
+    be processed.
+    """
+    if not known:
+        return None
+    source = source or original_filename
+    content_index = get_content_index()
+    known_ids = content_index.chunks_for_source(known["source"])
+    if not known_ids or len(get_vector_index(owner).get(ids=known_ids, include=[])["ids"]) != len(known_ids):
+        return None
+    content_index.link_chunks(
+        known_ids, source, owner,
+        info={"file_type": original_filename.split('.')[-1].lower(), "s3_path": known["s3_path"],
+              "s3_status": "pending" if known.get("s3_status") == "pending" else None},
+    )
+    if replace:
+        prune_source(source, known_ids, owner)
+    logger.info(f"{original_filename} is identical to already-indexed {known['source']}; reused {len(known_ids)} chunks")
+    return {
+        "source_id": source_id(source, owner),
+        "s3_path": known["s3_path"],
+        "chunks": len(known_ids),
+        "chunks_reused": len(known_ids),
+        "chunks_embedded": 0,
+        "s3_status": known.get("s3_status", "stored"),
+    }
+
+
+def upload_original(file_path, original_filename, file_hash, known=None):
+    """Store the original file in S3 (blocking) and return its URL; reuses a stored copy."""
+    if known and known["s3_path"]:
+        return known["s3_path"]
+    if not s3_client:
+        logger.warning("S3 client not initialized. Skipping S3 upload.")
+        return f"local://originals/{original_filename}"
+    s3_object_key = f"originals/{file_hash}/{original_filename}"
+    s3_client.upload_file(file_path, S3_BUCKET_NAME, s3_object_key, Config=s3_transfer_config)
+    return f"s3://{S3_BUCKET_NAME}/{s3_object_key}"
+
 
-    # 2. Extract text from the document
+def iter_split_file(file_path, original_filename, s3_url, source=None, s3_status=None):
+    """
+    Extract and split a file lazily into chunks carrying the usual file metadata; `source`
+    (by default `original_filename`) is the key the chunks are cited and stored under, and
+    `s3_status` marks chunks whose original is still waiting to reach S3.
+    Pages stream through the splitter (page numbers stay in each chunk's metadata), so the
+    consumer decides how many chunks are held at once; process_and_store and the bulk
+    pipeline both consume it.
+    """
     file_extension = original_filename.split('.')[-1].lower()
-    documents = get_documents_from_file(file_path, file_extension)
+    documents = iter_documents_from_file(file_path, file_extension)
+    if documents is None:
+        raise Exception("Could not extract text from document")
+
+    text_splitter = new_text_splitter()
+    split_seconds = 0.0
+    try:
+        for doc in documents:
+            doc.metadata["s3_path"] = s3_url
+            if s3_status:
+                doc.metadata["s3_status"] = s3_status
+            doc.metadata["filename"] = original_filename
+            doc.metadata["file_type"] = file_extension
+            # Loaders set `source` to the temporary path; citations and answer-cache
+            # invalidation must use the stored source key
+            doc.metadata["source"] = source or original_filename
+            doc_chunks = text_splitter.iter_split_documents([doc])
+            while True:
+                started = time.perf_counter()
+                chunk = next(doc_chunks, None)
+                split_seconds += time.perf_counter() - started
+                if chunk is None:
+                    break
+                yield chunk
+    finally:
+        observe_stage("split", split_seconds)
+
 
+def fetch_url_documents(url, report=None):
+    """
+    Extract the content behind a URL, plus OCR text of the images on the page.
+    Returns (documents, number_of_ocr_documents); documents is empty when nothing was found.
+    """
+    report = report or (lambda stage: None)
+    # Imported here: url_handler imports this module for video transcription
+    from url_handler import extract_text_from_url, extract_media_from_url
+
+    # Automatically handles YouTube, Instagram, Twitter, and regular URLs
+    with stage_timer("fetch"):
+        documents = extract_text_from_url(url)
     if not documents:
-        raise Exception("Could not extract text from document")
+        return [], 0
+
+    logger.info(f"Extracted {len(documents)} document(s) from URL")
+
+    # Extract media (images with OCR) for regular web pages
+    # Social media platforms handle media in their specific extractors
+    report("ocr")
+    media = extract_media_from_url(url)
+    ocr_docs = media.get("ocr_docs", []) if isinstance(media, dict) else []
+    if ocr_docs:
+        # Add OCR documents from images found on the page
+        documents.extend(ocr_docs)
+        logger.info(f"Added {len(ocr_docs)} OCR documents from images")
+    return documents, len(ocr_docs)
 
-    # 3. Add comprehensive metadata to each document BEFORE splitting
+
+def split_url_documents(documents, url):
+    """Split URL documents into chunks, defaulting source/filename/file_type to the URL."""
     for doc in documents:
-        doc.metadata["s3_path"] = s3_url
-        doc.metadata["filename"] = original_filename
-        doc.metadata["file_type"] = file_extension
         if "source" not in doc.metadata:
-            doc.metadata["source"] = original_filename
-
-    # 4. Split document into chunks
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000, 
-        chunk_overlap=200,
-        length_function=len,
-        add_start_index=True,
-    )
-    chunks = text_splitter.split_documents(documents)
-    print(f"Split document into {len(chunks)} chunks.")
+            doc.metadata["source"] = url
+        if "filename" not in doc.metadata:
+            doc.metadata["filename"] = url
+        if "file_type" not in doc.metadata:
+            doc.metadata["file_type"] = "url"
+
+    with stage_timer("split"):
+        chunks = new_text_splitter().split_documents(documents)
 
-    # 5. Verify metadata is preserved in chunks
+    # Verify metadata in chunks
     for chunk in chunks:
-        if "s3_path" not in chunk.metadata:
-            chunk.metadata["s3_path"] = s3_url
-            chunk.metadata["filename"] = original_filename
-            chunk.metadata["file_type"] = file_extension
-
-    # 6. Embed chunks and store in Vector DB
-    vector_db.add_documents(chunks)
-    vector_db.persist()
-    print(f"Successfully added {len(chunks)} chunks to the vector database with S3 path: {s3_url}")
+        if "source" not in chunk.metadata:
+            chunk.metadata["source"] = url
+        if "filename" not in chunk.metadata:
+            chunk.metadata["filename"] = url
+        if "file_type" not in chunk.metadata:
+            chunk.metadata["file_type"] = "url"
+    return chunks
+
+
+def process_and_store(file_path, original_filename, report=None, owner=None, replace=False, source=None):
+    """
+    The main function to process a file and store it in S3 and Vector DB.
+    `report` is an optional callback invoked with the name of each stage as it starts.
+    `source` is the catalog key the chunks are stored under (see upload_source); it
+    defaults to `original_filename`. Without `replace`, ingesting into an existing key
+    adds to that source, which is what a retried job does.
+    Files whose bytes were already ingested skip S3, extraction and embedding entirely.
+    With `replace`, this is a new version of an existing source: chunks of the old version
+    that no longer occur are removed afterwards.
+    """
+    report = report or (lambda stage: None)
+    source = source or original_filename
+    logger.info(f"Starting processing for: {original_filename}")
+    content_index = get_content_index()
+
+    # 0. Reuse a previous ingest of the exact same bytes
+    report("hash")
+    file_hash = file_sha256(file_path)
+    known = content_index.get_file(file_hash)
+    reused = reuse_known_file(known, original_filename, owner, replace, source)
+    if reused:
+        return reused
+
+    # 1. Start uploading the original to S3; it runs while the file is parsed and embedded.
+    # The object key is known up front, so chunk metadata can point at it already.
+    upload = None
+    s3_object_key = f"originals/{file_hash}/{original_filename}"
+    
+    s3_status = "stored"
+    if known and known["s3_path"]:
+        # The same bytes are already stored (e.g. uploaded by another owner), or kept
+        # locally until a pending upload is retried
+        s3_url = known["s3_path"]
+        s3_status = known.get("s3_status", "stored")
+        logger.info(f"Reusing stored original at {s3_url}")
+    elif s3_client:
+        s3_url = f"s3://{S3_BUCKET_NAME}/{s3_object_key}"
+        upload = _upload_executor.submit(
+            s3_client.upload_file, file_path, S3_BUCKET_NAME, s3_object_key, Config=s3_transfer_config
+        )
+    else:
+        logger.warning("S3 client not initialized. Skipping S3 upload.")
+        s3_url = f"local://originals/{original_filename}"
+
+    # 2-6. Extract, split and embed as a stream: pages flow through the splitter into
+    # bounded embedding batches, so peak memory does not grow with document size
+    report("extract")
+    totals = {"chunks": 0, "chunks_reused": 0, "chunks_embedded": 0}
+    chunk_ids = set()
+    embedded_ids = []
+    linked_ids = []
+    buffer = []
+
+    def flush():
+        stored = store_chunks(buffer, source, owner)
+        totals["chunks"] += len(buffer)
+        totals["chunks_reused"] += stored["chunks_reused"]
+        totals["chunks_embedded"] += stored["chunks_embedded"]
+        chunk_ids.update(stored["chunk_ids"])
+        embedded_ids.extend(stored["embedded_ids"])
+        linked_ids.extend(stored["linked_ids"])
+        buffer.clear()
+
+    try:
+        for chunk in iter_split_file(
+            file_path, original_filename, s3_url, source, "pending" if s3_status == "pending" else None
+        ):
+            buffer.append(chunk)
+            # 6. Embed new chunks and store in Vector DB, one bounded batch at a time
+            if len(buffer) >= STREAM_EMBED_BATCH:
+                report("embed")
+                flush()
+
+        report("embed")
+        if buffer:
+            flush()
+    except Exception:
+        _rollback(linked_ids, embedded_ids, source, owner)
+        if upload is not None:
+            _discard_upload(upload, s3_object_key)
+        raise
+
+    if not totals["chunks"]:
+        if upload is not None:
+            _discard_upload(upload, s3_object_key)
+        raise Exception("Could not extract text from document")
+
+    # 7. Wait for the original to land in S3 before the ingest counts as done
+    if upload is not None:
+        report("s3_upload")
+        try:
+            upload.result()
+            logger.info(f"Successfully uploaded {original_filename} to {s3_url}")
+        except Exception as e:
+            logger.error(f"Error uploading to S3: {e}")
+            extractor_error("s3_upload")
+            if S3_FAILURE_POLICY != "pending":
+                _rollback(linked_ids, embedded_ids, source, owner)
+                raise Exception(f"Failed to upload file to S3: {str(e)}")
+            # Keep the chunks, pointing at a local copy until the upload is retried
+            s3_url = _defer_upload(file_path, file_hash, original_filename, s3_object_key, s3_url, source, owner, chunk_ids)
+            s3_status = "pending"
+
+    if replace:
+        totals["chunks_removed"] = prune_source(source, chunk_ids, owner)
+
+    get_vector_index(owner).persist()
+    if s3_status == "stored":
+        content_index.record_file(file_hash, s3_url, source)
+    logger.info(
+        f"Stored {totals['chunks']} chunks ({totals['chunks_embedded']} new, {totals['chunks_reused']} reused) with S3 path: {s3_url}",
+        extra={"source": source, "owner": owner, **totals}
+    )
     
-    return s3_url
+    return {"source_id": source_id(source, owner), "s3_path": s3_url, "s3_status": s3_status, **totals}
+
+
+def _defer_upload(file_path, file_hash, original_filename, s3_object_key, s3_url, source, owner, chunk_ids):
+    """Keep a local copy of an original whose upload failed; returns its local URL."""
+    local_dir = os.path.join(S3_PENDING_DIR, file_hash)
+    os.makedirs(local_dir, exist_ok=True)
+    local_path = os.path.join(local_dir, original_filename)
+    shutil.copyfile(file_path, local_path)
+    local_url = f"local://pending/{file_hash}/{original_filename}"
+    get_content_index().defer_upload(file_hash, local_path, local_url, s3_object_key, s3_url, source)
+    _repoint_chunks(list(chunk_ids), owner, s3_url, local_url, "pending")
+    logger.warning(f"Kept {original_filename} at {local_path} until its S3 upload is retried")
+    return local_url
+
+
+def _repoint_chunks(chunk_ids, owner, old_path, new_path, s3_status=None):
+    """Rewrite s3_path (and s3_status) in the metadata of the chunks that point at old_path."""
+    if not chunk_ids:
+        return
+    vector_index = get_vector_index(owner)
+    fetched = vector_index.get(ids=chunk_ids, include=["metadatas"])
+    ids, metadatas = [], []
+    for cid, metadata in zip(fetched["ids"], fetched["metadatas"]):
+        metadata = dict(metadata or {})
+        if metadata.get("s3_path") != old_path:
+            continue
+        metadata["s3_path"] = new_path
+        if s3_status:
+            metadata["s3_status"] = s3_status
+        else:
+            metadata.pop("s3_status", None)
+        ids.append(cid)
+        metadatas.append(metadata)
+    if ids:
+        vector_index.update_metadata(ids, metadatas)
+
+
+def retry_pending_uploads():
+    """
+    Upload the originals kept locally after a failed S3 upload and point their sources and
+    chunks at S3. Returns the number uploaded; failures stay pending for the next call.
+    """
+    if not s3_client:
+        return 0
+    content_index = get_content_index()
+    uploaded = 0
+    for pending in content_index.pending_uploads():
+        try:
+            s3_client.upload_file(pending["local_path"], S3_BUCKET_NAME, pending["s3_key"], Config=s3_transfer_config)
+        except Exception as e:
+            logger.warning(f"Pending upload of {pending['local_path']} failed again: {e}")
+            continue
+        s3_url = f"s3://{S3_BUCKET_NAME}/{pending['s3_key']}"
+        for source, owner in content_index.complete_upload(pending["sha256"], s3_url):
+            _repoint_chunks(content_index.source_chunks(source, owner), owner, pending["local_url"], s3_url)
+            get_vector_index(owner).persist()
+        shutil.rmtree(os.path.dirname(pending["local_path"]), ignore_errors=True)
+        uploaded += 1
+    if uploaded:
+        logger.info(f"Uploaded {uploaded} pending originals to S3")
+    return uploaded
+
+
+def _rollback(linked_ids, embedded_ids, source, owner=None):
+    """
+    Remove what one failed ingest added: the chunk links it created and the chunks it
+    embedded that nothing else uses. Links that existed before (a replaced version, or a
+    source of the same name) are left alone.
+    """
+    get_content_index().unlink_chunks(linked_ids, source, owner)
+    candidates = list(dict.fromkeys(linked_ids + embedded_ids))
+    removed = remove_chunks(candidates, owner, sources={source}) if candidates else 0
+    logger.info(f"Rolled back {removed} chunks of {source}")
+
+
+def _discard_upload(upload, s3_object_key):
+    """Nothing will reference this original; remove it once its upload finishes."""
+    upload.add_done_callback(
+        lambda f: _delete_original(s3_object_key) if not f.cancelled() and f.exception() is None else None
+    )
+
+
+def _delete_original(s3_object_key):
+    try:
+        s3_client.delete_object(Bucket=S3_BUCKET_NAME, Key=s3_object_key)
+    except Exception as e:
+        logger.warning(f"Could not remove orphaned original {s3_object_key}: {e}")
@@ -0,0 +1,235 @@
+import os
+import logging
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from observability import JOBS
+
+logger = logging.getLogger(__name__)
+
+# --- Job Queue Configuration ---
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "./jobs.db")
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_MAX_PENDING = int(os.getenv("INGEST_MAX_PENDING", "100"))
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))
+INGEST_RETRY_DELAY = float(os.getenv("INGEST_RETRY_DELAY", "5"))
+
+QUEUED = "queued"
+RUNNING = "running"
+RETRYING = "retrying"
+COMPLETED = "completed"
+FAILED = "failed"
+
+UNFINISHED_STATUSES = (QUEUED, RUNNING, RETRYING)
+
+
+class QueueFullError(Exception):
+    """Raised when the ingestion queue already holds the maximum number of jobs."""
+
+
+class PermanentJobError(Exception):
+    """Raised by a job handler for failures that a retry cannot fix."""
+
+
+class JobStore:
+    """
+    Persistent job records backed by a local SQLite file.
+    Survives restarts so unfinished jobs can be picked up again.
+    """
+
+    def __init__(self, db_path=JOBS_DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    stages TEXT NOT NULL DEFAULT '[]',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    payload TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+
+    def create(self, job_id, kind, payload):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, status, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, json.dumps(payload), now, now),
+            )
+        return self.get(job_id)
+
+    def update(self, job_id, **fields):
+        if "stages" in fields:
+            fields["stages"] = json.dumps(fields["stages"])
+        if "result" in fields and fields["result"] is not None:
+            fields["result"] = json.dumps(fields["result"])
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list_unfinished(self):
+        placeholders = ", ".join("?" for _ in UNFINISHED_STATUSES)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM jobs WHERE status IN ({placeholders}) ORDER BY created_at",
+                UNFINISHED_STATUSES,
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    @staticmethod
+    def _to_dict(row):
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["stages"] = json.loads(job["stages"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+
+class JobQueue:
+    """
+    Bounded worker pool that runs ingestion jobs off the request path.
+
+    Handlers are registered per job kind and called as handler(payload, report),
+    where report(stage) records the stage the job has reached.
+    """
+
+    def __init__(self, store, handlers, workers=INGEST_WORKERS, max_pending=INGEST_MAX_PENDING,
+                 max_attempts=INGEST_MAX_ATTEMPTS, retry_delay=INGEST_RETRY_DELAY):
+        self.store = store
+        self.handlers = handlers
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, kind, payload, job_id=None):
+        """Persist a new job and schedule it. Raises QueueFullError when saturated."""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFullError(f"Ingestion queue is full ({self.max_pending} pending jobs)")
+            self._pending += 1
+        job = self.store.create(job_id or new_job_id(), kind, payload)
+        self._executor.submit(self._run, job["id"])
+        return job
+
+    def pending(self):
+        with self._lock:
+            return self._pending
+
+    def recover(self):
+        """Re-schedule jobs left unfinished by a previous process."""
+        jobs = self.store.list_unfinished()
+        for job in jobs:
+            with self._lock:
+                self._pending += 1
+            self.store.update(job["id"], status=QUEUED)
+            self._executor.submit(self._run, job["id"])
+        if jobs:
+            logger.info(f"Recovered {len(jobs)} unfinished ingestion job(s)")
+        return len(jobs)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job_id):
+        job = self.store.get(job_id)
+        if job is None:
+            self._release()
+            return
+
+        attempts = job["attempts"] + 1
+        stages = job["stages"]
+        self.store.update(job_id, status=RUNNING, attempts=attempts, error=None)
+
+        def report(stage):
+            now = time.time()
+            if stages and stages[-1].get("finished_at") is None:
+                stages[-1]["finished_at"] = now
+            stages.append({"name": stage, "attempt": attempts, "started_at": now, "finished_at": None})
+            self.store.update(job_id, stage=stage, stages=stages)
+
+        try:
+            result = self.handlers[job["kind"]](job["payload"], report)
+        except Exception as e:
+            logger.error(f"Job {job_id} failed on attempt {attempts}: {e}")
+            if stages and stages[-1].get("finished_at") is None:
+                stages[-1]["finished_at"] = time.time()
+            if not isinstance(e, PermanentJobError) and attempts < self.max_attempts:
+                self.store.update(job_id, status=RETRYING, stages=stages, error=str(e))
+                delay = self.retry_delay * (2 ** (attempts - 1))
+                timer = threading.Timer(delay, self._executor.submit, args=(self._run, job_id))
+                timer.daemon = True
+                timer.start()
+                return
+            self.store.update(job_id, status=FAILED, stages=stages, error=str(e))
+            JOBS.labels(job["kind"], FAILED).inc()
+            self._finish(job)
+            return
+
+        if stages and stages[-1].get("finished_at") is None:
+            stages[-1]["finished_at"] = time.time()
+        self.store.update(job_id, status=COMPLETED, stage=None, stages=stages, result=result)
+        logger.info(f"Job {job_id} completed")
+        JOBS.labels(job["kind"], COMPLETED).inc()
+        self._finish(job)
+
+    def _finish(self, job):
+        temp_path = job["payload"].get("temp_path")
+        if temp_path and os.path.exists(temp_path):
+            try:
+                shutil.rmtree(temp_path) if os.path.isdir(temp_path) else os.remove(temp_path)
+                logger.debug(f"Cleaned up temporary path: {temp_path}")
+            except Exception as e:
+                logger.warning(f"Could not remove temporary path: {e}")
+        self._release()
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+
+def new_job_id():
+    return uuid.uuid4().hex
+
+
+def public_view(job):
+    """Strip internal fields from a job record before returning it to clients."""
+    return {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "stages": job["stages"],
+        "attempts": job["attempts"],
+        "result": job["result"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
@@ -0,0 +1,308 @@
+import os
+import logging
+import re
+import math
+import heapq
+import time
+import zlib
+import pickle
+import threading
+from array import array
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# --- BM25 Lexical Index Configuration ---
+LEXICAL_INDEX_DIR = os.getenv("LEXICAL_INDEX_DIR", "./lexical_index")
+LEXICAL_SAVE_INTERVAL = float(os.getenv("LEXICAL_SAVE_INTERVAL", "30"))
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Keeps identifiers such as snake_case names, v1.2.3 and foo-bar in one token
+_TOKEN = re.compile(r"[a-z0-9_]+(?:[.\-][a-z0-9_]+)*")
+
+
+def tokenize(text):
+    return _TOKEN.findall(text.lower())
+
+
+class LexicalIndex:
+    """
+    Incremental BM25 inverted index over chunk IDs.
+
+    Terms are interned to integer IDs; each posting list maps a document slot to its term
+    frequency, and each document remembers its term IDs so it can be removed in place.
+    Searches only touch the posting lists of the query terms.
+
+    Other processes (the bulk CLI, prefork workers) write the same snapshot and vector
+    store, so sync() reloads a snapshot saved elsewhere and catches up with the store.
+    """
+
+    def __init__(self, path=None, owner_id=None):
+        self.path = path
+        self.owner_id = owner_id
+        self._lock = threading.RLock()
+        self._reset()
+        self._last_saved = 0.0
+        # mtime of the snapshot as this process last read or wrote it
+        self._mtime = None
+
+    def _reset(self):
+        self._vocab = {}
+        self._postings = []
+        self._doc_ids = []
+        self._slots = {}
+        self._doc_terms = {}
+        self._doc_len = array("I")
+        self._total_len = 0
+        self._free_slots = []
+        self._dirty = False
+
+    def __len__(self):
+        return len(self._slots)
+
+    def add(self, ids, texts):
+        with self._lock:
+            for doc_id, text in zip(ids, texts):
+                if doc_id in self._slots:
+                    continue
+                counts = Counter(tokenize(text))
+                slot = self._free_slots.pop() if self._free_slots else len(self._doc_ids)
+                if slot == len(self._doc_ids):
+                    self._doc_ids.append(doc_id)
+                    self._doc_len.append(0)
+                else:
+                    self._doc_ids[slot] = doc_id
+
+                term_ids = array("I")
+                for term, tf in counts.items():
+                    tid = self._vocab.get(term)
+                    if tid is None:
+                        tid = self._vocab[term] = len(self._postings)
+                        self._postings.append({})
+                    self._postings[tid][slot] = tf
+                    term_ids.append(tid)
+
+                length = sum(counts.values())
+                self._slots[doc_id] = slot
+                self._doc_terms[slot] = term_ids
+                self._doc_len[slot] = length
+                self._total_len += length
+            self._dirty = True
+
+    def remove(self, ids):
+        with self._lock:
+            for doc_id in ids:
+                slot = self._slots.pop(doc_id, None)
+                if slot is None:
+                    continue
+                for tid in self._doc_terms.pop(slot):
+                    self._postings[tid].pop(slot, None)
+                self._total_len -= self._doc_len[slot]
+                self._doc_len[slot] = 0
+                self._doc_ids[slot] = None
+                self._free_slots.append(slot)
+            self._dirty = True
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+            self._dirty = True
+
+    def search(self, query, k=10, allowed=None):
+        """Return up to k (chunk_id, score) pairs, best first. `allowed` optionally restricts chunk IDs."""
+        with self._lock:
+            n_docs = len(self._slots)
+            if not n_docs:
+                return []
+            avg_len = self._total_len / n_docs
+            scores = {}
+            for term in set(tokenize(query)):
+                tid = self._vocab.get(term)
+                if tid is None or not self._postings[tid]:
+                    continue
+                postings = self._postings[tid]
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for slot, tf in postings.items():
+                    norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * self._doc_len[slot] / avg_len)
+                    scores[slot] = scores.get(slot, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+            candidates = scores.items()
+            if allowed is not None:
+                candidates = [(slot, score) for slot, score in candidates if self._doc_ids[slot] in allowed]
+            return [
+                (self._doc_ids[slot], score)
+                for slot, score in heapq.nlargest(k, candidates, key=lambda item: item[1])
+            ]
+
+    # --- Persistence ---
+
+    def save(self, path=None):
+        """Write a compact, compressed snapshot (posting lists as parallel integer arrays)."""
+        with self._lock:
+            if path is None and self._changed_on_disk():
+                # Another process saved since: take its work in rather than overwrite it
+                self.sync()
+            postings = [
+                (array("I", p.keys()), array("I", p.values())) for p in self._postings
+            ]
+            state = {
+                "vocab": self._vocab,
+                "postings": postings,
+                "doc_ids": self._doc_ids,
+                "doc_len": self._doc_len,
+                "doc_terms": self._doc_terms,
+                "free_slots": self._free_slots,
+            }
+            self._dirty = False
+            self._last_saved = time.time()
+            target = path or self.path
+            data = zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), 6)
+            tmp_path = f"{target}.tmp.{os.getpid()}"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, target)
+            if target == self.path:
+                self._mtime = _mtime(target)
+
+    def save_if_due(self):
+        if self._dirty and time.time() - self._last_saved >= LEXICAL_SAVE_INTERVAL:
+            self.save()
+
+    def flush(self):
+        if self._dirty:
+            self.save()
+
+    @classmethod
+    def load(cls, path, owner_id=None):
+        index = cls(path, owner_id)
+        index._read()
+        return index
+
+    def _read(self):
+        with self._lock:
+            mtime = _mtime(self.path)
+            with open(self.path, "rb") as f:
+                state = pickle.loads(zlib.decompress(f.read()))
+            self._reset()
+            self._vocab = state["vocab"]
+            self._postings = [dict(zip(slots, tfs)) for slots, tfs in state["postings"]]
+            self._doc_ids = state["doc_ids"]
+            self._doc_len = state["doc_len"]
+            self._doc_terms = state["doc_terms"]
+            self._free_slots = state["free_slots"]
+            self._slots = {doc_id: slot for slot, doc_id in enumerate(self._doc_ids) if doc_id is not None}
+            self._total_len = sum(self._doc_len)
+            self._last_saved = time.time()
+            self._mtime = mtime
+
+    def _changed_on_disk(self):
+        mtime = _mtime(self.path) if self.path else None
+        return mtime is not None and mtime != self._mtime
+
+    def sync(self):
+        """
+        Reload the snapshot if another process saved it, then add or remove chunks until
+        the index holds exactly the vector store's chunks. Returns True when it changed.
+        """
+        with self._lock:
+            reloaded = self._changed_on_disk()
+            if reloaded:
+                self._read()
+            caught_up = _catch_up(self, self.owner_id)
+            if caught_up and self.path:
+                self.save(self.path)
+            return reloaded or caught_up
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Fuse several ranked ID lists; returns IDs ordered by summed 1 / (k + rank)."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_lexical_index(owner_id=None, fresh=False):
+    """
+    The BM25 index for one owner's namespace, mirroring its vector store namespace.
+    Loads the persisted snapshot, or rebuilds it from the vector store if there is none,
+    and catches up with the store on load. `fresh` (for searches) repeats that check, so
+    chunks another process wrote, or that were lost with an unsaved snapshot, are found.
+    """
+    from registry import collection_name
+
+    name = collection_name(owner_id)
+    with _indexes_lock:
+        index = _indexes.get(name)
+        if index is None:
+            path = os.path.join(LEXICAL_INDEX_DIR, f"{name}.bin")
+            if os.path.exists(path):
+                index = LexicalIndex.load(path, owner_id)
+                logger.info(f"Loaded lexical index for {name} with {len(index)} chunks")
+            else:
+                os.makedirs(LEXICAL_INDEX_DIR, exist_ok=True)
+                index = LexicalIndex(path, owner_id)
+            index.sync()
+            _indexes[name] = index
+            return index
+    if fresh:
+        index.sync()
+    return index
+
+
+def flush_all():
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+    for index in indexes:
+        index.flush()
+
+
+def drop_all():
+    """Forget every namespace index and delete the snapshots (used when the store is wiped)."""
+    with _indexes_lock:
+        _indexes.clear()
+        if os.path.isdir(LEXICAL_INDEX_DIR):
+            for filename in os.listdir(LEXICAL_INDEX_DIR):
+                if filename.endswith(".bin"):
+                    os.remove(os.path.join(LEXICAL_INDEX_DIR, filename))
+
+
+def _catch_up(index, owner_id=None, page_size=1000):
+    """
+    Make the index hold exactly the vector store's chunks; cheap (one count) when it
+    already does. Returns True when chunks were added or removed.
+    """
+    from registry import get_vector_index
+
+    vector_index = get_vector_index(owner_id)
+    with index._lock:
+        if vector_index.count() == len(index):
+            return False
+        stored, offset = set(), 0
+        while True:
+            page = vector_index.get(include=[], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            stored.update(page["ids"])
+            offset += len(page["ids"])
+        extra = [doc_id for doc_id in index._slots if doc_id not in stored]
+        missing = [doc_id for doc_id in stored if doc_id not in index._slots]
+        index.remove(extra)
+        for start in range(0, len(missing), page_size):
+            page = vector_index.get(ids=missing[start:start + page_size], include=["documents"])
+            index.add(page["ids"], page["documents"])
+    if extra or missing:
+        logger.info(f"Lexical index caught up with the vector store: {len(missing)} added, {len(extra)} removed")
+    return bool(extra or missing)
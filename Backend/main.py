@@ -1,57 +1,55 @@
 import os
+import time
+import logging
+import json
 import shutil
-from fastapi import FastAPI, UploadFile, File, Form
-from fastapi.responses import JSONResponse
+import asyncio
+import threading
+import zipfile
+from fastapi import FastAPI, UploadFile, File, Form, Request, Query
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from starlette.routing import Match
+from fastapi.concurrency import run_in_threadpool
 import uvicorn
 from dotenv import load_dotenv
 from typing import List, Dict, Any, Optional
 
-# Import the processing logic
-from ingest import process_and_store
-from url_handler import extract_text_from_url, extract_media_from_url
-
-import requests
-from bs4 import BeautifulSoup
-from langchain.docstore.document import Document
-import pytesseract
-from PIL import Image
-from io import BytesIO
-
-HEADERS = {"User-Agent": "Mozilla/5.0"}
-
-# LangChain components for the query part
-from langchain.chains import RetrievalQA
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.vectorstores import Chroma
-from langchain.embeddings import SentenceTransformerEmbeddings
-
 # Load environment variables from .env file
 load_dotenv()
 
-# --- Configuration & Initialization ---
-if not os.getenv("GOOGLE_API_KEY"):
-    raise ValueError("GOOGLE_API_KEY environment variable not set.")
-
-# Use the same embedding function as ingest.py
-embedding_function = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
+# Configure logging before the imports below start logging
+import observability
+from observability import configure_logging, stage_timer, count_cache, REQUESTS_IN_FLIGHT, REQUEST_SECONDS
+configure_logging()
+logger = logging.getLogger(__name__)
 
-vector_db = Chroma(
-    persist_directory="./chroma_db",
-    embedding_function=embedding_function
+# Import the processing logic
+from ingest import (
+    process_and_store, store_chunks, remove_source, remove_sources, prune_source, fetch_url_documents,
+    split_url_documents, backfill_catalog, retry_pending_uploads
 )
+from content_index import get_content_index, source_id, upload_source, source_filename
+from media_cache import get_media_cache
+from answer_cache import get_answer_cache, ANSWER_CACHE_SEMANTIC
+import transcription
+import ocr
+import pdf_extract
+from http_client import http_client
+from jobs import JobQueue, JobStore, QueueFullError, PermanentJobError, new_job_id, public_view
+import bulk_ingest
+from bulk_ingest import get_bulk_pipeline
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    temperature=0.1
-)
+# Shared, lazily-loaded embeddings, vector store and LLM
+import registry
+from registry import get_llm
+import rag
+from rag import retrieve, build_prompt, summarize_sources, cited_sources
+import lexical_index
+import rapidapi
 
-# The main RAG chain with source documents
-qa_chain = RetrievalQA.from_chain_type(
-    llm=llm,
-    chain_type="stuff",
-    retriever=vector_db.as_retriever(search_kwargs={"k": 5}),
-    return_source_documents=True
-)
+# --- Configuration & Initialization ---
+if not os.getenv("GOOGLE_API_KEY"):
+    raise ValueError("GOOGLE_API_KEY environment variable not set.")
 
 # --- FastAPI App ---
 app = FastAPI(
@@ -60,19 +58,149 @@ app = FastAPI(
     version="2.0.0"
 )
 
+def _route_path(request):
+    """The route template (e.g. /jobs/{job_id}), so metric labels stay low-cardinality."""
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+@app.middleware("http")
+async def track_requests(request: Request, call_next):
+    path = _route_path(request)
+    started = time.perf_counter()
+    status = 500
+    REQUESTS_IN_FLIGHT.labels(path).inc()
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        REQUESTS_IN_FLIGHT.labels(path).dec()
+        REQUEST_SECONDS.labels(request.method, path, str(status)).observe(time.perf_counter() - started)
+
+def ingest_url(url, report, owner_id=None, replace=False):
+    """
+    Extract, split and index the content behind a URL. Runs inside an ingestion worker.
+    With `replace`, chunks of the previously indexed version that are gone are removed.
+    """
+    logger.info(f"Processing URL: {url}")
+
+    # Extract text (and OCR text of page images) using url_handler.py
+    report("fetch")
+    documents, num_images = fetch_url_documents(url, report)
+    if not documents:
+        raise PermanentJobError("Could not extract content from URL")
+
+    # Split and store documents
+    report("split")
+    chunks = split_url_documents(documents, url)
+    logger.info(f"Split URL content into {len(chunks)} chunks.")
+
+    # Store new chunks in vector database (auto-persisted in Chroma 0.4+)
+    report("embed")
+    stored = store_chunks(chunks, url, owner_id)
+    chunks_removed = prune_source(url, stored["chunk_ids"], owner_id) if replace else 0
+
+    # Determine content type from metadata
+    content_type = documents[0].metadata.get("type", "url") if documents else "url"
+
+    logger.info(f"Successfully processed URL: {url}")
+
+    return {
+        "message": f"URL '{url}' processed successfully.",
+        "source": url,
+        "source_id": source_id(url, owner_id),
+        "type": content_type,
+        "chunks": len(chunks),
+        "chunks_reused": stored["chunks_reused"],
+        "chunks_embedded": stored["chunks_embedded"],
+        "chunks_removed": chunks_removed,
+        "num_documents": len(documents),
+        "num_images_processed": num_images
+    }
+
+def ingest_file(file_path, filename, report, owner_id=None, replace=False, source=None):
+    """Upload and index a saved file under the source key `source`. Runs inside an ingestion worker."""
+    logger.info(f"Processing file: {filename}")
+
+    # Trigger the ingestion process
+    stored = process_and_store(file_path, filename, report=report, owner=owner_id, replace=replace, source=source)
+
+    logger.info(f"Successfully processed file: {filename}")
+
+    return {
+        "message": f"File '{filename}' processed successfully.",
+        "source_id": stored["source_id"],
+        "s3_path": stored["s3_path"],
+        "filename": filename,
+        "type": "file",
+        "chunks": stored["chunks"],
+        "chunks_reused": stored["chunks_reused"],
+        "chunks_embedded": stored["chunks_embedded"],
+        "chunks_removed": stored.get("chunks_removed", 0)
+    }
+
+job_queue = JobQueue(
+    JobStore(),
+    handlers={
+        "url": lambda payload, report: ingest_url(
+            payload["url"], report, payload.get("owner_id"), payload.get("replace", False)
+        ),
+        "file": lambda payload, report: ingest_file(
+            payload["file_path"], payload["filename"], report, payload.get("owner_id"), payload.get("replace", False),
+            payload.get("source")
+        ),
+    }
+)
+
+@app.on_event("startup")
+async def start_job_queue():
+    job_queue.recover()
+    get_bulk_pipeline().recover()
+
+@app.on_event("startup")
+async def backfill_source_catalog():
+    # Chunks indexed before the catalog existed; runs once per namespace, off the event loop
+    threading.Thread(target=backfill_catalog, name="catalog-backfill", daemon=True).start()
+
+@app.on_event("startup")
+async def retry_pending_s3_uploads():
+    # Originals kept locally after a failed upload (S3_FAILURE_POLICY=pending)
+    threading.Thread(target=retry_pending_uploads, name="s3-pending-retry", daemon=True).start()
+
+@app.on_event("startup")
+async def warm_up_models():
+    if registry.WARM_UP_ON_STARTUP:
+        await run_in_threadpool(registry.warm_up)
+
+@app.on_event("shutdown")
+async def stop_job_queue():
+    job_queue.shutdown()
+    get_bulk_pipeline().shutdown()
+    transcription.shutdown()
+    ocr.shutdown()
+    pdf_extract.shutdown()
+    http_client.close()
+    lexical_index.flush_all()
+
 @app.post("/upload/")
 async def upload_file(
     file: Optional[UploadFile] = File(None),
-    url: Optional[str] = Form(None)
+    url: Optional[str] = Form(None),
+    owner_id: Optional[str] = Form(None)
 ):
     """
-    Endpoint to upload a file or URL for processing and indexing.
+    Endpoint to queue a file or URL for processing and indexing.
     
     Supports:
     - Files: PDF, DOCX, TXT, MD, Images (JPG, PNG, etc.), Audio/Video (MP3, MP4, etc.)
     - URLs: Regular web pages, YouTube videos, Twitter/X posts, Instagram posts
     
     Either 'file' or 'url' must be provided, but not both.
+    'owner_id' selects the owner's namespace; chunks are only searchable by the same owner.
+    Returns a job ID immediately; poll GET /jobs/{job_id} for progress and the final result.
     """
     # Validate input: must provide either file or url, but not both
     if file is None and url is None:
@@ -87,200 +215,466 @@ async def upload_file(
             content={"message": "Please provide either 'file' or 'url', not both."}
         )
     
-    temp_dir = "temp_files"
-    os.makedirs(temp_dir, exist_ok=True)
+    job_id = new_job_id()
+    job_dir = None
     
     try:
-        # Handle URL input
         if url:
-            print(f"\n{'='*60}")
-            print(f"Processing URL: {url}")
-            print(f"{'='*60}")
-            
-            # Extract text from URL using the enhanced function from url_handler.py
-            # Automatically handles YouTube, Instagram, Twitter, and regular URLs
-            documents = extract_text_from_url(url)
-            print("\n\n=======================URL_CONTENT==================================\n")
-            print(documents)
-            print("\n\n=======================URL_CONTENT==================================\n\n\n\n")
-            if not documents:
-                return JSONResponse(
-                    status_code=400,
-                    content={"message": "Could not extract content from URL"}
-                )
+            job = job_queue.submit("url", {"url": url, "owner_id": owner_id}, job_id=job_id)
+        else:
+            # Save uploaded file into a per-job directory; the queue removes it once the job finishes
+            job_dir = os.path.join("temp_files", "jobs", job_id)
+            os.makedirs(job_dir, exist_ok=True)
+            filename = os.path.basename(file.filename)
+            file_path = os.path.join(job_dir, filename)
             
-            print(f"Extracted {len(documents)} document(s) from URL")
+            with open(file_path, "wb") as buffer:
+                await run_in_threadpool(shutil.copyfileobj, file.file, buffer)
             
-            # Extract media (images with OCR) for regular web pages
-            # Social media platforms handle media in their specific extractors
-            media = extract_media_from_url(url)
-
-            if isinstance(media, dict):
-                # Add OCR documents from images found on the page
-                ocr_docs = media.get("ocr_docs", [])
-                if ocr_docs:
-                    documents.extend(ocr_docs)
-                    print(f"Added {len(ocr_docs)} OCR documents from images")
-
-            # Add metadata to all documents
-            for doc in documents:
-                if "source" not in doc.metadata:
-                    doc.metadata["source"] = url
-                if "filename" not in doc.metadata:
-                    doc.metadata["filename"] = url
-                if "file_type" not in doc.metadata:
-                    doc.metadata["file_type"] = "url"
+            logger.info(f"File saved temporarily: {file_path}")
             
-            # Split and store documents
-            from langchain.text_splitter import RecursiveCharacterTextSplitter
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000, 
-                chunk_overlap=200,
-                length_function=len,
-                add_start_index=True,
+            # Every upload is its own source, even when another one has the same name
+            job = job_queue.submit(
+                "file",
+                {"file_path": file_path, "filename": filename, "source": upload_source(filename, job_id),
+                 "temp_path": job_dir, "owner_id": owner_id},
+                job_id=job_id
             )
-            chunks = text_splitter.split_documents(documents)
-            print(f"Split URL content into {len(chunks)} chunks.")
-            
-            # Verify metadata in chunks
-            for chunk in chunks:
-                if "source" not in chunk.metadata:
-                    chunk.metadata["source"] = url
-                if "filename" not in chunk.metadata:
-                    chunk.metadata["filename"] = url
-                if "file_type" not in chunk.metadata:
-                    chunk.metadata["file_type"] = "url"
-            
-            # Store in vector database (auto-persisted in Chroma 0.4+)
-            vector_db.add_documents(chunks)
-            
-            # Determine content type from metadata
-            content_type = documents[0].metadata.get("type", "url") if documents else "url"
-            
-            print(f"✅ Successfully processed URL: {url}")
-            print(f"{'='*60}\n")
-            
-            return JSONResponse(
-                status_code=200,
-                content={
-                    "message": f"URL '{url}' processed successfully.",
-                    "source": url,
-                    "type": content_type,
-                    "chunks": len(chunks),
-                    "num_documents": len(documents),
-                    "num_images_processed": len(media.get("ocr_docs", [])) if isinstance(media, dict) else 0
+        
+        return JSONResponse(
+            status_code=202,
+            content={
+                "message": "Content queued for processing.",
+                "job_id": job["id"],
+                "status": job["status"],
+                "status_url": f"/jobs/{job['id']}"
+            }
+        )
+    except QueueFullError as e:
+        if job_dir:
+            shutil.rmtree(job_dir, ignore_errors=True)
+        return JSONResponse(
+            status_code=503,
+            content={"message": str(e)}
+        )
+    except Exception as e:
+        logger.error(f"Error in upload endpoint: {str(e)}")
+        if job_dir:
+            shutil.rmtree(job_dir, ignore_errors=True)
+        return JSONResponse(
+            status_code=500,
+            content={"message": f"An error occurred: {str(e)}"}
+        )
+
+@app.post("/bulk/")
+async def bulk_upload(
+    urls: Optional[str] = Form(None),
+    archive: Optional[UploadFile] = File(None),
+    owner_id: Optional[str] = Form(None)
+):
+    """
+    Queue many items at once: 'urls' (one per line, or a JSON array) and/or a zip 'archive'
+    of files. Items run through the staged bulk pipeline (fetch, extract, embed), which
+    survives restarts. Returns a batch ID; poll GET /bulk/{batch_id} for per-item progress.
+    """
+    if not urls and archive is None:
+        return JSONResponse(
+            status_code=400,
+            content={"message": "Provide 'urls' and/or an 'archive'."}
+        )
+    
+    batch_id = new_job_id()
+    work_dir = None
+    try:
+        items = bulk_ingest.url_items(bulk_ingest.parse_url_list(urls)) if urls else []
+        if archive is not None:
+            work_dir = os.path.join(bulk_ingest.BULK_DIR, batch_id)
+            os.makedirs(work_dir, exist_ok=True)
+            archive_path = os.path.join(work_dir, "archive.zip")
+            with open(archive_path, "wb") as buffer:
+                await run_in_threadpool(shutil.copyfileobj, archive.file, buffer)
+            items.extend(await run_in_threadpool(bulk_ingest.unpack_archive, archive_path, work_dir))
+            os.remove(archive_path)
+        
+        if not items:
+            raise ValueError("No URLs or supported files found.")
+        
+        get_bulk_pipeline().submit(items, owner=owner_id, work_dir=work_dir, batch_id=batch_id)
+        return JSONResponse(
+            status_code=202,
+            content={
+                "message": "Bulk ingestion started.",
+                "batch_id": batch_id,
+                "total": len(items),
+                "status_url": f"/bulk/{batch_id}"
+            }
+        )
+    except (ValueError, zipfile.BadZipFile) as e:
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        return JSONResponse(
+            status_code=400,
+            content={"message": str(e)}
+        )
+    except Exception as e:
+        logger.error(f"Error in bulk upload endpoint: {str(e)}")
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        return JSONResponse(
+            status_code=500,
+            content={"message": f"An error occurred: {str(e)}"}
+        )
+
+@app.get("/bulk/{batch_id}")
+async def get_bulk_batch(batch_id: str, status: Optional[str] = None, offset: int = 0, limit: int = 100):
+    """Progress of a bulk batch: counts per status, plus a page of items (optionally filtered by status)."""
+    store = get_bulk_pipeline().store
+    batch = store.get_batch(batch_id)
+    if batch is None:
+        return JSONResponse(
+            status_code=404,
+            content={"message": f"Batch '{batch_id}' not found"}
+        )
+    items = store.list_items(batch_id, statuses=[status] if status else None, offset=offset, limit=limit)
+    return JSONResponse(
+        status_code=200,
+        content={
+            "batch_id": batch_id,
+            "status": batch["status"],
+            "total": batch["total"],
+            "counts": batch["counts"],
+            "created_at": batch["created_at"],
+            "updated_at": batch["updated_at"],
+            "items": [
+                {
+                    "index": item["idx"],
+                    "name": item["name"],
+                    "status": item["status"],
+                    "result": item["result"],
+                    "error": item["error"],
                 }
+                for item in items
+            ]
+        }
+    )
+
+def _find_source(sid, owner_id):
+    """The source record behind an ID, only if it belongs to `owner_id`'s namespace."""
+    source = get_content_index().get_source(sid)
+    if source is None or (source["owner"] or None) != (owner_id or None):
+        return None
+    return source
+
+@app.get("/sources/")
+async def list_sources(owner_id: Optional[str] = None, file_type: Optional[str] = None, offset: int = 0, limit: int = 50):
+    """
+    One page of the sources in the owner's namespace, most recently updated first, with
+    their chunk counts, sizes, types and timestamps. Served from the source catalog.
+    """
+    limit = max(1, min(limit, 500))
+    offset = max(0, offset)
+    sources, total = await run_in_threadpool(
+        get_content_index().list_sources, owner_id, offset, limit, file_type
+    )
+    return JSONResponse(
+        status_code=200,
+        content={
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "sources": sources
+        }
+    )
+
+@app.delete("/sources/")
+async def delete_sources(ids: List[str] = Query(...), owner_id: Optional[str] = None):
+    """
+    Remove several sources of the owner's namespace at once (?ids=...&ids=...).
+    Exactly the chunks no remaining source uses are deleted, by ID.
+    """
+    found = [_find_source(sid, owner_id) for sid in ids]
+    missing = [sid for sid, source in zip(ids, found) if source is None]
+    if missing:
+        return JSONResponse(
+            status_code=404,
+            content={"message": "Some sources were not found", "missing": missing}
+        )
+    try:
+        removed = await run_in_threadpool(remove_sources, [source["source"] for source in found], owner_id)
+        return JSONResponse(
+            status_code=200,
+            content={
+                "message": f"Removed {len(found)} sources.",
+                "source_ids": ids,
+                **removed
+            }
+        )
+    except Exception as e:
+        logger.error(f"Error in sources delete endpoint: {str(e)}")
+        return JSONResponse(
+            status_code=500,
+            content={"message": f"An error occurred: {str(e)}"}
+        )
+
+@app.put("/sources/{sid}")
+async def update_source(
+    sid: str,
+    file: Optional[UploadFile] = File(None),
+    owner_id: Optional[str] = Form(None)
+):
+    """
+    Queue re-ingestion of an existing source under the same ID.
+    
+    Send the new version as 'file'; URL sources may omit it to re-fetch the page.
+    Chunks whose text is unchanged keep their IDs and are not re-embedded; chunks that no
+    longer occur are removed. Returns a job ID like /upload/.
+    """
+    source = _find_source(sid, owner_id)
+    if source is None:
+        return JSONResponse(
+            status_code=404,
+            content={"message": f"Source '{sid}' not found"}
+        )
+    
+    is_url = source["source"].startswith(("http://", "https://"))
+    if file is None and not is_url:
+        return JSONResponse(
+            status_code=400,
+            content={"message": "A 'file' is required to update a file source."}
+        )
+    
+    job_id = new_job_id()
+    job_dir = None
+    
+    try:
+        if file is None:
+            job = job_queue.submit(
+                "url", {"url": source["source"], "owner_id": owner_id, "replace": True}, job_id=job_id
             )
-        
-        # Handle file upload
         else:
-            print(f"\n{'='*60}")
-            print(f"Processing File: {file.filename}")
-            print(f"{'='*60}")
+            # The new version is stored under the source's key so its ID stays the same
+            job_dir = os.path.join("temp_files", "jobs", job_id)
+            os.makedirs(job_dir, exist_ok=True)
+            filename = source_filename(source["source"])
+            file_path = os.path.join(job_dir, filename)
             
-            file_path = os.path.join(temp_dir, file.filename)
-            
-            # Save uploaded file temporarily
             with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            
-            print(f"File saved temporarily: {file_path}")
-            
-            # Trigger the ingestion process
-            s3_url = process_and_store(file_path, file.filename)
+                await run_in_threadpool(shutil.copyfileobj, file.file, buffer)
             
-            print(f"✅ Successfully processed file: {file.filename}")
-            print(f"{'='*60}\n")
-            
-            return JSONResponse(
-                status_code=200,
-                content={
-                    "message": f"File '{file.filename}' processed successfully.",
-                    "s3_path": s3_url,
-                    "filename": file.filename,
-                    "type": "file"
-                }
+            job = job_queue.submit(
+                "file",
+                {"file_path": file_path, "filename": filename, "source": source["source"], "temp_path": job_dir,
+                 "owner_id": owner_id, "replace": True},
+                job_id=job_id
             )
-            
+        
+        return JSONResponse(
+            status_code=202,
+            content={
+                "message": "Source update queued for processing.",
+                "source_id": sid,
+                "job_id": job["id"],
+                "status": job["status"],
+                "status_url": f"/jobs/{job['id']}"
+            }
+        )
+    except QueueFullError as e:
+        if job_dir:
+            shutil.rmtree(job_dir, ignore_errors=True)
+        return JSONResponse(
+            status_code=503,
+            content={"message": str(e)}
+        )
     except Exception as e:
-        print(f"❌ Error in upload endpoint: {str(e)}")
+        logger.error(f"Error in source update endpoint: {str(e)}")
+        if job_dir:
+            shutil.rmtree(job_dir, ignore_errors=True)
         return JSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}"}
         )
-    finally:
-        # Clean up temporary file if it exists
-        if file and 'file_path' in locals() and os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-                print(f"🧹 Cleaned up temporary file: {file_path}")
-            except Exception as e:
-                print(f"⚠️  Warning: Could not remove temporary file: {e}")
+
+@app.delete("/sources/{sid}")
+async def delete_source(sid: str, owner_id: Optional[str] = None):
+    """
+    Remove one source's chunks from the owner's namespace.
+    Chunks that other sources of the same owner also contain are kept.
+    """
+    source = _find_source(sid, owner_id)
+    if source is None:
+        return JSONResponse(
+            status_code=404,
+            content={"message": f"Source '{sid}' not found"}
+        )
+    try:
+        removed = await run_in_threadpool(remove_source, source["source"], owner_id)
+        return JSONResponse(
+            status_code=200,
+            content={
+                "message": f"Source '{source['source']}' removed.",
+                "source_id": sid,
+                **removed
+            }
+        )
+    except Exception as e:
+        logger.error(f"Error in source delete endpoint: {str(e)}")
+        return JSONResponse(
+            status_code=500,
+            content={"message": f"An error occurred: {str(e)}"}
+        )
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Get the status, per-stage progress and (once finished) the result of an ingestion job."""
+    job = job_queue.store.get(job_id)
+    if job is None:
+        return JSONResponse(
+            status_code=404,
+            content={"message": f"Job '{job_id}' not found"}
+        )
+    return JSONResponse(status_code=200, content=public_view(job))
 
 @app.post("/query/")
-async def query_model(query: str = Form(...)):
+async def query_model(query: str = Form(...), owner_id: Optional[str] = Form(None)):
     """
     Endpoint to ask a question and get an answer from the indexed documents.
+    Only documents in the 'owner_id' namespace are searched.
     
     Returns:
     - answer: The generated answer from the AI
     - sources: List of source documents that were used to generate the answer
     - num_sources: Number of unique sources referenced
+    - cached: Whether the response came from the answer cache ("cache_match" says how)
     """
     try:
-        print(f"\n{'='*60}")
-        print(f"Query: {query}")
-        print(f"{'='*60}")
+        logger.info(f"Query: {query}")
+        
+        # Serve repeat (or near-identical) questions without running the chain
+        answer_cache = get_answer_cache()
+        generation = answer_cache.generation(owner_id)
+        embed = (lambda: registry.get_embeddings().embed_query(query)) if ANSWER_CACHE_SEMANTIC else None
+        cached, match, query_embedding = await run_in_threadpool(answer_cache.get, query, embed, owner_id)
+        count_cache("answer", match or "miss")
+        if cached is not None:
+            logger.info(f"Answer cache hit ({match})")
+            return JSONResponse(
+                status_code=200,
+                content={**cached, "cached": True, "cache_match": match}
+            )
         
-        # Execute the QA chain
-        result = qa_chain({"query": query})
-        answer = result.get("result")
-        source_documents = result.get("source_documents", [])
+        # Run retrieval and generation off the event loop so queries never wait behind each other
+        answer, source_documents = await run_in_threadpool(rag.answer, query, owner_id)
         
-        print(f"Found {len(source_documents)} relevant document chunks")
+        logger.info(f"Found {len(source_documents)} relevant document chunks")
         
         # Extract unique S3 paths and filenames from source documents
-        sources_info = []
-        seen_paths = set()
+        sources_info = summarize_sources(source_documents)
         
-        for doc in source_documents:
-            s3_path = doc.metadata.get("s3_path", None)
-            filename = doc.metadata.get("filename", "Unknown")
-            file_type = doc.metadata.get("file_type", "Unknown")
-            source = doc.metadata.get("source", "Unknown")
-            doc_type = doc.metadata.get("type", "unknown")
-            
-            # Use source as identifier for URLs, s3_path for files
-            identifier = s3_path if s3_path else source
-            
-            if identifier and identifier not in seen_paths:
-                sources_info.append({
-                    "s3_path": s3_path,
-                    "filename": filename,
-                    "file_type": file_type,
-                    "source": source,
-                    "content_type": doc_type
-                })
-                seen_paths.add(identifier)
+        logger.info(f"Answer generated from {len(sources_info)} unique sources")
         
-        print(f"Answer generated from {len(sources_info)} unique sources")
-        print(f"{'='*60}\n")
+        response = {
+            "answer": answer,
+            "sources": sources_info,
+            "num_sources": len(sources_info)
+        }
+        answer_cache.put(
+            query, response, cited_sources(source_documents), embedding=query_embedding, namespace=owner_id,
+            generation=generation
+        )
         
         return JSONResponse(
             status_code=200,
-            content={
-                "answer": answer,
-                "sources": sources_info,
-                "num_sources": len(sources_info)
-            }
+            content={**response, "cached": False, "cache_match": None}
         )
     except Exception as e:
-        print(f"❌ Error in query endpoint: {str(e)}")
+        logger.error(f"Error in query endpoint: {str(e)}")
         return JSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}"}
         )
 
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/query/stream/")
+async def query_model_stream(request: Request, query: str = Form(...), owner_id: Optional[str] = Form(None)):
+    """
+    Streaming variant of /query/ using server-sent events.
+    
+    Events, in order:
+    - sources: the retrieved sources, sent as soon as retrieval finishes
+    - token: answer text fragments as the LLM produces them
+    - done: the full answer and sources (the same shape as /query/)
+    - error: sent instead of the remaining events if anything fails
+    
+    Generation stops as soon as the client disconnects.
+    """
+    async def events():
+        logger.info(f"Streaming query: {query}")
+        try:
+            answer_cache = get_answer_cache()
+            generation = answer_cache.generation(owner_id)
+            embed = (lambda: registry.get_embeddings().embed_query(query)) if ANSWER_CACHE_SEMANTIC else None
+            cached, match, query_embedding = await run_in_threadpool(answer_cache.get, query, embed, owner_id)
+            count_cache("answer", match or "miss")
+            if cached is not None:
+                logger.info(f"Answer cache hit ({match})")
+                yield _sse("sources", {"sources": cached["sources"], "num_sources": cached["num_sources"]})
+                yield _sse("token", {"text": cached["answer"]})
+                yield _sse("done", {**cached, "cached": True, "cache_match": match})
+                return
+            
+            source_documents = await run_in_threadpool(retrieve, query, owner_id=owner_id)
+            sources_info = summarize_sources(source_documents)
+            yield _sse("sources", {"sources": sources_info, "num_sources": len(sources_info)})
+            
+            answer_parts = []
+            with stage_timer("llm"):
+                async for chunk in get_llm().astream(build_prompt(query, source_documents)):
+                    if await request.is_disconnected():
+                        logger.info("Client disconnected; stopping generation")
+                        return
+                    if chunk.content:
+                        answer_parts.append(chunk.content)
+                        yield _sse("token", {"text": chunk.content})
+            
+            response = {
+                "answer": "".join(answer_parts),
+                "sources": sources_info,
+                "num_sources": len(sources_info)
+            }
+            answer_cache.put(
+                query, response, cited_sources(source_documents), embedding=query_embedding, namespace=owner_id,
+                generation=generation
+            )
+            logger.info(f"Streamed answer from {len(sources_info)} unique sources")
+            yield _sse("done", {**response, "cached": False, "cache_match": None})
+        except asyncio.CancelledError:
+            # Raised into the generator when the server tears down a disconnected stream
+            logger.info("Streaming query cancelled")
+            raise
+        except Exception as e:
+            logger.error(f"Error in streaming query endpoint: {str(e)}")
+            yield _sse("error", {"message": f"An error occurred: {str(e)}"})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: per-stage latency histograms, request, chunk, cache and error counters."""
+    rendered = observability.render_metrics()
+    if rendered is None:
+        return JSONResponse(
+            status_code=503,
+            content={"message": "Metrics are unavailable: prometheus_client is not installed."}
+        )
+    body, content_type = rendered
+    return Response(content=body, media_type=content_type)
+
 @app.get("/")
 async def root():
     """Health check endpoint."""
@@ -298,24 +692,38 @@ async def root():
     }
 
 @app.get("/stats/")
-async def get_stats():
-    """Get statistics about the vector database."""
+async def get_stats(owner_id: Optional[str] = None):
+    """
+    Get statistics about the vector database, or about one owner's namespace: chunk and
+    source totals with per-file-type, per-content-type (and, overall, per-owner) breakdowns.
+    Counts come from the source catalog, so Chroma is not scanned.
+    """
     try:
-        # Get collection info
-        collection = vector_db._collection
-        count = collection.count()
+        catalog = await run_in_threadpool(get_content_index().stats, owner_id)
+        total = catalog["chunks"]
+        if not total:
+            # Catalog not backfilled yet: ask the vector store directly
+            total = await run_in_threadpool(lambda: registry.get_vector_index(owner_id).count())
         
         return JSONResponse(
             status_code=200,
             content={
-                "total_documents": count,
-                "database_path": "./chroma_db",
-                "embedding_model": "all-MiniLM-L6-v2",
-                "llm_model": "gemini-2.5-flash"
+                "total_documents": total,
+                "catalog": catalog,
+                "namespace": registry.collection_name(owner_id),
+                "num_namespaces": len(registry.list_collections()),
+                "database_path": registry.CHROMA_PERSIST_DIRECTORY,
+                "embedding_model": registry.EMBEDDING_MODEL_NAME,
+                "embedding_backend": registry.embedding_info(),
+                "llm_model": registry.LLM_MODEL_NAME,
+                "embedding_batches": registry.embedding_stats(),
+                "media_cache": get_media_cache().stats(),
+                "answer_cache": get_answer_cache().stats(),
+                "rapidapi": rapidapi.stats()
             }
         )
     except Exception as e:
-        print(f"❌ Error in stats endpoint: {str(e)}")
+        logger.error(f"Error in stats endpoint: {str(e)}")
         return JSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}"}
@@ -324,19 +732,18 @@ async def get_stats():
 @app.delete("/clear/")
 async def clear_database():
     """
-    Clear all documents from the vector database.
+    Clear all documents from the vector database (every namespace).
     WARNING: This action cannot be undone!
     """
     try:
-        # Get collection and delete all documents
-        collection = vector_db._collection
-        count = collection.count()
-        
-        # Delete all documents
-        collection.delete(where={})
+        # Delete every namespace on the configured vector engine
+        count = await run_in_threadpool(registry.drop_all_vector_indexes)
+        get_content_index().clear()
+        get_answer_cache().clear()
+        lexical_index.drop_all()
         # Auto-persisted in Chroma 0.4+
         
-        print(f"🗑️  Cleared {count} documents from database")
+        logger.info(f"Cleared {count} documents from database")
         
         return JSONResponse(
             status_code=200,
@@ -346,7 +753,7 @@ async def clear_database():
             }
         )
     except Exception as e:
-        print(f"Error in clear endpoint: {str(e)}")
+        logger.error(f"Error in clear endpoint: {str(e)}")
         return JSONResponse(
             status_code=500,
             content={"message": f"An error occurred: {str(e)}"}
@@ -356,9 +763,14 @@ async def clear_database():
 async def health_check():
     """Detailed health check with system status."""
     try:
-        # Check vector database
-        collection = vector_db._collection
-        doc_count = collection.count()
+        # Check vector database (listing collections is enough to prove the connection)
+        namespaces = await run_in_threadpool(registry.list_collections)
+        doc_count = (await run_in_threadpool(get_content_index().stats))["chunks"]
+        if not doc_count:
+            # Catalog not backfilled yet: ask the vector store directly
+            doc_count = await run_in_threadpool(
+                lambda: sum(registry.namespace_index(name).count() for name in namespaces)
+            )
         
         # Check if Google API key is set
         google_api_configured = bool(os.getenv("GOOGLE_API_KEY"))
@@ -374,8 +786,9 @@ async def health_check():
                 "total_documents": doc_count,
                 "google_api_configured": google_api_configured,
                 "aws_s3_configured": aws_configured,
-                "embedding_model": "all-MiniLM-L6-v2",
-                "llm_model": "gemini-2.5-flash"
+                "pending_jobs": job_queue.pending(),
+                "embedding_model": registry.EMBEDDING_MODEL_NAME,
+                "llm_model": registry.LLM_MODEL_NAME
             }
         )
     except Exception as e:
@@ -387,5 +800,17 @@ async def health_check():
             }
         )
 
+@app.get("/ready/")
+async def readiness_check():
+    """
+    Readiness probe: 200 once the models and vector store are loaded, 503 while warming up.
+    Unlike /health/, this never touches the vector store, so it is cheap to poll.
+    """
+    status = registry.status()
+    return JSONResponse(
+        status_code=200 if status["ready"] else 503,
+        content=status
+    )
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
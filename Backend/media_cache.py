@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from observability import count_cache
+
+# --- Media-derived Text Cache ---
+# OCR text and transcripts keyed by a SHA-256 of the media bytes, with a secondary key on
+# the URL so a known URL can skip even the download. Entries expire after a TTL and the
+# least recently used ones are evicted once the cache grows past its size budget.
+
+MEDIA_CACHE_PATH = os.getenv("MEDIA_CACHE_PATH", "./media_cache.db")
+MEDIA_CACHE_MAX_BYTES = int(os.getenv("MEDIA_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+MEDIA_CACHE_TTL = float(os.getenv("MEDIA_CACHE_TTL", str(30 * 24 * 3600)))
+
+OCR = "ocr"
+TRANSCRIPT = "transcript"
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class MediaCache:
+    def __init__(self, db_path=MEDIA_CACHE_PATH, max_bytes=MEDIA_CACHE_MAX_BYTES, ttl=MEDIA_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    kind TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (kind, content_hash)
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries (last_access)")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS urls (
+                    kind TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    PRIMARY KEY (kind, url)
+                )
+                """
+            )
+
+    def get(self, kind, content_hash=None, url=None):
+        """
+        Look up by content hash, or by URL when no hash is given.
+        Returns (hit, value); value may legitimately be None (e.g. an image with no text).
+        """
+        now = time.time()
+        by_url = content_hash is None and url is not None
+        with self._lock, self._conn:
+            if by_url:
+                row = self._conn.execute(
+                    "SELECT content_hash FROM urls WHERE kind = ? AND url = ?", (kind, url)
+                ).fetchone()
+                content_hash = row[0] if row else None
+            row = None
+            if content_hash is not None:
+                row = self._conn.execute(
+                    "SELECT value, created_at FROM entries WHERE kind = ? AND content_hash = ?",
+                    (kind, content_hash),
+                ).fetchone()
+                if row and now - row[1] > self.ttl:
+                    self._conn.execute(
+                        "DELETE FROM entries WHERE kind = ? AND content_hash = ?", (kind, content_hash)
+                    )
+                    row = None
+                if row:
+                    self._conn.execute(
+                        "UPDATE entries SET last_access = ? WHERE kind = ? AND content_hash = ?",
+                        (now, kind, content_hash),
+                    )
+        self._count(kind, "url" if by_url else "hash", bool(row))
+        count_cache(f"media_{kind}", "hit" if row else "miss")
+        return (True, json.loads(row[0])) if row else (False, None)
+
+    def set(self, kind, content_hash, value, url=None):
+        payload = json.dumps(value)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (kind, content_hash, value, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, content_hash, payload, len(payload), now, now),
+            )
+            if url is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO urls (kind, url, content_hash) VALUES (?, ?, ?)",
+                    (kind, url, content_hash),
+                )
+            self._evict()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT kind, content_hash, size FROM entries ORDER BY last_access"
+        ).fetchall()
+        evicted = []
+        for kind, content_hash, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((kind, content_hash))
+            total -= size
+        self._conn.executemany("DELETE FROM entries WHERE kind = ? AND content_hash = ?", evicted)
+        self._conn.execute(
+            "DELETE FROM urls WHERE NOT EXISTS (SELECT 1 FROM entries e WHERE e.kind = urls.kind "
+            "AND e.content_hash = urls.content_hash)"
+        )
+        self._counters["evictions"] = self._counters.get("evictions", 0) + len(evicted)
+
+    def _count(self, kind, key_type, hit):
+        name = f"{kind}_{key_type}_{'hits' if hit else 'misses'}"
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+            return {**self._counters, "entries": entries, "size_bytes": size, "max_bytes": self.max_bytes}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_media_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = MediaCache()
+        return _cache
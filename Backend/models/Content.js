@@ -8,6 +8,7 @@ const ContentSchema = new mongoose.Schema({
   contentType: { type: String, enum: ['file', 'url', 'youtube', 'twitter', 'instagram', 'unknown'], default: 'unknown' },
   source: { type: String, required: true },
   s3Path: { type: String },
+  mlSourceId: { type: String },
   isPublic: { type: Boolean, default: false },
   isFavorite: { type: Boolean, default: false },
   sharedWith: [{ type: mongoose.Schema.ObjectId, ref: 'User' }],
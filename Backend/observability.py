@@ -0,0 +1,142 @@
+import os
+import sys
+import json
+import time
+import logging
+from contextlib import contextmanager
+
+# --- Metrics & Logging Configuration ---
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" emits one JSON object per line for log shippers; "text" is for local development
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+
+# Ingest stages run from milliseconds (split) to minutes (transcription)
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+TOKEN_BUCKETS = (100, 250, 500, 750, 1000, 1500, 2000, 3000, 4000, 6000, 8000)
+
+try:
+    from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+    METRICS_AVAILABLE = True
+except ImportError:
+    METRICS_AVAILABLE = False
+
+
+class _NoopMetric:
+    """Stands in for every metric when prometheus_client is not installed."""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+
+if METRICS_AVAILABLE:
+    STAGE_SECONDS = Histogram(
+        "secondbrain_stage_seconds", "Time spent in one pipeline stage",
+        ["stage"], buckets=STAGE_BUCKETS,
+    )
+    REQUEST_SECONDS = Histogram(
+        "secondbrain_http_request_seconds", "HTTP request latency",
+        ["method", "path", "status"], buckets=STAGE_BUCKETS,
+    )
+    REQUESTS_IN_FLIGHT = Gauge(
+        "secondbrain_http_requests_in_flight", "HTTP requests being served", ["path"]
+    )
+    CHUNKS = Counter(
+        "secondbrain_chunks_total", "Chunks handled by ingestion", ["outcome"]
+    )
+    CACHE_LOOKUPS = Counter(
+        "secondbrain_cache_lookups_total", "Cache lookups", ["cache", "result"]
+    )
+    EXTRACTOR_ERRORS = Counter(
+        "secondbrain_extractor_errors_total", "Content extraction failures", ["extractor"]
+    )
+    JOBS = Counter(
+        "secondbrain_jobs_total", "Finished ingestion jobs", ["kind", "status"]
+    )
+    CONTEXT_TOKENS = Histogram(
+        "secondbrain_context_tokens", "Estimated context tokens per query, before and after packing",
+        ["phase"], buckets=TOKEN_BUCKETS,
+    )
+else:
+    STAGE_SECONDS = REQUEST_SECONDS = REQUESTS_IN_FLIGHT = _NoopMetric()
+    CHUNKS = CACHE_LOOKUPS = EXTRACTOR_ERRORS = JOBS = CONTEXT_TOKENS = _NoopMetric()
+
+
+@contextmanager
+def stage_timer(stage):
+    """Observe the duration of the enclosed block in the per-stage histogram."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage).observe(time.perf_counter() - started)
+
+
+def observe_stage(stage, seconds):
+    STAGE_SECONDS.labels(stage).observe(seconds)
+
+
+def count_chunks(outcome, amount):
+    if amount:
+        CHUNKS.labels(outcome).inc(amount)
+
+
+def count_cache(cache, result):
+    CACHE_LOOKUPS.labels(cache, result).inc()
+
+
+def extractor_error(extractor):
+    EXTRACTOR_ERRORS.labels(extractor).inc()
+
+
+def observe_context_tokens(retrieved, packed):
+    CONTEXT_TOKENS.labels("retrieved").observe(retrieved)
+    CONTEXT_TOKENS.labels("packed").observe(packed)
+
+
+def render_metrics():
+    """(body, content_type) for the /metrics endpoint; None if metrics are unavailable."""
+    if not METRICS_AVAILABLE:
+        return None
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+# --- Logging ---
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including any `extra={...}` fields."""
+
+    _RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in self._RESERVED})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level=None, fmt=None):
+    level = level or os.getenv("LOG_LEVEL", LOG_LEVEL).upper()
+    fmt = fmt or os.getenv("LOG_FORMAT", LOG_FORMAT).lower()
+    handler = logging.StreamHandler(sys.stdout)
+    if fmt == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)-7s %(name)s: %(message)s"))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
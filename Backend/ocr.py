@@ -0,0 +1,203 @@
+import os
+import logging
+import time
+import threading
+import multiprocessing
+from io import BytesIO
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from http_client import http_client
+from media_cache import get_media_cache, hash_bytes, OCR
+from observability import stage_timer, observe_stage, extractor_error
+
+logger = logging.getLogger(__name__)
+
+# --- OCR Executor Configuration ---
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 2)))
+OCR_DOWNLOAD_WORKERS = int(os.getenv("OCR_DOWNLOAD_WORKERS", "16"))
+OCR_TIMEOUT = float(os.getenv("OCR_TIMEOUT", "60"))
+OCR_DOWNLOAD_TIMEOUT = float(os.getenv("OCR_DOWNLOAD_TIMEOUT", "15"))
+
+
+# --- Worker Process Side ---
+
+def _load_image(data):
+    from PIL import Image
+    img = Image.open(BytesIO(data))
+    # Handle different image formats like .webp
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    return img
+
+
+def _ocr_bytes(data):
+    import pytesseract
+    text = pytesseract.image_to_string(_load_image(data))
+    return text if text.strip() else None
+
+
+# --- Parent Process Side ---
+_pool = None
+_download_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pools():
+    global _pool, _download_pool
+    with _pool_lock:
+        if _pool is None:
+            # Tesseract is CPU-bound, so one worker process per core
+            _pool = ProcessPoolExecutor(
+                max_workers=OCR_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        if _download_pool is None:
+            _download_pool = ThreadPoolExecutor(max_workers=OCR_DOWNLOAD_WORKERS, thread_name_prefix="ocr-fetch")
+        return _pool, _download_pool
+
+
+def _recycle_pool(pool):
+    """
+    Kill a pool whose workers are stuck on images nobody waits for any more; the next call
+    starts a fresh one. OCR still running on it elsewhere fails with BrokenProcessPool.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    logger.warning("Recycling the OCR pool after a timeout")
+    for process in list((pool._processes or {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _abandoned(future):
+    """True when a timed-out OCR future is still running and so keeps its worker busy."""
+    return future is not None and not future.done() and not future.cancel()
+
+
+def _completed(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+def _submit_cached(data, pool, url=None):
+    """Return a future for the OCR text of `data`, served from the media cache when possible."""
+    cache = get_media_cache()
+    content_hash = hash_bytes(data)
+    hit, text = cache.get(OCR, content_hash=content_hash)
+    if hit:
+        if url is not None:
+            cache.set(OCR, content_hash, text, url=url)
+        return _completed(text)
+
+    future = pool.submit(_ocr_bytes, data)
+
+    def _store(done):
+        if not done.cancelled() and done.exception() is None:
+            cache.set(OCR, content_hash, done.result(), url=url)
+
+    future.add_done_callback(_store)
+    return future
+
+
+def ocr_image_bytes(data, timeout=OCR_TIMEOUT):
+    """OCR raw image bytes on the process pool. Returns the text, or None if nothing was detected."""
+    pool, _ = _get_pools()
+    future = _submit_cached(data, pool)
+    with stage_timer("ocr"):
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            if _abandoned(future):
+                _recycle_pool(pool)
+            raise
+
+
+def ocr_image_file(file_path, timeout=OCR_TIMEOUT):
+    with open(file_path, "rb") as f:
+        return ocr_image_bytes(f.read(), timeout=timeout)
+
+
+def _fetch_and_submit(url, pool):
+    # A URL seen before skips the download entirely
+    hit, text = get_media_cache().get(OCR, url=url)
+    if hit:
+        return _completed(text)
+    resp = http_client.get(url, timeout=OCR_DOWNLOAD_TIMEOUT)
+    resp.raise_for_status()
+    # Hand the bytes to OCR as soon as this download lands, while others are still in flight
+    return _submit_cached(resp.content, pool, url=url)
+
+
+def ocr_image_urls(urls, timeout=OCR_TIMEOUT):
+    """
+    Download and OCR every URL concurrently.
+
+    Returns a list aligned with `urls`: the OCR text, or None when the image had no text,
+    failed, or did not finish within `timeout` seconds of being waited for. Each image has
+    its own timeout, so one slow image does not use up the others' time; tesseract runs
+    that timed out are killed by recycling the pool once the batch is collected.
+    """
+    if not urls:
+        return []
+    pool, download_pool = _get_pools()
+    started = time.monotonic()
+    downloads = [download_pool.submit(_fetch_and_submit, url, pool) for url in urls]
+
+    results = []
+    stuck = False
+    for url, download in zip(urls, downloads):
+        ocr_future = None
+        try:
+            ocr_future = download.result(timeout=timeout)
+            text = ocr_future.result(timeout=timeout)
+            if text:
+                logger.debug(f"Successfully ran OCR on image: {url}")
+            results.append(text)
+        except Exception as e:
+            logger.error(f"OCR failed for {url}: {e!r}")
+            extractor_error("ocr")
+            download.cancel()
+            stuck = _abandoned(ocr_future) or stuck
+            results.append(None)
+    if stuck:
+        _recycle_pool(pool)
+    observe_stage("ocr", time.monotonic() - started)
+    return results
+
+
+def ocr_downloaded_images(items, timeout=OCR_TIMEOUT):
+    """
+    OCR already-downloaded images concurrently. `items` are (url, bytes) pairs; the result
+    is aligned with them like ocr_image_urls', with the same per-image timeout.
+    """
+    if not items:
+        return []
+    pool, _ = _get_pools()
+    started = time.monotonic()
+    futures = [_submit_cached(data, pool, url=url) for url, data in items]
+
+    results = []
+    stuck = False
+    for (url, _), future in zip(items, futures):
+        try:
+            results.append(future.result(timeout=timeout))
+        except Exception as e:
+            logger.error(f"OCR failed for {url}: {e!r}")
+            extractor_error("ocr")
+            stuck = _abandoned(future) or stuck
+            results.append(None)
+    if stuck:
+        _recycle_pool(pool)
+    observe_stage("ocr", time.monotonic() - started)
+    return results
+
+
+def shutdown():
+    global _pool, _download_pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _download_pool.shutdown(wait=False, cancel_futures=True)
+            _pool = _download_pool = None
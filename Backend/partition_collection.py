@@ -0,0 +1,123 @@
+"""
+Split the shared (pre-namespace) Chroma collection into per-owner collections.
+
+Chunks are copied with their stored embeddings, so nothing is re-embedded. The owner of a
+chunk comes from its `owner_id` metadata or, failing that, from a JSON mapping of
+source -> owner ID(s) (see scripts/exportSourceOwners.js, which exports it from MongoDB).
+A source saved by several users is copied into each of their namespaces. Chunks with no
+known owner stay where they are.
+
+Usage:
+    python partition_collection.py --mapping source_owners.json [--delete-source] [--dry-run]
+"""
+import json
+import argparse
+from collections import Counter
+
+import registry
+import lexical_index
+from content_index import get_content_index
+
+
+def _owners_for(metadata, mapping):
+    metadata = metadata or {}
+    if metadata.get("owner_id"):
+        return [metadata["owner_id"]]
+    for key in ("source", "filename", "parent_source"):
+        if metadata.get(key) in mapping:
+            owners = mapping[metadata[key]]
+            return [owners] if isinstance(owners, str) else list(owners)
+    return []
+
+
+def partition(mapping, page_size=500, delete_source=False, dry_run=False):
+    client = registry.get_chroma_client()
+    source = client.get_collection(registry.DEFAULT_COLLECTION)
+    content_index = get_content_index()
+    moved = Counter()
+    unassigned = 0
+    offset = 0
+
+    while True:
+        page = source.get(
+            include=["documents", "metadatas", "embeddings"], limit=page_size, offset=offset
+        )
+        if not len(page["ids"]):
+            break
+        offset += len(page["ids"])
+
+        groups = {}
+        for i, metadata in enumerate(page["metadatas"]):
+            owners = _owners_for(metadata, mapping)
+            if not owners:
+                unassigned += 1
+            for owner in owners:
+                groups.setdefault(owner, []).append(i)
+
+        for owner, rows in groups.items():
+            ids = [page["ids"][i] for i in rows]
+            moved[owner] += len(ids)
+            if dry_run:
+                continue
+            metadatas = [{**(page["metadatas"][i] or {}), "owner_id": owner} for i in rows]
+            target = client.get_or_create_collection(registry.collection_name(owner))
+            target.upsert(
+                ids=ids,
+                documents=[page["documents"][i] for i in rows],
+                metadatas=metadatas,
+                embeddings=[page["embeddings"][i] for i in rows],
+            )
+            by_source = {}
+            for metadata, cid in zip(metadatas, ids):
+                by_source.setdefault(metadata.get("source") or metadata.get("filename", ""), []).append(cid)
+            for chunk_source, chunk_ids in by_source.items():
+                content_index.link_chunks(chunk_ids, chunk_source, owner)
+
+        print(f"Scanned {offset} chunks: {sum(moved.values())} copies made, {unassigned} without an owner")
+
+    if delete_source and not dry_run and moved:
+        # Second pass, so paging above was never disturbed by deletes
+        offset = 0
+        to_delete = []
+        while True:
+            page = source.get(include=["metadatas"], limit=page_size, offset=offset)
+            if not len(page["ids"]):
+                break
+            offset += len(page["ids"])
+            to_delete.extend(
+                cid for cid, metadata in zip(page["ids"], page["metadatas"])
+                if _owners_for(metadata, mapping)
+            )
+        for start in range(0, len(to_delete), page_size):
+            source.delete(ids=to_delete[start:start + page_size])
+        print(f"Removed {len(to_delete)} partitioned chunks from the shared collection")
+
+    if not dry_run and moved:
+        # Lexical indexes of the touched namespaces are rebuilt from Chroma on next use
+        lexical_index.drop_all()
+
+    return {"moved": dict(moved), "unassigned": unassigned}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split the shared Chroma collection into per-owner namespaces.")
+    parser.add_argument("--mapping", help="JSON file mapping source (filename or URL) to an owner ID or list of IDs")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--delete-source", action="store_true",
+                        help="Remove partitioned chunks from the shared collection afterwards")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would move")
+    args = parser.parse_args()
+
+    mapping = {}
+    if args.mapping:
+        with open(args.mapping, encoding="utf-8") as f:
+            mapping = json.load(f)
+
+    summary = partition(mapping, page_size=args.page_size, delete_source=args.delete_source, dry_run=args.dry_run)
+    for owner, count in sorted(summary["moved"].items(), key=lambda item: -item[1]):
+        print(f"  {registry.collection_name(owner)}: {count} chunks")
+    print(f"Unassigned chunks left in '{registry.DEFAULT_COLLECTION}': {summary['unassigned']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import os
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# --- Page-sharded Extraction Configuration ---
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 2)))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "25"))
+# Smaller PDFs are parsed inline; pool start-up is not worth it
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "60"))
+# Page ranges parsed ahead of the consumer; bounds memory for very large documents
+PDF_MAX_INFLIGHT = int(os.getenv("PDF_MAX_INFLIGHT", str(PDF_WORKERS * 2)))
+
+DOCX_SECTION_CHARS = int(os.getenv("DOCX_SECTION_CHARS", "20000"))
+
+
+# --- Worker Process Side ---
+
+def _extract_range(file_path, start, end):
+    from pypdf import PdfReader
+    reader = PdfReader(file_path)
+    return [(i, reader.pages[i].extract_text() or "") for i in range(start, end)]
+
+
+# --- Parent Process Side ---
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def page_count(file_path):
+    from pypdf import PdfReader
+    return len(PdfReader(file_path).pages)
+
+
+def iter_pdf_pages(file_path):
+    """
+    Yield (page_index, text) in page order without materializing the whole document.
+    Large PDFs are parsed in page ranges on a process pool, with at most PDF_MAX_INFLIGHT
+    ranges parsed ahead of the consumer.
+    """
+    total = page_count(file_path)
+    if total < PDF_PARALLEL_MIN_PAGES:
+        from pypdf import PdfReader
+        reader = PdfReader(file_path)
+        for i in range(total):
+            yield i, reader.pages[i].extract_text() or ""
+        return
+
+    logger.info(f"Parsing {total} pages in ranges of {PDF_PAGES_PER_TASK} on {PDF_WORKERS} workers")
+    pool = _get_pool()
+    ranges = deque((start, min(start + PDF_PAGES_PER_TASK, total)) for start in range(0, total, PDF_PAGES_PER_TASK))
+    inflight = deque()
+    try:
+        while ranges or inflight:
+            while ranges and len(inflight) < PDF_MAX_INFLIGHT:
+                start, end = ranges.popleft()
+                inflight.append(pool.submit(_extract_range, file_path, start, end))
+            for page in inflight.popleft().result():
+                yield page
+    finally:
+        for future in inflight:
+            future.cancel()
+
+
+def iter_docx_sections(file_path, section_chars=DOCX_SECTION_CHARS):
+    """Yield (section_index, text), grouping consecutive paragraphs up to ~section_chars."""
+    import docx
+
+    document = docx.Document(file_path)
+    section, size, index = [], 0, 0
+    for paragraph in document.paragraphs:
+        text = paragraph.text
+        if not text.strip():
+            continue
+        section.append(text)
+        size += len(text) + 1
+        if size >= section_chars:
+            yield index, "\n".join(section)
+            section, size, index = [], 0, index + 1
+    if section:
+        yield index, "\n".join(section)
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
@@ -0,0 +1,105 @@
+import os
+from registry import get_vector_index, get_embeddings, get_llm, RETRIEVER_K
+from lexical_index import get_lexical_index, reciprocal_rank_fusion
+from langchain.docstore.document import Document
+from content_index import source_id
+from context_packing import pack_context, estimate_tokens
+from observability import stage_timer, observe_context_tokens
+
+# --- Retrieval & Prompt Assembly ---
+# The pieces of a "stuff" RetrievalQA chain, split apart so retrieval can be hybrid and
+# the streaming endpoint can emit sources before it streams the LLM's tokens.
+
+# Each retriever contributes this many candidates before rank fusion picks the final k
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+
+# Same wording as LangChain's default "stuff" QA prompt, so streamed and non-streamed
+# answers behave alike
+PROMPT_TEMPLATE = (
+    "Use the following pieces of context to answer the question at the end. "
+    "If you don't know the answer, just say that you don't know, don't try to make up an answer.\n\n"
+    "{context}\n\n"
+    "Question: {question}\n"
+    "Helpful Answer:"
+)
+
+
+def retrieve(query, k=RETRIEVER_K, owner_id=None):
+    """
+    Hybrid retrieval within one owner's namespace: dense Chroma search and BM25 lexical
+    search, fused by reciprocal rank. Exact identifiers and names that embeddings miss can
+    still make the top k.
+    """
+    with stage_timer("retrieval"):
+        return _retrieve(query, k, owner_id)
+
+
+def _retrieve(query, k, owner_id):
+    vector_index = get_vector_index(owner_id)
+    if not HYBRID_SEARCH:
+        return vector_index.similarity_search(query, k=k)
+
+    # Fuse on the IDs the store returns: legacy chunks have UUIDs, not content hashes
+    hits = vector_index.search(get_embeddings().embed_query(query), HYBRID_CANDIDATES)
+    by_id = {doc_id: Document(page_content=text, metadata=metadata or {}) for doc_id, _, text, metadata in hits}
+    lexical_ids = [doc_id for doc_id, _ in get_lexical_index(owner_id, fresh=True).search(query, k=HYBRID_CANDIDATES)]
+
+    fused = reciprocal_rank_fusion([list(by_id), lexical_ids])[:k]
+    missing = [doc_id for doc_id in fused if doc_id not in by_id]
+    if missing:
+        fetched = vector_index.get(ids=missing, include=["documents", "metadatas"])
+        for doc_id, text, metadata in zip(fetched["ids"], fetched["documents"], fetched["metadatas"]):
+            by_id[doc_id] = Document(page_content=text, metadata=metadata or {})
+    return [by_id[doc_id] for doc_id in fused if doc_id in by_id]
+
+
+def answer(query, owner_id=None):
+    """Retrieve context and ask the LLM. Returns (answer_text, source_documents)."""
+    documents = retrieve(query, owner_id=owner_id)
+    with stage_timer("llm"):
+        response = get_llm().invoke(build_prompt(query, documents))
+    return response.content, documents
+
+
+def build_prompt(query, documents):
+    """The QA prompt over `documents` (in relevance order), packed into the context budget."""
+    with stage_timer("context_packing"):
+        packed = pack_context(documents)
+    context = "\n\n".join(doc.page_content for doc in packed)
+    observe_context_tokens(sum(estimate_tokens(doc.page_content) for doc in documents), estimate_tokens(context))
+    return PROMPT_TEMPLATE.format(context=context, question=query)
+
+
+def summarize_sources(documents):
+    """Unique source descriptors (one per S3 object or URL) for a list of retrieved chunks."""
+    sources_info = []
+    seen_paths = set()
+
+    for doc in documents:
+        s3_path = doc.metadata.get("s3_path", None)
+        filename = doc.metadata.get("filename", "Unknown")
+        file_type = doc.metadata.get("file_type", "Unknown")
+        source = doc.metadata.get("source", "Unknown")
+        doc_type = doc.metadata.get("type", "unknown")
+
+        # Use source as identifier for URLs, s3_path for files
+        identifier = s3_path if s3_path else source
+
+        if identifier and identifier not in seen_paths:
+            sources_info.append({
+                "s3_path": s3_path,
+                "filename": filename,
+                "file_type": file_type,
+                "source": source,
+                "source_id": source_id(source, doc.metadata.get("owner_id")),
+                "content_type": doc_type
+            })
+            seen_paths.add(identifier)
+
+    return sources_info
+
+
+def cited_sources(documents):
+    """The raw `source` values of retrieved chunks, used to key answer-cache invalidation."""
+    return {doc.metadata.get("source") for doc in documents if doc.metadata.get("source")}
@@ -0,0 +1,274 @@
+import os
+import time
+import random
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+import httpx
+from http_client import http_client
+
+logger = logging.getLogger(__name__)
+
+# --- RapidAPI Provider Configuration ---
+# One key for every provider unless RAPIDAPI_<PROVIDER>_KEY overrides it; hosts, request
+# rates and burst sizes are per provider (RAPIDAPI_<PROVIDER>_HOST / _RATE / _BURST).
+# There is no default key: a provider without one fails every request.
+RAPIDAPI_KEY = os.getenv("RAPIDAPI_KEY", "")
+RAPIDAPI_RATE = float(os.getenv("RAPIDAPI_RATE", "1"))  # requests per second
+RAPIDAPI_BURST = int(os.getenv("RAPIDAPI_BURST", "3"))
+RAPIDAPI_MAX_RETRIES = int(os.getenv("RAPIDAPI_MAX_RETRIES", "4"))
+RAPIDAPI_BACKOFF_BASE = float(os.getenv("RAPIDAPI_BACKOFF_BASE", "1"))
+RAPIDAPI_BACKOFF_MAX = float(os.getenv("RAPIDAPI_BACKOFF_MAX", "60"))
+# Requests wait in line for a token this long before giving up
+RAPIDAPI_MAX_QUEUE_SECONDS = float(os.getenv("RAPIDAPI_MAX_QUEUE_SECONDS", "300"))
+# Consecutive failures (5xx, timeouts) that open the circuit, and how long it stays open
+RAPIDAPI_BREAKER_FAILURES = int(os.getenv("RAPIDAPI_BREAKER_FAILURES", "5"))
+RAPIDAPI_BREAKER_RESET = float(os.getenv("RAPIDAPI_BREAKER_RESET", "60"))
+
+DEFAULT_HOSTS = {
+    "youtube": "youtube-transcript3.p.rapidapi.com",
+    "twitter": "twitter241.p.rapidapi.com",
+    "instagram": "instagram-scraper-stable-api.p.rapidapi.com",
+}
+
+
+class ProviderError(Exception):
+    """A provider request that failed for a reason a later retry may fix (rate limit, outage)."""
+
+
+class ProviderUnavailable(ProviderError):
+    """The provider's circuit breaker is open; requests fail fast until it half-opens."""
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket that makes callers wait their turn instead of failing.
+
+    Each acquire() takes a numbered ticket, and ticket n may go once the bucket has handed
+    out n tokens since its schedule started, so waiters are served in arrival order.
+    pause() restarts that schedule at the end of the pause with an empty bucket, e.g. for
+    a Retry-After or an exhausted quota window; waiters re-read it after every sleep, so
+    callers already waiting are pushed back too and then leave one token apart.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._lock = threading.Lock()
+        # Schedule: at _start, _tokens were available to tickets from _first on
+        self._start = time.monotonic()
+        self._tokens = float(self.burst)
+        self._first = 0
+        self._next_ticket = 0
+        self._waiting = set()
+
+    def _slot(self, ticket):
+        # Caller holds the lock
+        return self._start + max(0.0, ticket - self._first + 1 - self._tokens) / self.rate
+
+    def _rebase(self, now):
+        # Caller holds the lock: restart the schedule at `now` with the tokens left then
+        if now >= self._start:
+            issued = self._next_ticket - self._first
+            self._tokens = min(self.burst, self._tokens + (now - self._start) * self.rate - issued)
+            self._start, self._first = now, self._next_ticket
+
+    def acquire(self, max_wait=None):
+        """Block until a token is available; returns the seconds waited."""
+        start = time.monotonic()
+        with self._lock:
+            self._rebase(start)
+            ticket = self._next_ticket
+            wait = self._slot(ticket) - start
+            if max_wait is not None and wait > max_wait:
+                raise ProviderError(f"Rate-limit queue is {wait:.0f}s long (limit {max_wait:.0f}s)")
+            self._next_ticket += 1
+            if wait <= 0:
+                return 0.0
+            self._waiting.add(ticket)
+        try:
+            while wait > 0:
+                time.sleep(wait)
+                with self._lock:
+                    wait = self._slot(ticket) - time.monotonic()
+        finally:
+            with self._lock:
+                self._waiting.discard(ticket)
+        return time.monotonic() - start
+
+    def pause(self, seconds):
+        with self._lock:
+            until = time.monotonic() + seconds
+            if until <= self._start:
+                return
+            # Every caller still waiting queues behind the pause, one token apart
+            self._first = min(self._waiting, default=self._next_ticket)
+            self._start, self._tokens = until, 0.0
+
+
+class CircuitBreaker:
+    """Closed -> open after `failures` consecutive errors -> half-open after `reset` seconds."""
+
+    def __init__(self, failures=RAPIDAPI_BREAKER_FAILURES, reset=RAPIDAPI_BREAKER_RESET):
+        self.failures = failures
+        self.reset = reset
+        self._lock = threading.Lock()
+        self._consecutive = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half_open" if time.monotonic() - self._opened_at >= self.reset else "open"
+
+    def before_request(self, name):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self.reset - (time.monotonic() - self._opened_at)
+            # Half-open: one probe request at a time decides whether to close again
+            if remaining > 0 or self._probing:
+                raise ProviderUnavailable(f"{name} is unavailable (circuit open, retry in {max(remaining, 1):.0f}s)")
+            self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            self._probing = False
+            if self._opened_at is not None or self._consecutive >= self.failures:
+                self._opened_at = time.monotonic()
+
+
+class Provider:
+    """One RapidAPI host with its own bucket, breaker and counters."""
+
+    def __init__(self, name, host=None, key=None, rate=None, burst=None):
+        prefix = f"RAPIDAPI_{name.upper()}"
+        self.name = name
+        self.host = host or os.getenv(f"{prefix}_HOST", DEFAULT_HOSTS.get(name, ""))
+        self.key = key or os.getenv(f"{prefix}_KEY", RAPIDAPI_KEY)
+        self.bucket = TokenBucket(
+            rate or float(os.getenv(f"{prefix}_RATE", str(RAPIDAPI_RATE))),
+            burst or int(os.getenv(f"{prefix}_BURST", str(RAPIDAPI_BURST))),
+        )
+        self.breaker = CircuitBreaker()
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "rate_limited": 0, "failures": 0, "retries": 0, "queued_seconds": 0.0}
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queued_seconds"] = round(stats["queued_seconds"], 3)
+        stats["circuit"] = self.breaker.state
+        return stats
+
+    def get(self, path, params=None, timeout=20, max_retries=RAPIDAPI_MAX_RETRIES):
+        """
+        GET https://<host><path> once a token is free. 429s wait out Retry-After, 5xx and
+        network errors back off with full jitter; both are retried up to max_retries times.
+        Returns the response (4xx other than 429 included); raises ProviderError otherwise.
+        """
+        if not self.key:
+            raise ProviderError(
+                f"{self.name} has no RapidAPI key configured; set RAPIDAPI_KEY or RAPIDAPI_{self.name.upper()}_KEY"
+            )
+        url = f"https://{self.host}{path}"
+        headers = {"x-rapidapi-key": self.key, "x-rapidapi-host": self.host}
+        last_error = None
+        for attempt in range(max_retries + 1):
+            if attempt:
+                self._count("retries")
+            self._count("queued_seconds", self.bucket.acquire(RAPIDAPI_MAX_QUEUE_SECONDS))
+            self.breaker.before_request(self.name)
+            self._count("requests")
+            try:
+                response = http_client.get(url, headers=headers, params=params, timeout=timeout)
+            except httpx.HTTPError as e:
+                last_error = f"{type(e).__name__}: {e}"
+                self._failed(attempt, last_error)
+                continue
+
+            if response.status_code == 429:
+                # The provider is up, just busy; this does not count against the breaker
+                self._count("rate_limited")
+                self.breaker.record_success()
+                delay = _retry_after(response) or _backoff(attempt)
+                last_error = f"429 Too Many Requests (retry after {delay:.1f}s)"
+                logger.warning(f"{self.name} rate limited; pausing {delay:.1f}s", extra={"provider": self.name})
+                self.bucket.pause(delay)
+                continue
+            if response.status_code >= 500:
+                last_error = f"HTTP {response.status_code}"
+                self._failed(attempt, last_error)
+                continue
+
+            self.breaker.record_success()
+            self._respect_quota(response)
+            return response
+        raise ProviderError(f"{self.name} request failed after {max_retries + 1} attempts: {last_error}")
+
+    def _failed(self, attempt, error):
+        self._count("failures")
+        self.breaker.record_failure()
+        delay = _backoff(attempt)
+        logger.warning(f"{self.name} request failed ({error}); retrying in {delay:.1f}s", extra={"provider": self.name})
+        time.sleep(delay)
+
+    def _respect_quota(self, response):
+        # RapidAPI reports the plan's remaining requests and when the window resets
+        remaining = response.headers.get("x-ratelimit-requests-remaining")
+        reset = response.headers.get("x-ratelimit-requests-reset")
+        try:
+            if remaining is not None and int(remaining) <= 0 and reset:
+                logger.warning(f"{self.name} quota exhausted; pausing {reset}s", extra={"provider": self.name})
+                self.bucket.pause(float(reset))
+        except ValueError:
+            pass
+
+
+def _retry_after(response):
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def _backoff(attempt):
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(RAPIDAPI_BACKOFF_MAX, RAPIDAPI_BACKOFF_BASE * 2 ** attempt))
+
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def get_provider(name):
+    with _providers_lock:
+        if name not in _providers:
+            _providers[name] = Provider(name)
+        return _providers[name]
+
+
+def stats():
+    with _providers_lock:
+        providers = dict(_providers)
+    return {name: provider.stats() for name, provider in providers.items()}
@@ -0,0 +1,289 @@
+import os
+import logging
+import re
+import time
+import hashlib
+import threading
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# --- Shared Model & Vector Store Registry ---
+# One process-wide home for the embedding model, the Chroma handle and the LLM client.
+# Everything is created lazily on first use so importing main.py or
+# ingest.py is cheap, and both modules share the same instances.
+
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+CHROMA_PERSIST_DIRECTORY = os.getenv("CHROMA_PERSIST_DIRECTORY", "./chroma_db")
+LLM_MODEL_NAME = os.getenv("LLM_MODEL", "gemini-2.5-flash")
+LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.1"))
+RETRIEVER_K = int(os.getenv("RETRIEVER_K", "5"))
+EMBED_BATCHING = os.getenv("EMBED_BATCHING", "true").lower() == "true"
+# See embedding_backends.py: "sentence-transformers" (reference) or "onnx" (int8 by default)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "sentence-transformers").lower()
+# Each namespace records the embedding space (model, backend, quantization) its vectors
+# came from. Opening it under another space is refused ("error") or only logged ("warn").
+EMBEDDING_SPACE_MISMATCH = os.getenv("EMBEDDING_SPACE_MISMATCH", "error").lower()
+
+# Chunks uploaded without an owner (and everything indexed before per-user namespaces)
+# live in LangChain's default collection
+DEFAULT_COLLECTION = "langchain"
+
+# Warm up at FastAPI startup (per worker), or at import time in the parent of a
+# pre-forking server so workers inherit the model weights copy-on-write.
+WARM_UP_ON_STARTUP = os.getenv("WARM_UP_ON_STARTUP", "true").lower() == "true"
+PRELOAD_ON_IMPORT = os.getenv("PRELOAD_ON_IMPORT", "false").lower() == "true"
+
+# Components holding sockets, file handles or SQLite connections must not cross a fork.
+# The embedding model is plain read-only memory and is kept so children share its pages;
+# an ONNX Runtime session owns thread pools that do not survive a fork, so it is reloaded.
+_FORK_UNSAFE = ("chroma_client", "vector_db", "vector_index", "llm") + (("embeddings",) if EMBEDDING_BACKEND.startswith("onnx") else ())
+
+_PROCESS_STARTED_AT = time.time()
+
+_lock = threading.RLock()
+_instances = {}
+_load_seconds = {}
+_load_rss_mb = {}
+_ready_at = None
+
+
+def _get(name, factory):
+    instance = _instances.get(name)
+    if instance is not None:
+        return instance
+    with _lock:
+        instance = _instances.get(name)
+        if instance is None:
+            started, rss_before = time.perf_counter(), _current_rss_bytes()
+            instance = factory()
+            _load_seconds[name] = round(time.perf_counter() - started, 3)
+            _load_rss_mb[name] = round((_current_rss_bytes() - rss_before) / (1024 * 1024), 1)
+            _instances[name] = instance
+            logger.info(f"Loaded {name} in {_load_seconds[name]}s")
+    return instance
+
+
+def _create_embeddings():
+    from embedding_backends import create_embeddings
+    embeddings = create_embeddings(EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND)
+    if EMBED_BATCHING:
+        # Coalesce concurrent ingests and queries into shared forward passes
+        from embedding_batcher import BatchingEmbeddings
+        embeddings = BatchingEmbeddings(embeddings)
+    return embeddings
+
+
+def _create_chroma_client():
+    import chromadb
+    return chromadb.PersistentClient(path=CHROMA_PERSIST_DIRECTORY)
+
+
+def _create_vector_db(collection_name):
+    from langchain.vectorstores import Chroma
+    return Chroma(
+        client=get_chroma_client(),
+        collection_name=collection_name,
+        embedding_function=get_embeddings(),
+        persist_directory=CHROMA_PERSIST_DIRECTORY,
+    )
+
+
+def _create_vector_index(name, check_space=True):
+    from vector_index import VECTOR_ENGINE, ChromaIndex, open_index
+    if VECTOR_ENGINE == "chroma":
+        index = ChromaIndex(_get(f"vector_db:{name}", lambda: _create_vector_db(name)), get_chroma_client(), name)
+    else:
+        index = open_index(VECTOR_ENGINE, name)
+    if check_space:
+        _check_embedding_space(index, name)
+    return index
+
+
+def embedding_space():
+    from embedding_backends import embedding_space as space
+    return space(EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND)
+
+
+def _check_embedding_space(index, name):
+    """
+    Refuse to mix vector spaces in one namespace. Content-hash reuse never re-embeds a
+    known chunk, so switching model, backend or quantization would otherwise leave old and
+    new vectors side by side, scored against each other.
+    """
+    current = embedding_space()
+    recorded = index.metadata().get("embedding_space")
+    if recorded is None:
+        # Namespaces filled before spaces were recorded were embedded by sentence-transformers
+        recorded = current if not index.count() else f"{EMBEDDING_MODEL_NAME}|sentence-transformers|fp32"
+        index.set_metadata(embedding_space=recorded)
+    if recorded != current:
+        message = (
+            f"Namespace {name} holds vectors from {recorded}, but the configured embedding space is "
+            f"{current}; clear and re-ingest it, or set EMBEDDING_SPACE_MISMATCH=warn to use it anyway"
+        )
+        if EMBEDDING_SPACE_MISMATCH != "warn":
+            raise RuntimeError(message)
+        logger.warning(message)
+
+
+def collection_name(owner_id=None):
+    """Chroma collection holding one owner's chunks (the default collection when owner_id is empty)."""
+    if not owner_id:
+        return DEFAULT_COLLECTION
+    safe = re.sub(r"[^A-Za-z0-9_-]", "", str(owner_id))
+    if safe != str(owner_id) or not 1 <= len(safe) <= 50:
+        safe = hashlib.sha1(str(owner_id).encode("utf-8")).hexdigest()
+    return f"user_{safe}"
+
+
+def _create_llm():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(model=LLM_MODEL_NAME, temperature=LLM_TEMPERATURE)
+
+
+def get_embeddings():
+    return _get("embeddings", _create_embeddings)
+
+
+def get_chroma_client():
+    return _get("chroma_client", _create_chroma_client)
+
+
+def get_vector_db(owner_id=None):
+    """The LangChain Chroma store of one owner's namespace (used by the "chroma" engine)."""
+    name = collection_name(owner_id)
+    return _get(f"vector_db:{name}", lambda: _create_vector_db(name))
+
+
+def get_vector_index(owner_id=None):
+    """
+    Vector index scoped to one owner's namespace, on the configured VECTOR_ENGINE;
+    searches never cross namespaces.
+    """
+    return _get_vector_index(collection_name(owner_id))
+
+
+def _get_vector_index(name):
+    return _get(f"vector_index:{name}", lambda: _create_vector_index(name))
+
+
+def namespace_index(name):
+    """Vector index of a namespace by its collection name, as returned by list_collections."""
+    return _get_vector_index(name)
+
+
+def list_collections():
+    from vector_index import VECTOR_ENGINE, list_namespaces
+    if VECTOR_ENGINE != "chroma":
+        return list_namespaces()
+    return [c if isinstance(c, str) else c.name for c in get_chroma_client().list_collections()]
+
+
+def drop_all_vector_indexes():
+    """Delete every namespace on the configured engine; returns how many chunks they held."""
+    count = 0
+    for name in list_collections():
+        # No embedding-space check: clearing is how a mismatched namespace gets fixed
+        index = _instances.get(f"vector_index:{name}") or _create_vector_index(name, check_space=False)
+        count += index.count()
+        index.drop()
+    forget_vector_dbs()
+    return count
+
+
+def forget_vector_dbs():
+    """Drop cached namespace handles, e.g. after their collections were deleted."""
+    with _lock:
+        for name in [name for name in _instances if name.startswith(("vector_db:", "vector_index:"))]:
+            _instances.pop(name, None)
+
+
+def get_llm():
+    return _get("llm", _create_llm)
+
+
+def embedding_stats():
+    """Batch-size and queue-wait counters, or None when batching is off or not yet loaded."""
+    embeddings = _instances.get("embeddings")
+    return embeddings.stats() if hasattr(embeddings, "stats") else None
+
+
+def embedding_info():
+    """Backend, model load time, RSS growth while loading and observed throughput."""
+    stats = embedding_stats() or {}
+    return {
+        "backend": EMBEDDING_BACKEND,
+        "model": EMBEDDING_MODEL_NAME,
+        "space": embedding_space(),
+        "load_seconds": _load_seconds.get("embeddings"),
+        "load_rss_mb": _load_rss_mb.get("embeddings"),
+        "texts_per_second": stats.get("texts_per_second"),
+    }
+
+
+def warm_up(include_llm=True):
+    """Eagerly load the components so the first request does not pay for them."""
+    global _ready_at
+    get_embeddings()
+    get_vector_index()
+    if include_llm:
+        get_llm()
+    if _ready_at is None:
+        _ready_at = time.time()
+
+
+def preload_for_fork():
+    """
+    Load only the fork-safe parts (the embedding model) in a parent process.
+    Forked workers reuse the weights and open their own store and LLM handles.
+    """
+    get_embeddings()
+
+
+def is_ready():
+    return _ready_at is not None or not WARM_UP_ON_STARTUP
+
+
+def _current_rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def status():
+    """Loaded components, their load times, current RSS and cold-start time."""
+    return {
+        "ready": is_ready(),
+        "loaded": sorted(name for name in _instances if ":" not in name),
+        "load_seconds": {name: t for name, t in _load_seconds.items() if ":" not in name},
+        "embedding": embedding_info(),
+        "open_namespaces": sum(1 for name in _instances if name.startswith("vector_index:")),
+        "rss_mb": round(_current_rss_bytes() / (1024 * 1024), 1),
+        "cold_start_seconds": round(_ready_at - _PROCESS_STARTED_AT, 3) if _ready_at else None,
+        "pid": os.getpid(),
+    }
+
+
+def _reset_after_fork():
+    global _lock, _ready_at, _PROCESS_STARTED_AT
+    _lock = threading.RLock()
+    for name in list(_instances):
+        if name.split(":")[0] in _FORK_UNSAFE:
+            _instances.pop(name, None)
+            _load_seconds.pop(name, None)
+            _load_rss_mb.pop(name, None)
+    _ready_at = None
+    _PROCESS_STARTED_AT = time.time()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+if PRELOAD_ON_IMPORT:
+    preload_for_fork()
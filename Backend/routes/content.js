@@ -16,7 +16,7 @@ router.route('/')
   .post(protect, upload.single('file'), uploadContent);
 
 router.route('/:id')
-  .put(protect, updateContent)
+  .put(protect, upload.single('file'), updateContent)
   .delete(protect, deleteContent);
 
 router.post('/:id/share', protect, shareContent);
@@ -1,8 +1,9 @@
 const express = require('express');
-const { performSearch } = require('../controllers/searchController');
+const { performSearch, streamSearch } = require('../controllers/searchController');
 const { protect } = require('../middleware/authMiddleware');
 const router = express.Router();
 
 router.post('/', protect, performSearch);
+router.post('/stream', protect, streamSearch);
 
 module.exports = router;
\ No newline at end of file
@@ -0,0 +1,35 @@
+/**
+ * Exports a JSON map of content source (filename or URL) -> owner user IDs from MongoDB.
+ * Feed the output to `python partition_collection.py --mapping <file>` to split the
+ * shared vector collection into per-user namespaces.
+ *
+ * Usage: node scripts/exportSourceOwners.js > source_owners.json
+ */
+const mongoose = require('mongoose');
+const dotenv = require('dotenv');
+const Content = require('../models/Content');
+
+dotenv.config();
+
+const run = async () => {
+  await mongoose.connect(process.env.MONGO_URI);
+
+  const mapping = {};
+  const cursor = Content.find({}, { source: 1, user: 1 }).lean().cursor();
+  for await (const content of cursor) {
+    const owners = mapping[content.source] || [];
+    const owner = content.user.toString();
+    if (!owners.includes(owner)) {
+      owners.push(owner);
+    }
+    mapping[content.source] = owners;
+  }
+
+  process.stdout.write(JSON.stringify(mapping, null, 2));
+  await mongoose.disconnect();
+};
+
+run().catch((error) => {
+  console.error('Failed to export source owners:', error.message);
+  process.exit(1);
+});
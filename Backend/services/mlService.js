@@ -5,10 +5,49 @@ const mlApi = axios.create({
   baseURL: process.env.ML_API_URL,
 });
 
+const JOB_POLL_INTERVAL_MS = parseInt(process.env.ML_JOB_POLL_INTERVAL_MS || '1000', 10);
+const JOB_TIMEOUT_MS = parseInt(process.env.ML_JOB_TIMEOUT_MS || '600000', 10);
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+/**
+ * Fetches the current status of an ingestion job from the Python ML service.
+ * @param {string} jobId - The job ID returned by /upload/.
+ * @returns {Promise<object>} The job record (status, stage, stages, result, error).
+ */
+exports.getJobStatus = async (jobId) => {
+  const response = await mlApi.get(`/jobs/${jobId}`);
+  return response.data;
+};
+
 /**
- * Forwards a file or URL to the Python ML service for ingestion.
- * @param {object} data - The data to send. Can contain a file buffer or a URL.
- * @returns {Promise<object>} The response from the ML service.
+ * Polls an ingestion job until it completes or fails.
+ * @param {string} jobId - The job ID returned by /upload/.
+ * @returns {Promise<object>} The result of the completed job.
+ */
+const waitForJob = async (jobId) => {
+  const deadline = Date.now() + JOB_TIMEOUT_MS;
+
+  while (Date.now() < deadline) {
+    const job = await exports.getJobStatus(jobId);
+
+    if (job.status === 'completed') {
+      return job.result;
+    }
+    if (job.status === 'failed') {
+      throw new Error(job.error || 'Ingestion job failed');
+    }
+
+    await sleep(JOB_POLL_INTERVAL_MS);
+  }
+
+  throw new Error(`Timed out waiting for ingestion job ${jobId}`);
+};
+
+/**
+ * Forwards a file or URL to the Python ML service for ingestion and waits for the queued job to finish.
+ * @param {object} data - The data to send. Can contain a file buffer or a URL, plus the owning user's ID.
+ * @returns {Promise<object>} The result of the ingestion job.
  */
 exports.ingestContent = async (data) => {
   try {
@@ -18,6 +57,10 @@ exports.ingestContent = async (data) => {
       form.append('url', data.url);
     }
 
+    if (data.ownerId) {
+      form.append('owner_id', data.ownerId);
+    }
+
     if (data.file) {
       // data.file is a buffer from multer
       form.append('file', data.file.buffer, data.file.originalname);
@@ -29,22 +72,77 @@ exports.ingestContent = async (data) => {
       },
     });
 
-    return response.data;
+    return await waitForJob(response.data.job_id);
   } catch (error) {
     console.error('Error calling ML ingestion service:', error.response ? error.response.data : error.message);
     throw new Error('Failed to process content with ML service');
   }
 };
 
+/**
+ * Re-ingests an existing source in the Python ML service and waits for the queued job to finish.
+ * Only chunks whose text changed are re-embedded.
+ * @param {string} sourceId - The source_id returned when the content was first ingested.
+ * @param {object} data - The owning user's ID and, for file sources, the new file buffer from multer.
+ * @returns {Promise<object>} The result of the update job.
+ */
+exports.updateSource = async (sourceId, data) => {
+  try {
+    const form = new FormData();
+
+    if (data.ownerId) {
+      form.append('owner_id', data.ownerId);
+    }
+
+    if (data.file) {
+      form.append('file', data.file.buffer, data.file.originalname);
+    }
+
+    const response = await mlApi.put(`/sources/${sourceId}`, form, {
+      headers: {
+        ...form.getHeaders(),
+      },
+    });
+
+    return await waitForJob(response.data.job_id);
+  } catch (error) {
+    console.error('Error calling ML source update:', error.response ? error.response.data : error.message);
+    throw new Error('Failed to update content in ML service');
+  }
+};
+
+/**
+ * Removes a source's chunks from the Python ML service.
+ * @param {string} sourceId - The source_id returned when the content was ingested.
+ * @param {string} ownerId - The user who owns the source.
+ * @returns {Promise<object|null>} Removal counts, or null if the ML service does not know the source.
+ */
+exports.deleteSource = async (sourceId, ownerId) => {
+  try {
+    const response = await mlApi.delete(`/sources/${sourceId}`, {
+      params: { owner_id: ownerId },
+    });
+    return response.data;
+  } catch (error) {
+    if (error.response && error.response.status === 404) {
+      return null;
+    }
+    console.error('Error calling ML source delete:', error.response ? error.response.data : error.message);
+    throw new Error('Failed to delete content from ML service');
+  }
+};
+
 /**
  * Sends a search query to the Python ML service.
  * @param {string} query - The user's search query.
+ * @param {string} ownerId - The user whose content should be searched.
  * @returns {Promise<object>} The search result from the ML service.
  */
-exports.queryModel = async (query) => {
+exports.queryModel = async (query, ownerId) => {
   try {
     const form = new FormData();
     form.append('query', query);
+    form.append('owner_id', ownerId);
 
     const response = await mlApi.post('/query/', form, {
       headers: {
@@ -57,4 +155,27 @@ exports.queryModel = async (query) => {
     console.error('Error calling ML query service:', error.response ? error.response.data : error.message);
     throw new Error('Failed to get search result from ML service');
   }
-};
\ No newline at end of file
+};
+
+/**
+ * Opens a server-sent-events stream for a query against the Python ML service.
+ * @param {string} query - The user's search query.
+ * @param {string} ownerId - The user whose content should be searched.
+ * @param {AbortSignal} [signal] - Aborts the upstream request (and LLM generation) when fired.
+ * @returns {Promise<import('stream').Readable>} The raw SSE byte stream.
+ */
+exports.streamQuery = async (query, ownerId, signal) => {
+  const form = new FormData();
+  form.append('query', query);
+  form.append('owner_id', ownerId);
+
+  const response = await mlApi.post('/query/stream/', form, {
+    headers: {
+      ...form.getHeaders(),
+    },
+    responseType: 'stream',
+    signal,
+  });
+
+  return response.data;
+};
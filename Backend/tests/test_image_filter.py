@@ -0,0 +1,25 @@
+import pytest
+
+from image_filter import _SKIP_URL
+
+
+@pytest.mark.parametrize("path", [
+    "/img/profile-picture.png",
+    "/img/profile_pictures/42.jpg",
+    "/users/profilepic.jpg",
+    "/assets/site-logo_2x.png",
+    "/ads/banner.jpg",
+    "/t/1x1.gif",
+])
+def test_skips_decorative_image_paths(path):
+    assert _SKIP_URL.search(path)
+
+
+@pytest.mark.parametrize("path", [
+    "/uploads/silicon-wafer.jpg",
+    "/media/soundtrack-cover.png",
+    "/docs/picture-of-the-chart.png",
+    "/img/11x17-poster.jpg",
+])
+def test_keeps_content_image_paths(path):
+    assert not _SKIP_URL.search(path)
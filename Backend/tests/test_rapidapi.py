@@ -0,0 +1,112 @@
+import threading
+import time
+
+import pytest
+
+import rapidapi
+from rapidapi import CircuitBreaker, Provider, ProviderError, ProviderUnavailable, TokenBucket
+
+# Real clocks with short windows; tolerances absorb scheduler jitter
+SLACK = 0.02
+
+
+def _acquire_all(bucket, count, pause_after=None, pause_for=0.0):
+    """Start `count` concurrent acquires; returns when each got its token, from the start."""
+    start = time.monotonic()
+    released = [None] * count
+
+    def take(i):
+        bucket.acquire()
+        released[i] = time.monotonic() - start
+
+    threads = [threading.Thread(target=take, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    if pause_after is not None:
+        time.sleep(pause_after)
+        bucket.pause(pause_for)
+    for thread in threads:
+        thread.join()
+    return sorted(released)
+
+
+def test_bucket_serves_burst_then_rate():
+    bucket = TokenBucket(rate=20, burst=2)
+    released = _acquire_all(bucket, 5)
+    assert released[1] < SLACK
+    for earlier, later in zip(released[1:], released[2:]):
+        assert later - earlier >= 0.05 - SLACK
+
+
+def test_pause_delays_callers_already_waiting():
+    bucket = TokenBucket(rate=10, burst=1)
+    bucket.acquire()
+    released = _acquire_all(bucket, 1, pause_after=0.02, pause_for=0.3)
+    # Its slot was at 0.1s; the pause ends at 0.32s and starts with an empty bucket
+    assert released[0] >= 0.32 + 0.1 - SLACK
+
+
+def test_pause_releases_waiters_one_token_apart():
+    bucket = TokenBucket(rate=20, burst=3)
+    released = _acquire_all(bucket, 8, pause_after=0.01, pause_for=0.25)
+    assert all(t < SLACK for t in released[:3])
+    queued = released[3:]
+    assert queued[0] >= 0.26 + 0.05 - SLACK
+    for earlier, later in zip(queued, queued[1:]):
+        assert later - earlier >= 0.05 - SLACK
+
+
+def test_max_wait_rejects_without_taking_a_slot():
+    bucket = TokenBucket(rate=10, burst=1)
+    bucket.acquire()
+    for _ in range(3):
+        with pytest.raises(ProviderError):
+            bucket.acquire(max_wait=0.01)
+    assert bucket.acquire() < 0.1 + SLACK
+
+
+def test_breaker_opens_half_opens_and_closes():
+    breaker = CircuitBreaker(failures=2, reset=0.05)
+    breaker.before_request("test")
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(ProviderUnavailable):
+        breaker.before_request("test")
+
+    time.sleep(0.05 + SLACK)
+    assert breaker.state == "half_open"
+    breaker.before_request("test")
+    # Only one probe at a time
+    with pytest.raises(ProviderUnavailable):
+        breaker.before_request("test")
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_request("test")
+
+
+def test_breaker_failed_probe_reopens():
+    breaker = CircuitBreaker(failures=1, reset=0.05)
+    breaker.record_failure()
+    time.sleep(0.05 + SLACK)
+    breaker.before_request("test")
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(ProviderUnavailable):
+        breaker.before_request("test")
+
+
+def test_breaker_success_resets_failure_count():
+    breaker = CircuitBreaker(failures=2, reset=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_provider_without_key_fails(monkeypatch):
+    monkeypatch.setattr(rapidapi, "RAPIDAPI_KEY", "")
+    monkeypatch.delenv("RAPIDAPI_YOUTUBE_KEY", raising=False)
+    with pytest.raises(ProviderError, match="no RapidAPI key"):
+        Provider("youtube").get("/api/transcript")
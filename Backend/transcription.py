@@ -0,0 +1,203 @@
+import os
+import logging
+import time
+import threading
+import importlib.util
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from langchain.docstore.document import Document
+from observability import observe_stage
+
+logger = logging.getLogger(__name__)
+
+# --- Transcription Configuration ---
+WHISPER_MODEL_SIZE = os.getenv("WHISPER_MODEL", "base")
+TRANSCRIBE_WORKERS = int(os.getenv("TRANSCRIBE_WORKERS", "2"))
+TRANSCRIBE_MAX_QUEUE = int(os.getenv("TRANSCRIBE_MAX_QUEUE", "8"))
+TRANSCRIBE_QUEUE_WAIT = float(os.getenv("TRANSCRIBE_QUEUE_WAIT", "300"))
+TRANSCRIBE_TIMEOUT = float(os.getenv("TRANSCRIBE_TIMEOUT", "1800"))
+
+# Long media is cut near these lengths, at the quietest point within the search window
+SEGMENT_TARGET_SECONDS = float(os.getenv("TRANSCRIBE_SEGMENT_SECONDS", "120"))
+SEGMENT_SEARCH_SECONDS = float(os.getenv("TRANSCRIBE_SEGMENT_SEARCH_SECONDS", "15"))
+SAMPLE_RATE = 16000
+ENERGY_FRAME_SECONDS = 0.05
+
+# Transcript documents are grouped up to roughly this many characters so each
+# chunk keeps a tight start/end timestamp range
+DOCUMENT_TARGET_CHARS = 800
+
+
+class TranscriptionQueueFull(Exception):
+    """Raised when too many files are already waiting for transcription."""
+
+
+# --- Worker Process Side ---
+_worker_model = None
+
+
+def _init_worker(model_size):
+    """Load the Whisper model once per worker process; it stays resident for every job."""
+    global _worker_model
+    import whisper
+    _worker_model = whisper.load_model(model_size)
+
+
+def _transcribe_segment(audio, offset_seconds):
+    result = _worker_model.transcribe(audio)
+    return [
+        {
+            "start": round(segment["start"] + offset_seconds, 2),
+            "end": round(segment["end"] + offset_seconds, 2),
+            "text": segment["text"].strip(),
+        }
+        for segment in result.get("segments", [])
+        if segment["text"].strip()
+    ]
+
+
+# --- Parent Process Side ---
+_pool = None
+_pool_lock = threading.Lock()
+_queue_slots = threading.BoundedSemaphore(TRANSCRIBE_MAX_QUEUE)
+
+
+def whisper_available():
+    return importlib.util.find_spec("whisper") is not None
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn keeps the workers clear of the parent's torch and thread state
+            _pool = ProcessPoolExecutor(
+                max_workers=TRANSCRIBE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(WHISPER_MODEL_SIZE,),
+            )
+            logger.info(f"Started {TRANSCRIBE_WORKERS} transcription worker(s) with Whisper '{WHISPER_MODEL_SIZE}'")
+        return _pool
+
+
+def split_on_silence(audio, sample_rate=SAMPLE_RATE, target_seconds=SEGMENT_TARGET_SECONDS,
+                     search_seconds=SEGMENT_SEARCH_SECONDS):
+    """
+    Return (start, end) sample ranges covering the audio, each close to target_seconds long,
+    cut at the lowest-energy frame near every target boundary.
+    """
+    import numpy as np
+
+    total = len(audio)
+    target = int(target_seconds * sample_rate)
+    if total <= target * 1.5:
+        return [(0, total)]
+
+    frame = int(ENERGY_FRAME_SECONDS * sample_rate)
+    n_frames = total // frame
+    energy = np.sqrt(np.mean(np.square(audio[:n_frames * frame].reshape(n_frames, frame)), axis=1))
+
+    search = int(search_seconds * sample_rate)
+    boundaries = [0]
+    position = 0
+    while total - position > target * 1.5:
+        ideal = position + target
+        lo = max(position + target // 2, ideal - search) // frame
+        # A zero search window still needs one frame to cut at
+        hi = max(min(ideal + search, total) // frame, lo + 1)
+        cut = (lo + int(np.argmin(energy[lo:hi]))) * frame + frame // 2
+        boundaries.append(cut)
+        position = cut
+    boundaries.append(total)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def _group_segments(segments, metadata):
+    documents = []
+    current = []
+    for segment in segments:
+        current.append(segment)
+        if sum(len(s["text"]) for s in current) >= DOCUMENT_TARGET_CHARS:
+            documents.append(_to_document(current, metadata))
+            current = []
+    if current:
+        documents.append(_to_document(current, metadata))
+    return documents
+
+
+def _to_document(segments, metadata):
+    return Document(
+        page_content=" ".join(s["text"] for s in segments),
+        metadata={**metadata, "start_time": segments[0]["start"], "end_time": segments[-1]["end"]},
+    )
+
+
+def transcribe_file(file_path, timeout=TRANSCRIBE_TIMEOUT, metadata=None):
+    """
+    Transcribe an audio/video file on the resident worker pool.
+
+    The audio is split on silence, segments are transcribed in parallel, and the result is
+    returned as Documents in playback order with start_time/end_time (seconds) in metadata.
+    """
+    if not whisper_available():
+        raise ImportError("No module named 'whisper'")
+    import whisper
+
+    if not _queue_slots.acquire(timeout=TRANSCRIBE_QUEUE_WAIT):
+        raise TranscriptionQueueFull(f"Transcription queue is full ({TRANSCRIBE_MAX_QUEUE} files waiting)")
+    started = time.perf_counter()
+    try:
+        audio = whisper.load_audio(file_path)
+        ranges = split_on_silence(audio)
+        logger.info(f"Transcribing {len(audio) / SAMPLE_RATE:.0f}s of audio in {len(ranges)} segment(s)")
+
+        pool = _get_pool()
+        futures = [
+            pool.submit(_transcribe_segment, audio[start:end], start / SAMPLE_RATE)
+            for start, end in ranges
+        ]
+        segments = []
+        # One deadline for the whole file, not per segment
+        deadline = time.monotonic() + timeout
+        try:
+            for future in futures:
+                segments.extend(future.result(timeout=max(0, deadline - time.monotonic())))
+        except FutureTimeoutError:
+            # cancel() only stops segments that have not started; running ones would keep
+            # their workers busy long after the caller gave up
+            stuck = [future for future in futures if not future.done() and not future.cancel()]
+            if stuck:
+                _recycle_pool(pool)
+            raise TimeoutError(f"Transcription exceeded {timeout:.0f}s")
+    finally:
+        _queue_slots.release()
+        observe_stage("transcription", time.perf_counter() - started)
+
+    if not segments:
+        return [Document(page_content="Audio/Video file uploaded but no speech was detected.", metadata=dict(metadata or {}))]
+    return _group_segments(segments, dict(metadata or {}))
+
+
+def _recycle_pool(pool):
+    """
+    Kill a pool whose workers are stuck on abandoned segments; the next file starts a fresh
+    one. Other files still running on it fail with BrokenProcessPool and are retried by
+    their job.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    logger.warning("Recycling the transcription pool after a timeout")
+    for process in list((pool._processes or {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
@@ -1,24 +1,34 @@
-import requests
 from bs4 import BeautifulSoup
 from langchain.docstore.document import Document
-import pytesseract
-from PIL import Image
-from io import BytesIO
 import re
 from urllib.parse import urlparse, urljoin
 import os
+import logging
 import tempfile
+from http_client import http_client
+from ocr import ocr_image_urls, ocr_downloaded_images
+from image_filter import candidates_from_html, rank_images
+from media_cache import get_media_cache, TRANSCRIPT
+from observability import extractor_error
+from rapidapi import get_provider, ProviderError
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
 
 # Attempt to import the transcription function from ingest.py
 try:
     from ingest import transcribe_audio_video
+    from transcription import TranscriptionQueueFull
 except ImportError:
-    print("Warning: Could not import 'transcribe_audio_video' from 'ingest'. Video transcription will be disabled.")
-    def transcribe_audio_video(file_path):
+    logger.warning("Could not import 'transcribe_audio_video' from 'ingest'. Video transcription will be disabled.")
+    def transcribe_audio_video(file_path, source_url=None):
         return [Document(page_content="Error: Transcription module not loaded.")]
 
-# --- Configuration ---
-HEADERS = {"User-Agent": "Mozilla/5.0"}
+    class TranscriptionQueueFull(Exception):
+        pass
+
+# Transcription that timed out or found the pool saturated: the job is retried later
+TRANSCRIPTION_BUSY = (TimeoutError, TranscriptionQueueFull)
 
 # --- URL Type Checkers ---
 def is_youtube_url(url: str) -> bool:
@@ -42,49 +52,42 @@ def is_instagram_url(url: str) -> bool:
 # --- OCR and Media Helper Functions ---
 def ocr_from_image_url(img_url: str):
     """Download image from a URL and run OCR."""
-    try:
-        resp = requests.get(img_url, timeout=15, headers=HEADERS)
-        resp.raise_for_status()
-        # Handle different image formats like .webp
-        img = Image.open(BytesIO(resp.content))
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-        text = pytesseract.image_to_string(img)
-        if not text.strip():
-            return None # Return None for no detected text
-        print(f"✅ Successfully ran OCR on image: {img_url}")
-        return text
-    except Exception as e:
-        print(f"❌ OCR failed for {img_url}: {e}")
-        return None
+    return ocr_image_urls([img_url])[0]
 
 def transcribe_video_from_url(video_url: str):
     """Download a video from a URL to a temp file and transcribe it."""
     temp_path = None
+    # A reel seen before is answered from the cache without downloading it again
+    hit, cached = get_media_cache().get(TRANSCRIPT, url=video_url)
+    if hit:
+        logger.info("Using cached transcript for video.")
+        return " ".join(d["page_content"] for d in cached)
     try:
         with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp_file:
             temp_path = tmp_file.name
-            with requests.get(video_url, stream=True, timeout=60) as r:
-                r.raise_for_status()
-                for chunk in r.iter_content(chunk_size=8192):
-                    tmp_file.write(chunk)
+            http_client.download(video_url, tmp_file, timeout=60)
         
-        print(f"Download complete. Transcribing from: {temp_path}")
-        transcript_docs = transcribe_audio_video(temp_path)
+        logger.info(f"Download complete. Transcribing from: {temp_path}")
+        transcript_docs = transcribe_audio_video(temp_path, source_url=video_url)
         
         if transcript_docs and "Error" not in transcript_docs[0].page_content:
-            print("✅ Successfully transcribed video.")
-            return transcript_docs[0].page_content
+            logger.info("Successfully transcribed video.")
+            # Stitch the timestamped segments back into one transcript
+            return " ".join(doc.page_content for doc in transcript_docs)
         else:
-            print("⚠️ Transcription failed or was empty.")
+            logger.warning("Transcription failed or was empty.")
             return None
+    except TRANSCRIPTION_BUSY:
+        extractor_error("video_transcription")
+        raise
     except Exception as e:
-        print(f"❌ Failed to download or process video for transcription: {e}")
+        logger.error(f"Failed to download or process video for transcription: {e}")
+        extractor_error("video_transcription")
         return None
     finally:
         if temp_path and os.path.exists(temp_path):
             os.remove(temp_path)
-            print(f"🧹 Cleaned up temporary video file: {temp_path}")
+            logger.debug(f"Cleaned up temporary video file: {temp_path}")
 
 # --- Platform-Specific Content Extractors ---
 def extract_instagram_content(url: str):
@@ -92,9 +95,6 @@ def extract_instagram_content(url: str):
     Extracts content from Instagram, handling single posts and multi-media carousels.
     """
     documents = []
-    API_HOST = "instagram-scraper-stable-api.p.rapidapi.com"
-    API_URL = f"https://{API_HOST}/get_media_data_v2.php"
-    API_KEY = "58618da25cmsh9a89ebd5dddb215p1fd3d2jsne9346e0c07be"
     
     try:
         media_code_match = re.search(r'/(p|reel)/([^/]+)', url)
@@ -102,11 +102,10 @@ def extract_instagram_content(url: str):
             raise ValueError("Could not extract a valid media code from the Instagram URL.")
         media_code = media_code_match.group(2)
 
-        headers = {"x-rapidapi-key": API_KEY, "x-rapidapi-host": API_HOST}
         params = {"media_code": media_code}
         
-        print(f"Querying Instagram API for media code: {media_code}")
-        resp = requests.get(API_URL, headers=headers, params=params, timeout=30)
+        logger.info(f"Querying Instagram API for media code: {media_code}")
+        resp = get_provider("instagram").get("/get_media_data_v2.php", params=params, timeout=30)
         resp.raise_for_status()
         data = resp.json()
 
@@ -122,31 +121,33 @@ def extract_instagram_content(url: str):
         
         media_nodes = []
         if 'edge_sidecar_to_children' in data and data['edge_sidecar_to_children'].get('edges'):
-            print(f"🎠 Carousel post detected. Processing {len(data['edge_sidecar_to_children']['edges'])} items...")
+            logger.info(f"Carousel post detected. Processing {len(data['edge_sidecar_to_children']['edges'])} items...")
             media_nodes = [edge.get('node', {}) for edge in data['edge_sidecar_to_children']['edges']]
         else:
-            print("ℹ️ Single media post detected.")
+            logger.info("Single media post detected.")
             media_nodes.append(data)
 
-        combined_media_content = []
-        for i, node in enumerate(media_nodes):
-            item_num = i + 1
-            is_video = node.get('is_video', False)
-            
-            if is_video:
-                video_url = node.get('video_url')
-                if video_url:
-                    print(f"--- Processing Item {item_num} (Video) ---")
-                    transcript = transcribe_video_from_url(video_url)
-                    if transcript:
-                        combined_media_content.append(f"--- Item {item_num} (Video Transcript) ---\n{transcript}")
-            else:
-                display_url = node.get('display_url')
-                if display_url:
-                    print(f"--- Processing Item {item_num} (Image) ---")
-                    ocr_text = ocr_from_image_url(display_url)
-                    if ocr_text:
-                        combined_media_content.append(f"--- Item {item_num} (Image OCR) ---\n{ocr_text}")
+        # Images are OCR'd in parallel while any videos transcribe alongside them;
+        # results are reassembled in the original carousel order
+        image_items = [(i, node.get('display_url')) for i, node in enumerate(media_nodes)
+                       if not node.get('is_video', False) and node.get('display_url')]
+        video_items = [(i, node.get('video_url')) for i, node in enumerate(media_nodes)
+                       if node.get('is_video', False) and node.get('video_url')]
+        logger.info(f"Processing {len(image_items)} image(s) and {len(video_items)} video(s) concurrently")
+
+        item_content = {}
+        with ThreadPoolExecutor(max_workers=len(video_items) + 1) as executor:
+            video_futures = [(i, executor.submit(transcribe_video_from_url, video_url)) for i, video_url in video_items]
+            image_texts = ocr_image_urls([display_url for _, display_url in image_items])
+            for (i, _), ocr_text in zip(image_items, image_texts):
+                if ocr_text:
+                    item_content[i] = f"--- Item {i + 1} (Image OCR) ---\n{ocr_text}"
+            for i, future in video_futures:
+                transcript = future.result()
+                if transcript:
+                    item_content[i] = f"--- Item {i + 1} (Video Transcript) ---\n{transcript}"
+
+        combined_media_content = [item_content[i] for i in sorted(item_content)]
         
         full_content = f"Author: @{author}\n\nCaption: {caption}"
         if combined_media_content:
@@ -157,8 +158,14 @@ def extract_instagram_content(url: str):
             metadata={"source": url, "type": "instagram", "author": author}
         ))
 
+    except (ProviderError, *TRANSCRIPTION_BUSY):
+        # Rate limited, down, or a reel's transcription timed out: fail the job so it is
+        # retried, rather than index an error
+        extractor_error("instagram")
+        raise
     except Exception as e:
-        print(f"❌ Failed to process Instagram URL: {e}")
+        logger.error(f"Failed to process Instagram URL: {e}")
+        extractor_error("instagram")
         documents.append(Document(
             page_content=f"Error extracting Instagram content: {str(e)}",
             metadata={"source": url, "type": "instagram_error"}
@@ -174,14 +181,9 @@ def extract_youtube_content(url: str):
             raise ValueError("Could not extract a valid YouTube video ID")
         
         video_id = video_id_match.group(1)
-        api_url = "https://youtube-transcript3.p.rapidapi.com/api/transcript"
-        headers = {
-            "X-RapidAPI-Key": '58618da25cmsh9a89ebd5dddb215p1fd3d2jsne9346e0c07be',
-            "X-RapidAPI-Host": "youtube-transcript3.p.rapidapi.com"
-        }
         params = {"videoId": video_id}
         
-        resp = requests.get(api_url, headers=headers, params=params, timeout=20)
+        resp = get_provider("youtube").get("/api/transcript", params=params, timeout=20)
         resp.raise_for_status()
         data = resp.json()
 
@@ -193,19 +195,22 @@ def extract_youtube_content(url: str):
         if not transcript_text.strip():
             return [Document(page_content="Transcript for this video is unavailable or empty.", metadata={"source": url, "type": "youtube_no_transcript"})]
         
-        print(f"✅ Successfully extracted transcript for {url}")
+        logger.info(f"Successfully extracted transcript for {url}")
         return [Document(page_content=transcript_text, metadata={"source": url, "type": "youtube"})]
 
+    except ProviderError:
+        extractor_error("youtube")
+        raise
     except Exception as e:
-        print(f"❌ Error processing YouTube URL: {e}")
+        logger.error(f"Error processing YouTube URL: {e}")
+        extractor_error("youtube")
         return [Document(page_content=f"An unexpected error occurred while processing the YouTube URL: {str(e)}", metadata={"source": url, "type": "youtube_error"})]
 
 
 def extract_twitter_content(url: str):
     """Extracts tweet content, replies, and OCR from images using a RapidAPI endpoint."""
     documents = []
-    api_host = "twitter241.p.rapidapi.com"
-    api_url = f"https://{api_host}/tweet"
+    pending_ocr = []
 
     try:
         tweet_id_match = re.search(r'status/(\d+)', url)
@@ -214,13 +219,9 @@ def extract_twitter_content(url: str):
         tweet_id = tweet_id_match.group(1)
         
         querystring = {"pid": tweet_id}
-        headers = {
-            "x-rapidapi-key": '58618da25cmsh9a89ebd5dddb215p1fd3d2jsne9346e0c07be',
-            "x-rapidapi-host": api_host
-        }
         
-        print(f"Querying Twitter API for tweet ID: {tweet_id}")
-        resp = requests.get(api_url, headers=headers, params=querystring, timeout=15)
+        logger.info(f"Querying Twitter API for tweet ID: {tweet_id}")
+        resp = get_provider("twitter").get("/tweet", params=querystring, timeout=15)
         resp.raise_for_status()
         data = resp.json()
 
@@ -256,19 +257,31 @@ def extract_twitter_content(url: str):
 
             for media_item in legacy.get('extended_entities', {}).get('media', []):
                 if media_item.get('type') == 'photo' and (img_url := media_item.get('media_url_https')):
-                    print(f"📸 Found Twitter image for OCR: {img_url}")
-                    ocr_text = ocr_from_image_url(img_url)
-                    if ocr_text:
-                        documents.append(Document(
-                            page_content=ocr_text, 
-                            metadata={'parent_source': url, 'author': author, 'type': 'image_ocr'}
-                        ))
+                    logger.debug(f"Found Twitter image for OCR: {img_url}")
+                    # Placeholder keeps the OCR document right after its tweet once the batch finishes
+                    pending_ocr.append((len(documents), img_url, author))
+                    documents.append(None)
+
+        # OCR every photo in the thread at once
+        ocr_texts = ocr_image_urls([img_url for _, img_url, _ in pending_ocr])
+        for (position, _, author), ocr_text in zip(pending_ocr, ocr_texts):
+            if ocr_text:
+                documents[position] = Document(
+                    page_content=ocr_text, 
+                    metadata={'parent_source': url, 'author': author, 'type': 'image_ocr'}
+                )
+        documents = [doc for doc in documents if doc is not None]
         
         if not documents:
             documents.append(Document(page_content="No valid tweet content was found.", metadata={"source": url, "type": "twitter_error"}))
 
+    except ProviderError:
+        extractor_error("twitter")
+        raise
     except Exception as e:
-        print(f"❌ Failed to extract Twitter content: {e}")
+        logger.error(f"Failed to extract Twitter content: {e}")
+        extractor_error("twitter")
+        documents = [doc for doc in documents if doc is not None]
         documents.append(Document(page_content=f"Error extracting Twitter content: {str(e)}", metadata={"source": url, "type": "twitter_error"}))
         
     return documents
@@ -283,66 +296,71 @@ def extract_media_from_url(url: str):
         return results 
     
     try:
-        resp = requests.get(url, timeout=15, headers=HEADERS)
+        resp = http_client.get(url, timeout=15)
         resp.raise_for_status()
         soup = BeautifulSoup(resp.text, "html.parser")
 
-        for img in soup.find_all("img"):
-            src = img.get("src")
-            if src:
-                full_url = urljoin(url, src)
-                
-                width = img.get("width", "")
-                height = img.get("height", "")
-                try:
-                    if (width and int(width) < 100) or (height and int(height) < 100):
-                        continue
-                except ValueError:
-                    pass
-                
-                results["images"].append(full_url)
-                
-                if len(results["ocr_docs"]) < 5:
-                    ocr_text = ocr_from_image_url(full_url)
-                    if ocr_text:
-                        results["ocr_docs"].append(Document(page_content=ocr_text, metadata={"source": full_url}))
+        # Cheap checks first (URL, size, dimensions, a text-likelihood score), so the OCR
+        # slots go to the images most likely to hold text
+        candidates = candidates_from_html(soup, url)
+        results["images"] = [candidate.url for candidate in candidates]
+        ranked = rank_images(candidates)
+
+        # OCR the ranked images in parallel batches until five have yielded text
+        while ranked and len(results["ocr_docs"]) < 5:
+            batch, ranked = ranked[:5 - len(results["ocr_docs"])], ranked[5 - len(results["ocr_docs"]):]
+            fresh = [candidate for candidate in batch if not candidate.cached_text]
+            texts = dict(zip(
+                (candidate.url for candidate in fresh),
+                ocr_downloaded_images([(candidate.url, candidate.data) for candidate in fresh]),
+            ))
+            for candidate in batch:
+                ocr_text = candidate.cached_text or texts.get(candidate.url)
+                if ocr_text:
+                    results["ocr_docs"].append(Document(page_content=ocr_text, metadata={"source": candidate.url}))
         
-        print(f"Extracted {len(results['images'])} images, performed OCR on up to 5.")
+        logger.info(f"Extracted {len(results['images'])} images, performed OCR on up to 5.")
         return results
         
     except Exception as e:
-        print(f"❌ Error extracting media from URL: {e}")
+        logger.error(f"Error extracting media from URL: {e}")
+        extractor_error("web_media")
         return {"error": str(e), "images": [], "ocr_docs": []}
 
 # --- Main URL Router ---
+def html_to_text(html: str) -> str:
+    """Visible text of a generic web page, without scripts, styles and page chrome."""
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(["script", "style", "noscript", "header", "footer", "nav", "aside"]):
+        tag.decompose()
+    return " ".join(soup.stripped_strings)
+
 def extract_text_from_url(url: str):
     """
     Extract text from a URL, routing to the appropriate platform-specific function.
     """
     if is_youtube_url(url):
-        print(f"▶️ Detected YouTube URL: {url}")
+        logger.info(f"Detected YouTube URL: {url}")
         return extract_youtube_content(url)
     
     elif is_twitter_url(url):
-        print(f"🐦 Detected Twitter/X URL: {url}")
+        logger.info(f"Detected Twitter/X URL: {url}")
         return extract_twitter_content(url)
     
     elif is_instagram_url(url):
-        print(f"📸 Detected Instagram URL: {url}")
+        logger.info(f"Detected Instagram URL: {url}")
         return extract_instagram_content(url)
     
     else:
-        print(f"🌐 Using generic web scraping for: {url}")
+        logger.info(f"Using generic web scraping for: {url}")
         try:
-            resp = requests.get(url, timeout=15, headers=HEADERS)
+            resp = http_client.get(url, timeout=15)
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
-            for tag in soup(["script", "style", "noscript", "header", "footer", "nav", "aside"]):
-                tag.decompose()
-            text = " ".join(soup.stripped_strings)
+            text = html_to_text(resp.text)
             if not text.strip():
                 text = "No text content could be extracted from this URL."
             return [Document(page_content=text, metadata={"source": url, "type": "url"})]
         except Exception as e:
-            print(f"❌ Error extracting text from URL: {e}")
+            logger.error(f"Error extracting text from URL: {e}")
+            extractor_error("web")
             return [Document(page_content=f"Error extracting text: {e}", metadata={"source": url, "type": "error"})]
@@ -0,0 +1,518 @@
+import os
+import json
+import shutil
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# --- Vector Index Configuration ---
+# "chroma" keeps the LangChain Chroma store; "mmap" is exact top-k over a memory-mapped
+# float16 matrix (no warm-up, small footprint, ideal per user); "hnsw" adds an hnswlib
+# graph over the same matrix for large namespaces, snapshotted to disk for fast restarts.
+VECTOR_ENGINE = os.getenv("VECTOR_ENGINE", "chroma").lower()
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "./vector_index")
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+
+# Rows scored per block in exact search, bounding the float32 working set
+_SCAN_BLOCK = 65536
+_INITIAL_CAPACITY = 1024
+
+
+class VectorIndex:
+    """
+    One namespace of chunk vectors with their text and metadata.
+
+    get/upsert/delete/count take and return the same shapes as a Chroma collection, so
+    callers do not care which engine is configured. Scores from search() are cosine
+    similarities; embeddings are expected to be (and are stored) L2-normalized.
+    """
+
+    def get(self, ids=None, include=("documents", "metadatas"), limit=None, offset=0):
+        raise NotImplementedError
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        raise NotImplementedError
+
+    def delete(self, ids):
+        raise NotImplementedError
+
+    def update_metadata(self, ids, metadatas):
+        """Replace the metadata of existing chunks, keeping their vectors and text."""
+        raise NotImplementedError
+
+    def count(self):
+        raise NotImplementedError
+
+    def search(self, embedding, k):
+        """[(id, score, document, metadata)] for the k nearest chunks, best first."""
+        raise NotImplementedError
+
+    def similarity_search(self, query, k=4):
+        from registry import get_embeddings
+        from langchain.docstore.document import Document
+
+        hits = self.search(get_embeddings().embed_query(query), k)
+        return [Document(page_content=document, metadata=metadata or {}) for _, _, document, metadata in hits]
+
+    def metadata(self):
+        """Settings recorded with the namespace itself, such as its embedding space."""
+        raise NotImplementedError
+
+    def set_metadata(self, **values):
+        raise NotImplementedError
+
+    def persist(self):
+        pass
+
+    def drop(self):
+        """Delete the namespace and everything stored in it."""
+        raise NotImplementedError
+
+
+class ChromaIndex(VectorIndex):
+    """The LangChain Chroma store, as used before engines were pluggable."""
+
+    def __init__(self, vector_db, client, name):
+        self.vector_db = vector_db
+        self.client = client
+        self.name = name
+
+    def get(self, ids=None, include=("documents", "metadatas"), limit=None, offset=0):
+        if ids is not None:
+            return self.vector_db._collection.get(ids=list(ids), include=list(include))
+        return self.vector_db._collection.get(include=list(include), limit=limit, offset=offset)
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.vector_db._collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def delete(self, ids):
+        self.vector_db._collection.delete(ids=list(ids))
+
+    def update_metadata(self, ids, metadatas):
+        self.vector_db._collection.update(ids=list(ids), metadatas=list(metadatas))
+
+    def count(self):
+        return self.vector_db._collection.count()
+
+    def search(self, embedding, k):
+        result = self.vector_db._collection.query(
+            query_embeddings=[embedding], n_results=k, include=["documents", "metadatas", "distances"]
+        )
+        # Chroma's default space is squared L2; for unit vectors cosine = 1 - d / 2
+        return [
+            (doc_id, 1 - distance / 2, document, metadata)
+            for doc_id, distance, document, metadata in zip(
+                result["ids"][0], result["distances"][0], result["documents"][0], result["metadatas"][0]
+            )
+        ]
+
+    def similarity_search(self, query, k=4):
+        return self.vector_db.similarity_search(query, k=k)
+
+    def metadata(self):
+        return dict(self.vector_db._collection.metadata or {})
+
+    def set_metadata(self, **values):
+        # The distance function cannot be changed after creation, so hnsw:* keys are not resent
+        metadata = {key: value for key, value in self.metadata().items() if not key.startswith("hnsw:")}
+        self.vector_db._collection.modify(metadata={**metadata, **values})
+
+    def persist(self):
+        self.vector_db.persist()
+
+    def drop(self):
+        self.client.delete_collection(self.name)
+
+
+class MmapIndex(VectorIndex):
+    """
+    Exact search over a float16 matrix memory-mapped from `vectors.f16`, with ids, text
+    and metadata in a SQLite file next to it.
+
+    Each chunk owns one row; deleted rows are zeroed and reused. A query scores every live
+    row in blocks (float16 rows upcast per block) and takes the top k with argpartition,
+    so results are exact and opening a namespace only reads its id table.
+
+    Several processes (prefork workers, the bulk_ingest CLI) may share a namespace: rows
+    are allocated inside a SQLite write transaction, and every call first reloads the id
+    table when another process has bumped the stored version since.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(path, "store.db"), check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, row INTEGER UNIQUE NOT NULL, "
+                "document TEXT, metadata TEXT)"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._vectors = None
+        self._version = None
+        with self._lock:
+            self._sync()
+
+    # --- Storage ---
+
+    def _sync(self):
+        """Reload the row allocation if the store changed since it was read; True when it did."""
+        # Caller holds the lock
+        version = self._meta("version") or "0"
+        if version == self._version:
+            return False
+        self._load()
+        self._version = version
+        return True
+
+    def _load(self):
+        import numpy as np
+
+        self._row_of = dict(self._conn.execute("SELECT id, row FROM chunks"))
+        self._high = max(self._row_of.values(), default=-1) + 1
+        used = set(self._row_of.values())
+        self._free = [row for row in range(self._high) if row not in used]
+        dim = self._meta("dim")
+        self.dim = int(dim) if dim else None
+        self._live = np.zeros(0, dtype=bool)
+        if self.dim:
+            # Remapped every time: another process may have grown the file
+            self._open_matrix(max(self._high, 1))
+            self._live[list(used)] = True
+
+    @contextmanager
+    def _write(self):
+        """
+        A write transaction holding SQLite's write lock, so no other process allocates rows
+        until it commits; the in-memory state is synced first, and the version is bumped
+        last when anything was written.
+        """
+        with self._lock:
+            try:
+                with self._conn:
+                    self._conn.execute("BEGIN IMMEDIATE")
+                    self._sync()
+                    changes = self._conn.total_changes
+                    yield
+                    if self._conn.total_changes != changes:
+                        self._bump_version()
+            except BaseException:
+                # Memory may be ahead of what was rolled back: reload on the next call
+                self._version = None
+                raise
+
+    def _meta(self, key):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _open_matrix(self, min_rows):
+        import numpy as np
+
+        file_path = os.path.join(self.path, "vectors.f16")
+        row_bytes = self.dim * 2
+        capacity = os.path.getsize(file_path) // row_bytes if os.path.exists(file_path) else 0
+        if capacity < min_rows:
+            capacity = max(_INITIAL_CAPACITY, min_rows, capacity * 2)
+            if self._vectors is not None:
+                self._vectors.flush()
+            with open(file_path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+        self._vectors = np.memmap(file_path, dtype=np.float16, mode="r+", shape=(capacity, self.dim))
+        live = np.zeros(capacity, dtype=bool)
+        live[:len(self._live)] = self._live[:capacity]
+        self._live = live
+
+    @property
+    def capacity(self):
+        return 0 if self._vectors is None else self._vectors.shape[0]
+
+    # --- VectorIndex ---
+
+    def get(self, ids=None, include=("documents", "metadatas"), limit=None, offset=0):
+        with self._lock:
+            self._sync()
+            if ids is not None:
+                ids = list(ids)
+                rows = []
+                for start in range(0, len(ids), 500):
+                    block = ids[start:start + 500]
+                    rows.extend(self._conn.execute(
+                        f"SELECT id, row, document, metadata FROM chunks WHERE id IN ({','.join('?' * len(block))})",
+                        block,
+                    ))
+            else:
+                rows = self._conn.execute(
+                    "SELECT id, row, document, metadata FROM chunks ORDER BY row LIMIT ? OFFSET ?",
+                    (-1 if limit is None else limit, offset or 0),
+                ).fetchall()
+            result = {"ids": [row[0] for row in rows]}
+            if "documents" in include:
+                result["documents"] = [row[2] for row in rows]
+            if "metadatas" in include:
+                result["metadatas"] = [json.loads(row[3]) if row[3] else None for row in rows]
+            if "embeddings" in include:
+                result["embeddings"] = [self._vectors[row[1]].astype("float32").tolist() for row in rows]
+        return result
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        import numpy as np
+
+        if not ids:
+            return []
+        vectors = _normalized(np.asarray(embeddings, dtype=np.float32))
+        with self._write():
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._set_meta("dim", self.dim)
+                self._open_matrix(_INITIAL_CAPACITY)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the index ({self.dim})")
+
+            rows, assigned = [], {}
+            for doc_id in ids:
+                row = self._row_of.get(doc_id, assigned.get(doc_id))
+                if row is None:
+                    row = self._free.pop() if self._free else self._high
+                    self._high = max(self._high, row + 1)
+                    assigned[doc_id] = row
+                rows.append(row)
+            if self._high > self.capacity:
+                self._open_matrix(self._high)
+
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, row, document, metadata) VALUES (?, ?, ?, ?)",
+                [(doc_id, row, document, json.dumps(metadata) if metadata else None)
+                 for doc_id, row, document, metadata in zip(ids, rows, documents, metadatas)],
+            )
+            # Written before the commit, so a process that sees the new version sees the vectors
+            self._vectors[rows] = vectors.astype(np.float16)
+            self._live[rows] = True
+            self._row_of.update(zip(ids, rows))
+        return rows
+
+    def delete(self, ids):
+        with self._write():
+            rows = [self._row_of.pop(doc_id) for doc_id in ids if doc_id in self._row_of]
+            if not rows:
+                return []
+            self._conn.executemany("DELETE FROM chunks WHERE row = ?", [(row,) for row in rows])
+            self._vectors[rows] = 0
+            self._live[rows] = False
+            self._free.extend(rows)
+        return rows
+
+    def update_metadata(self, ids, metadatas):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE chunks SET metadata = ? WHERE id = ?",
+                [(json.dumps(metadata) if metadata else None, doc_id) for doc_id, metadata in zip(ids, metadatas)],
+            )
+
+    def metadata(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value FROM meta WHERE key LIKE 'info:%'").fetchall()
+        return {key[len("info:"):]: value for key, value in rows}
+
+    def set_metadata(self, **values):
+        with self._lock, self._conn:
+            for key, value in values.items():
+                self._set_meta(f"info:{key}", value)
+
+    def _bump_version(self):
+        # Caller holds the lock and the transaction
+        self._version = str(int(self._meta("version") or 0) + 1)
+        self._set_meta("version", self._version)
+
+    def count(self):
+        with self._lock:
+            self._sync()
+            return len(self._row_of)
+
+    def search(self, embedding, k):
+        import numpy as np
+
+        with self._lock:
+            self._sync()
+            live = len(self._row_of)
+            if not live or k <= 0:
+                return []
+            query = _normalized(np.asarray([embedding], dtype=np.float32))[0]
+            scores = np.empty(self._high, dtype=np.float32)
+            for start in range(0, self._high, _SCAN_BLOCK):
+                end = min(start + _SCAN_BLOCK, self._high)
+                scores[start:end] = self._vectors[start:end].astype(np.float32) @ query
+            scores[~self._live[:self._high]] = -np.inf
+            k = min(k, live)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return self._hits([int(row) for row in top], [float(scores[row]) for row in top])
+
+    def _hits(self, rows, scores):
+        # Caller holds the lock
+        found = {
+            row: (doc_id, document, metadata)
+            for doc_id, row, document, metadata in self._conn.execute(
+                f"SELECT id, row, document, metadata FROM chunks WHERE row IN ({','.join('?' * len(rows))})", rows
+            )
+        }
+        return [
+            (found[row][0], score, found[row][1], json.loads(found[row][2]) if found[row][2] else None)
+            for row, score in zip(rows, scores) if row in found
+        ]
+
+    def persist(self):
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+
+    def drop(self):
+        with self._lock:
+            self._vectors = None
+            self._conn.close()
+            shutil.rmtree(self.path, ignore_errors=True)
+
+
+class HnswIndex(MmapIndex):
+    """
+    Approximate search with an hnswlib graph whose labels are the rows of the float16
+    matrix. The graph is saved to `hnsw.bin` by persist(); on open it is loaded when it
+    matches the stored version and rebuilt from the matrix otherwise. The same happens
+    whenever another process has changed the namespace, so that costs one rebuild.
+    """
+
+    def __init__(self, path, m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION, ef_search=HNSW_EF_SEARCH):
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._graph = None
+        self._deleted = set()
+        super().__init__(path)
+
+    def _load(self):
+        super()._load()
+        if self.dim:
+            self._load_graph()
+
+    def _new_graph(self):
+        import hnswlib
+
+        # Vectors are unit length, so inner product ranks like cosine
+        graph = hnswlib.Index(space="ip", dim=self.dim)
+        graph.init_index(max_elements=max(self.capacity, 1), M=self.m, ef_construction=self.ef_construction)
+        return graph
+
+    def _load_graph(self):
+        import hnswlib
+        import numpy as np
+
+        snapshot = os.path.join(self.path, "hnsw.bin")
+        if os.path.exists(snapshot) and self._meta("snapshot_version") == (self._meta("version") or "0"):
+            graph = hnswlib.Index(space="ip", dim=self.dim)
+            graph.load_index(snapshot, max_elements=max(self.capacity, 1))
+            self._graph = graph
+            self._deleted = set(range(self._high)) - set(self._row_of.values())
+            logger.info(f"Loaded HNSW snapshot of {self.path} ({len(self._row_of)} vectors)")
+            return
+
+        self._graph = self._new_graph()
+        self._deleted = set()
+        rows = np.flatnonzero(self._live[:self._high])
+        for start in range(0, len(rows), _SCAN_BLOCK):
+            block = rows[start:start + _SCAN_BLOCK]
+            self._graph.add_items(self._vectors[block].astype(np.float32), block)
+        if len(rows):
+            logger.info(f"Rebuilt HNSW graph of {self.path} from {len(rows)} vectors")
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        import numpy as np
+
+        with self._lock:
+            rows = super().upsert(ids, embeddings, documents, metadatas)
+            if not rows:
+                return rows
+            if self._graph is None:
+                self._graph = self._new_graph()
+                self._deleted = set()
+            if self.capacity > self._graph.get_max_elements():
+                self._graph.resize_index(self.capacity)
+            for row in rows:
+                if row in self._deleted:
+                    self._graph.unmark_deleted(row)
+                    self._deleted.discard(row)
+            self._graph.add_items(self._vectors[rows].astype(np.float32), rows)
+        return rows
+
+    def delete(self, ids):
+        with self._lock:
+            rows = super().delete(ids)
+            for row in rows:
+                if row not in self._deleted:
+                    self._graph.mark_deleted(row)
+                    self._deleted.add(row)
+        return rows
+
+    def search(self, embedding, k):
+        import numpy as np
+
+        with self._lock:
+            self._sync()
+            live = len(self._row_of)
+            if not live or k <= 0:
+                return []
+            k = min(k, live)
+            self._graph.set_ef(max(self.ef_search, k))
+            query = _normalized(np.asarray([embedding], dtype=np.float32))
+            labels, distances = self._graph.knn_query(query, k=k)
+            # hnswlib's "ip" distance is 1 - dot product
+            return self._hits([int(row) for row in labels[0]], [float(1 - d) for d in distances[0]])
+
+    def persist(self):
+        with self._lock:
+            super().persist()
+            # A graph behind another process's writes is reloaded, never saved under its version
+            self._sync()
+            if self._graph is None:
+                return
+            snapshot = os.path.join(self.path, "hnsw.bin")
+            self._graph.save_index(snapshot + ".part")
+            os.replace(snapshot + ".part", snapshot)
+            with self._conn:
+                self._set_meta("snapshot_version", self._version)
+
+
+def _normalized(vectors):
+    import numpy as np
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.clip(norms, 1e-12, None)
+
+
+ENGINES = {
+    "mmap": MmapIndex,
+    "hnsw": HnswIndex,
+}
+
+
+def open_index(engine, name):
+    """A file-backed engine's index for the namespace `name` under VECTOR_INDEX_DIR."""
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown VECTOR_ENGINE '{engine}'; expected chroma or one of {', '.join(ENGINES)}")
+    return ENGINES[engine](os.path.join(VECTOR_INDEX_DIR, name))
+
+
+def list_namespaces():
+    if not os.path.isdir(VECTOR_INDEX_DIR):
+        return []
+    return sorted(
+        name for name in os.listdir(VECTOR_INDEX_DIR)
+        if os.path.exists(os.path.join(VECTOR_INDEX_DIR, name, "store.db"))
+    )